@@ -0,0 +1,182 @@
+"""
+Per-endpoint response size, bandwidth and compression report by load-shape step.
+
+List endpoints such as /conversations, /conversations/:id/messages and
+/api/messages/updates return whole JSON arrays that grow over a run. For
+every HTTP response, BandwidthRecorder counts:
+
+- wire bytes: the body as received, before any Content-Encoding is undone
+- decoded bytes: the body after decompression
+- items: entries of a JSON array body (for /api/expert-queue/updates, the
+  waiting plus assigned conversations), counted from the value the persona
+  decodes (count_decoded), so bodies are never parsed twice; responses the
+  personas don't decode are left out of the item averages
+
+For every shape step, each endpoint gets a row in <prefix>_bandwidth.csv/.json
+with average sizes, the compression ratio, items per response, mean latency
+and wire/decoded kB/s (see step_report.py).
+
+The python-requests client reports exact wire sizes. The fast client only
+knows them from Content-Length, so compressed chunked responses on it count
+as "wire unknown" and are left out of the wire averages.
+
+Compression is negotiated with --accept-encoding, which sets the header on
+every request, so runs with identity, gzip and br can be compared step by
+step. The Rails API does not compress by itself; what it measures is what
+the deployment in front of it (e.g. the load balancer or nginx) does.
+"""
+
+from step_report import StepReporter
+
+
+HTTP_METHODS = {"GET", "POST", "PUT", "PATCH", "DELETE", "HEAD", "OPTIONS"}
+ACCEPT_ENCODINGS = {
+    "default": None,
+    "identity": "identity",
+    "gzip": "gzip",
+    "br": "br",
+    "gzip,br": "gzip, br",
+}
+
+# Per-endpoint counters, in this order in the lists shipped to the master
+FIELDS = (
+    "requests", "encoded", "wire_known", "wire_bytes", "wire_decoded_bytes",
+    "decoded_bytes", "item_responses", "items", "response_time",
+)
+
+
+def force_accept_encoding(client, value):
+    """
+    Send Accept-Encoding: value on every request of an HttpSession or FastHttpSession.
+
+    Both clients route get/post/put through client.request, and a header
+    given there takes precedence over either client's own default.
+    """
+    request = client.request
+
+    def request_with_encoding(method, url, headers=None, **kwargs):
+        headers = dict(headers) if headers else {}
+        headers.setdefault("Accept-Encoding", value)
+        return request(method, url, headers=headers, **kwargs)
+
+    client.request = request_with_encoding
+
+
+def wire_size(response):
+    """Body size as received, or None if the client can't tell."""
+    raw = getattr(response, "raw", None)
+    if raw is not None and hasattr(raw, "tell"):
+        return raw.tell()
+    length = response.headers.get("Content-Length")
+    if length is not None:
+        return int(length)
+    if not response.headers.get("Content-Encoding"):
+        return len(response.content or b"")
+    return None
+
+
+def count_items(body):
+    """Entries of a decoded JSON array response, or None for other bodies."""
+    if not isinstance(body, list):
+        return None
+    if len(body) == 1 and isinstance(body[0], dict) and body[0] and all(
+        isinstance(value, list) for value in body[0].values()
+    ):
+        # [{waitingConversations: [...], assignedConversations: [...]}]
+        return sum(len(value) for value in body[0].values())
+    return len(body)
+
+
+def count_decoded(response, body):
+    """
+    Count the items of a response body a persona has just decoded.
+
+    Does nothing unless a BandwidthRecorder saw the response; each response
+    is counted once.
+    """
+    pending = getattr(response, "bandwidth_items", None)
+    if pending is None:
+        return
+    response.bandwidth_items = None
+    recorder, key = pending
+    items = count_items(body)
+    counter = recorder.counters.get(key)
+    # a counter taken for a report in between is gone with its response count
+    if items is not None and counter is not None:
+        counter[6] += 1
+        counter[7] += items
+
+
+class BandwidthRecorder(StepReporter):
+    """
+    Collects response-size counters per stats row and per load-shape step.
+
+    Writes <prefix>_bandwidth.csv and <prefix>_bandwidth.json (see
+    StepReporter for the arguments).
+    """
+    REPORT_KEY = "bandwidth"
+    FILE_SUFFIX = "_bandwidth"
+
+    def __init__(self, environment, current_step, output_prefix, is_worker=False):
+        self.counters = {}
+        super().__init__(environment, current_step, output_prefix, is_worker)
+
+    def counter(self, key):
+        counter = self.counters.get(key)
+        if counter is None:
+            counter = self.counters[key] = [0] * len(FIELDS)
+        return counter
+
+    def on_request(self, request_type, name, response_time, response_length, response=None, **kwargs):
+        if response is None or request_type not in HTTP_METHODS or not response.headers:
+            return
+        content_type = response.headers.get("Content-Type") or ""
+        if content_type.startswith("text/event-stream"):
+            return
+
+        counter = self.counter((request_type, name))
+        counter[0] += 1
+        counter[1] += bool(response.headers.get("Content-Encoding"))
+        wire = wire_size(response)
+        if wire is not None:
+            counter[2] += 1
+            counter[3] += wire
+            counter[4] += response_length
+        counter[5] += response_length
+        if "json" in content_type:
+            # counted by count_decoded once the persona decodes the body
+            response.bandwidth_items = (self, (request_type, name))
+        counter[8] += response_time or 0
+
+    def take(self):
+        data = [[request_type, name, counter] for (request_type, name), counter in self.counters.items()]
+        self.counters = {}
+        return data
+
+    def merge(self, data):
+        for request_type, name, values in data:
+            counter = self.counter((request_type, name))
+            for i, value in enumerate(values):
+                counter[i] += value
+
+    def step_rows(self, duration):
+        rows = []
+        for (request_type, name), values in sorted(self.counters.items()):
+            c = dict(zip(FIELDS, values))
+            requests = c["requests"]
+            rows.append({
+                "type": request_type,
+                "name": name,
+                "count": requests,
+                "encoded_pct": round(100 * c["encoded"] / requests, 1),
+                "wire_unknown": requests - c["wire_known"],
+                "wire_bytes_avg": round(c["wire_bytes"] / c["wire_known"]) if c["wire_known"] else "",
+                "decoded_bytes_avg": round(c["decoded_bytes"] / requests),
+                "compression_ratio": round(c["wire_decoded_bytes"] / c["wire_bytes"], 2) if c["wire_bytes"] else "",
+                "items_avg": round(c["items"] / c["item_responses"], 1) if c["item_responses"] else "",
+                "mean_ms": round(c["response_time"] / requests, 1),
+                "wire_kBps": round(c["wire_bytes"] / 1024 / duration, 2) if duration else "",
+                "decoded_kBps": round(c["decoded_bytes"] / 1024 / duration, 2) if duration else "",
+            })
+        self.counters = {}
+        return rows
@@ -0,0 +1,156 @@
+"""
+Side-by-side benchmark of the two HTTP clients the personas can run on.
+
+Runs the IdleUser/ActiveUser/ExpertUser mix and the FastIdleUser/FastActiveUser/
+FastExpertUser mix with no wait time for a fixed duration each, and reports
+requests/sec per core of the load generator (requests divided by the CPU
+seconds the generator process used).
+
+By default the personas hit a small stub of the chat API started in a
+separate process, so the numbers measure client overhead rather than Rails.
+Pass --host to point both runs at a real backend instead.
+
+Usage:
+    python bench_http_clients.py [--users 50] [--duration 20] [--host URL]
+"""
+
+import argparse
+import itertools
+import json
+import multiprocessing
+import socket
+import time
+
+import gevent
+from gevent.pywsgi import WSGIServer
+from locust import constant
+from locust.env import Environment
+
+import locustfile
+
+
+def stub_app(environ, start_response):
+    """Minimal WSGI stand-in for the chat API endpoints the personas call."""
+    method = environ["REQUEST_METHOD"]
+    path = environ["PATH_INFO"]
+    status = "200 OK"
+
+    if path in ("/auth/register", "/auth/login"):
+        user_id = next(stub_app.ids)
+        body = {"user": {"id": user_id, "username": f"user_{user_id}"}, "token": f"token-{user_id}"}
+        status = "201 Created" if path == "/auth/register" else status
+    elif path == "/conversations" and method == "POST":
+        body = {"id": next(stub_app.ids), "status": "waiting"}
+        status = "201 Created"
+    elif path == "/messages" and method == "POST":
+        body = {"id": next(stub_app.ids)}
+        status = "201 Created"
+    elif path == "/expert/queue":
+        body = {"waitingConversations": [], "assignedConversations": []}
+    elif path in ("/auth/me", "/expert/profile"):
+        body = {"id": 1, "username": "user_1"}
+    else:
+        body = []
+
+    payload = json.dumps(body).encode()
+    start_response(status, [("Content-Type", "application/json"), ("Content-Length", str(len(payload)))])
+    return [payload]
+
+
+stub_app.ids = itertools.count(1)
+
+
+def stub_listener():
+    """A listening socket on a free local port, so the stub never takes a port in use (e.g. Locust's 8089)."""
+    listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    listener.bind(("127.0.0.1", 0))
+    listener.listen(128)
+    return listener
+
+
+def serve_stub(listener):
+    """Serve stub_app on a listening socket (see stub_listener) or an (address, port) pair."""
+    WSGIServer(listener, stub_app, log=None).serve_forever()
+
+
+def run_mix(user_classes, host, users, duration):
+    """
+    Run a persona mix with zero wait time and measure generator throughput.
+
+    Args:
+        user_classes (list): Concrete persona classes to run
+        host (str): Base URL of the backend
+        users (int): Number of concurrent simulated users
+        duration (float): Seconds to run for
+
+    Returns:
+        dict: Total requests, failures, wall-clock RPS and RPS per core
+    """
+    bench_classes = [
+        type(f"Bench{cls.__name__}", (cls,), {"wait_time": constant(0), "host": host})
+        for cls in user_classes
+    ]
+    env = Environment(user_classes=bench_classes)
+    runner = env.create_local_runner()
+
+    runner.start(users, spawn_rate=users)
+    gevent.sleep(1)  # let every user finish on_start before measuring
+    env.stats.reset_all()
+
+    wall_start = time.perf_counter()
+    cpu_start = time.process_time()
+    gevent.sleep(duration)
+    cpu_used = time.process_time() - cpu_start
+    wall_used = time.perf_counter() - wall_start
+
+    runner.quit()
+    total = env.stats.total
+    return {
+        "requests": total.num_requests,
+        "failures": total.num_failures,
+        "rps": total.num_requests / wall_used,
+        "rps_per_core": total.num_requests / cpu_used if cpu_used else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=50, help="concurrent simulated users per run")
+    parser.add_argument("--duration", type=float, default=20, help="measured seconds per run")
+    parser.add_argument("--host", help="backend URL (default: local stub server)")
+    args = parser.parse_args()
+
+    stub = None
+    host = args.host
+    if host is None:
+        listener = stub_listener()
+        host = f"http://127.0.0.1:{listener.getsockname()[1]}"
+        stub = multiprocessing.Process(target=serve_stub, args=(listener,), daemon=True)
+        stub.start()
+        listener.close()
+
+    mixes = {
+        "requests": [locustfile.IdleUser, locustfile.ActiveUser, locustfile.ExpertUser],
+        "fast": [locustfile.FastIdleUser, locustfile.FastActiveUser, locustfile.FastExpertUser],
+    }
+
+    try:
+        results = {name: run_mix(classes, host, args.users, args.duration) for name, classes in mixes.items()}
+    finally:
+        if stub is not None:
+            stub.terminate()
+
+    print(f"{'client':<10} {'requests':>10} {'failures':>9} {'req/s':>10} {'req/s/core':>11}")
+    for name, result in results.items():
+        print(
+            f"{name:<10} {result['requests']:>10} {result['failures']:>9} "
+            f"{result['rps']:>10.1f} {result['rps_per_core']:>11.1f}"
+        )
+    if results["requests"]["rps_per_core"]:
+        speedup = results["fast"]["rps_per_core"] / results["requests"]["rps_per_core"]
+        print(f"\nfast/requests per-core speedup: {speedup:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Micro-benchmark for the per-spawn cost of UserStore.
+
+Every persona's on_start calls has_users() and then either get_random_user()
+or store_user(). This measures that path with 1k to 1M users already in the
+store, for the current UserStore and for the previous dict-only version that
+copied every key under the lock on each sample.
+
+Usage:
+    python bench_user_store.py [--spawns 20000] [--sizes 1000 10000 100000 1000000]
+"""
+
+import argparse
+import random
+import threading
+import time
+
+from locustfile import NEW_USER_PROB, UserStore
+
+
+class LegacyUserStore:
+    """The dict-only store this benchmark compares against."""
+    def __init__(self):
+        self.used_usernames = {}
+        self.username_lock = threading.Lock()
+
+    def get_random_user(self):
+        with self.username_lock:
+            if not self.used_usernames:
+                return None
+            random_username = random.choice(list(self.used_usernames.keys()))
+            return self.used_usernames[random_username]
+
+    def store_user(self, username, auth_token, user_id):
+        with self.username_lock:
+            self.used_usernames[username] = {"username": username, "auth_token": auth_token, "user_id": user_id}
+            return self.used_usernames[username]
+
+    def has_users(self):
+        with self.username_lock:
+            return len(self.used_usernames) > 0
+
+
+def fill(store, size):
+    for i in range(size):
+        store.store_user(f"user_{i}", f"token-{i}", str(i))
+
+
+def time_spawns(store, size, spawns):
+    """
+    Time the on_start store traffic of `spawns` simulated users.
+
+    Returns:
+        float: Mean microseconds per spawn
+    """
+    rng = random.Random(42)
+    start = time.perf_counter()
+    for i in range(spawns):
+        if store.has_users() and rng.random() > NEW_USER_PROB:
+            store.get_random_user()
+        else:
+            n = size + i
+            store.store_user(f"user_{n}", f"token-{n}", str(n))
+    return (time.perf_counter() - start) / spawns * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--spawns", type=int, default=20000, help="simulated spawns per measurement")
+    parser.add_argument("--legacy-spawns", type=int, default=200, help="spawns for the (slow) legacy store")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000, 1000000])
+    args = parser.parse_args()
+
+    print(f"{'stored users':>12} {'UserStore us/spawn':>19} {'legacy us/spawn':>16}")
+    for size in args.sizes:
+        store = UserStore()
+        fill(store, size)
+        current = time_spawns(store, size, args.spawns)
+
+        legacy_store = LegacyUserStore()
+        fill(legacy_store, size)
+        legacy = time_spawns(legacy_store, size, args.legacy_spawns)
+
+        print(f"{size:>12} {current:>19.2f} {legacy:>16.2f}")
+
+
+if __name__ == "__main__":
+    main()
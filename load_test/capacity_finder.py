@@ -0,0 +1,380 @@
+"""
+Capacity search: find the highest arrival rate the backend sustains within SLOs.
+
+Instead of reading the saturation point off the HTML reports, run the
+locustfile with --capacity-search SPEC. The load shape then runs a series of
+trials, each at one arrival rate r (new users/sec, the unit of the default
+profile's steps):
+
+1. Users arrive at r/s for arrival_window seconds, so the trial holds
+   r * arrival_window users. Moving from one rate to the next spawns or stops
+   users fast enough to reach the new target within one arrival window.
+2. The first stabilize seconds at the new user count are discarded.
+3. Up to `trials` measurement windows of `measure` seconds follow back to
+   back. A window passes if every SLO holds over the requests completed in
+   it, and the rate passes once a majority of its windows pass.
+
+The rate grows by `growth` from start_rate until a rate fails (or max_rate
+passes), then bisects between the highest passing and the lowest failing rate
+until they are within `precision` of each other. The highest passing rate is
+the capacity. It is logged and written to `output` as JSON, so single-instance,
+vertically and horizontally scaled deployments can be compared by one number.
+
+Spec (a YAML/JSON file or inline JSON string, like --shape-profile):
+
+    slos:
+      - {name: /api/messages/updates, method: GET, percentile: 95, max_ms: 300}
+      - {max_error_rate: 0.01}       # no name: all HTTP requests
+    start_rate: 2                    # users/sec of the first trial
+    max_rate: 1024
+    min_rate: 0.5                    # give up below this rate
+    growth: 2
+    arrival_window: 60
+    stabilize: 30
+    measure: 60
+    trials: 3
+    precision: 0.05                  # stop when fail - pass <= precision * fail
+    max_users: 30000
+    output: capacity.json
+
+Windows are measured on Locust's request stats. On a master these arrive from
+the workers every few seconds, which the stabilization window absorbs. Only
+rows of real HTTP requests (GET, POST, ...) count unless an SLO names a
+method: the custom rows other features add (E2E, TOKEN, CLAIM, ...) are
+measurements, not requests, and would otherwise end the search on synthetic
+failures and latencies.
+"""
+
+import json
+import logging
+
+from locust.stats import calculate_response_time_percentile, diff_response_time_dicts
+
+from client_overhead import HTTP_METHODS
+from load_profile import read_spec
+
+
+SEARCH_DEFAULTS = {
+    "start_rate": 2,
+    "max_rate": 1024,
+    "min_rate": 0.5,
+    "growth": 2,
+    "arrival_window": 60,
+    "stabilize": 30,
+    "measure": 60,
+    "trials": 3,
+    "precision": 0.05,
+    "max_users": 30000,
+    "output": None,
+}
+
+
+class SLO:
+    """
+    One service-level objective, checked over the requests of a window.
+
+    Args:
+        name (str): Stats row name, or None for all HTTP requests
+        method (str): Request type, or None for every HTTP method
+        percentile (float): Latency percentile to check, with max_ms
+        max_ms (float): Highest allowed latency at that percentile
+        max_error_rate (float): Highest allowed share of failed requests
+    """
+    FIELDS = ("name", "method", "percentile", "max_ms", "max_error_rate")
+
+    def __init__(self, name=None, method=None, percentile=None, max_ms=None, max_error_rate=None):
+        self.name = name
+        self.method = method
+        self.percentile = percentile
+        self.max_ms = max_ms
+        self.max_error_rate = max_error_rate
+
+        target = " ".join(part for part in (method, name) if part) or "all HTTP requests"
+        if max_error_rate is not None:
+            self.description = f"{target}: error rate <= {max_error_rate:.2%}"
+        else:
+            self.description = f"{target}: p{percentile:g} <= {max_ms:g}ms"
+
+    @classmethod
+    def from_dict(cls, spec, where):
+        if not isinstance(spec, dict):
+            raise ValueError(f"{where}: SLO must be a mapping")
+        unknown = set(spec) - set(cls.FIELDS)
+        if unknown:
+            raise ValueError(f"{where}: unknown SLO field(s) {sorted(unknown)}")
+        latency = "percentile" in spec or "max_ms" in spec
+        if latency == ("max_error_rate" in spec):
+            raise ValueError(f"{where}: SLO needs either percentile and max_ms, or max_error_rate")
+        if latency:
+            if not 0 < spec.get("percentile", 0) <= 100:
+                raise ValueError(f"{where}: percentile must be in (0, 100]")
+            if spec.get("max_ms", -1) < 0:
+                raise ValueError(f"{where}: max_ms must not be negative")
+        elif not 0 <= spec["max_error_rate"] <= 1:
+            raise ValueError(f"{where}: max_error_rate must be between 0 and 1")
+        return cls(**spec)
+
+    def sample(self, stats):
+        """
+        Cumulative counters of the matching stats rows.
+
+        Returns:
+            tuple: (requests, failures, response time histogram)
+        """
+        entries = [
+            entry for (name, method), entry in list(stats.entries.items())
+            if (self.name is None or name == self.name)
+            and (method == self.method if self.method is not None else method in HTTP_METHODS)
+        ]
+        requests = failures = 0
+        response_times = {}
+        for entry in entries:
+            requests += entry.num_requests
+            failures += entry.num_failures
+            for response_time, count in entry.response_times.items():
+                response_times[response_time] = response_times.get(response_time, 0) + count
+        return (requests, failures, response_times)
+
+    def evaluate(self, before, after):
+        """
+        Check the SLO over the requests between two samples.
+
+        Returns:
+            tuple: (passed, observed value as text)
+        """
+        requests = after[0] - before[0]
+        if requests <= 0:
+            return (False, "no requests")
+        if self.max_error_rate is not None:
+            error_rate = (after[1] - before[1]) / requests
+            return (error_rate <= self.max_error_rate, f"{error_rate:.2%}")
+        response_times = diff_response_time_dicts(after[2], before[2])
+        value = calculate_response_time_percentile(
+            response_times, sum(response_times.values()), self.percentile / 100
+        )
+        return (value <= self.max_ms, f"{value}ms")
+
+
+class CapacitySearch:
+    """
+    Runs the search from the load shape's tick.
+
+    Has the at()/label() interface of LoadProfile, so DynamicArrivalRateWithGaps
+    drives it like any other profile. Each phase (ramp, stabilize, every
+    measurement window) is its own step, so --hdr-report writes one row set
+    per trial window.
+    """
+
+    def __init__(self, slos, start_rate=2, max_rate=1024, min_rate=0.5, growth=2, arrival_window=60,
+                 stabilize=30, measure=60, trials=3, precision=0.05, max_users=30000, output=None):
+        self.slos = slos
+        self.start_rate = start_rate
+        self.max_rate = max_rate
+        self.min_rate = min_rate
+        self.growth = growth
+        self.arrival_window = arrival_window
+        self.stabilize = stabilize
+        self.measure = measure
+        self.trials = trials
+        self.precision = precision
+        self.max_users = max_users
+        self.output = output
+
+        self.environment = None
+        self.steps = []
+        self.results = []
+        self.passed = None
+        self.failed = None
+        self.done = False
+
+        self.rate = None
+        self.target = 0
+        self.spawn_rate = start_rate
+        self.phase = None
+        self.phase_started = 0
+        self.windows = []
+        self.window_start = None
+
+    @classmethod
+    def from_dict(cls, spec):
+        """Validate a search spec mapping and build it."""
+        if not isinstance(spec, dict):
+            raise ValueError("capacity search spec must be a mapping")
+        unknown = set(spec) - set(SEARCH_DEFAULTS) - {"slos"}
+        if unknown:
+            raise ValueError(f"unknown capacity search field(s) {sorted(unknown)}")
+        slo_specs = spec.get("slos")
+        if not isinstance(slo_specs, list) or not slo_specs:
+            raise ValueError("capacity search needs a non-empty 'slos' list")
+        slos = [SLO.from_dict(slo, f"slos[{i}]") for i, slo in enumerate(slo_specs)]
+
+        settings = {**SEARCH_DEFAULTS, **{k: v for k, v in spec.items() if k != "slos"}}
+        for name, value in settings.items():
+            if name == "output":
+                continue
+            if not isinstance(value, (int, float)) or isinstance(value, bool) or value <= 0:
+                raise ValueError(f"{name} must be a positive number")
+        if settings["growth"] <= 1:
+            raise ValueError("growth must be greater than 1")
+        if not settings["min_rate"] <= settings["start_rate"] <= settings["max_rate"]:
+            raise ValueError("rates must satisfy min_rate <= start_rate <= max_rate")
+        if not isinstance(settings["trials"], int):
+            raise ValueError("trials must be an integer")
+        return cls(slos, **settings)
+
+    @classmethod
+    def load(cls, source):
+        """Load a search spec from a YAML/JSON file, or from an inline JSON string."""
+        return cls.from_dict(read_spec(source))
+
+    def bind(self, environment):
+        """Attach to the environment whose stats and user count the search reads."""
+        self.environment = environment
+
+    def label(self, index):
+        return self.steps[index] if index < len(self.steps) else "done"
+
+    def enter(self, phase, run_time, label):
+        self.phase = phase
+        self.phase_started = run_time
+        self.steps.append(f"{self.rate:g}/s {label}")
+
+    def start_rate_trials(self, rate, run_time):
+        target = min(int(round(rate * self.arrival_window)), self.max_users)
+        self.spawn_rate = max(rate, abs(target - self.target) / self.arrival_window)
+        self.rate = rate
+        self.target = target
+        self.windows = []
+        logging.info(f"Capacity search: trying {rate:g} users/s ({target} users)")
+        self.enter("ramp", run_time, "ramp")
+
+    def at(self, run_time):
+        """
+        Advance the search.
+
+        Returns:
+            tuple: (user target, spawn rate, step index), or None once the
+                search has finished
+        """
+        if self.done:
+            return None
+        if self.phase is None:
+            self.start_rate_trials(self.start_rate, run_time)
+
+        elapsed = run_time - self.phase_started
+        if self.phase == "ramp":
+            users = self.environment.runner.user_count
+            if users == self.target:
+                self.enter("stabilize", run_time, "stabilize")
+            elif elapsed > 2 * self.arrival_window:
+                logging.warning(f"Capacity search: only {users} of {self.target} users started")
+                self.finish_rate(False, run_time)
+        elif self.phase == "stabilize" and elapsed >= self.stabilize:
+            self.start_window(run_time)
+        elif self.phase == "measure" and elapsed >= self.measure:
+            self.finish_window(run_time)
+
+        if self.done:
+            return None
+        return (self.target, self.spawn_rate, len(self.steps) - 1)
+
+    def start_window(self, run_time):
+        self.window_start = [slo.sample(self.environment.stats) for slo in self.slos]
+        self.enter("measure", run_time, f"trial {len(self.windows) + 1}/{self.trials}")
+
+    def finish_window(self, run_time):
+        after = [slo.sample(self.environment.stats) for slo in self.slos]
+        if any(a[0] < b[0] for a, b in zip(after, self.window_start)):
+            logging.info("Capacity search: stats were reset during the window, measuring it again")
+            self.steps.pop()
+            self.start_window(run_time)
+            return
+
+        checks = [slo.evaluate(b, a) for slo, b, a in zip(self.slos, self.window_start, after)]
+        passed = all(ok for ok, _ in checks)
+        self.windows.append({
+            "passed": passed,
+            "observed": {slo.description: observed for slo, (_, observed) in zip(self.slos, checks)},
+        })
+        logging.info(
+            f"Capacity search: {self.rate:g} users/s window {len(self.windows)} "
+            f"{'passed' if passed else 'failed'}: "
+            + ", ".join(f"{slo.description} ({observed})" for slo, (_, observed) in zip(self.slos, checks))
+        )
+
+        majority = self.trials // 2 + 1
+        passes = sum(window["passed"] for window in self.windows)
+        if passes >= majority:
+            self.finish_rate(True, run_time)
+        elif len(self.windows) - passes > self.trials - majority:
+            self.finish_rate(False, run_time)
+        else:
+            self.start_window(run_time)
+
+    def finish_rate(self, passed, run_time):
+        """Record the outcome at the current rate and pick the next rate, or finish."""
+        self.results.append({
+            "rate": self.rate,
+            "users": self.target,
+            "passed": passed,
+            "windows": self.windows,
+        })
+        if passed:
+            self.passed = self.rate if self.passed is None else max(self.passed, self.rate)
+        else:
+            self.failed = self.rate if self.failed is None else min(self.failed, self.rate)
+
+        if self.failed is None:
+            if self.rate >= self.max_rate or self.target >= self.max_users:
+                return self.finish()
+            next_rate = min(self.rate * self.growth, self.max_rate)
+        else:
+            lower = self.passed or 0
+            if self.failed - lower <= self.precision * self.failed:
+                return self.finish()
+            next_rate = (lower + self.failed) / 2
+            if next_rate < self.min_rate:
+                return self.finish()
+        self.start_rate_trials(next_rate, run_time)
+
+    def finish(self):
+        self.done = True
+        if self.passed is None:
+            summary = f"no rate down to {self.min_rate:g} users/s met the SLOs"
+        else:
+            summary = f"{self.passed:g} users/s ({self.capacity_users()} users)"
+            if self.failed is None:
+                summary += ", the top of the search range"
+        logging.info(f"Capacity search finished: {summary}")
+
+        if self.output:
+            with open(self.output, "w") as f:
+                json.dump(self.report(), f, indent=1)
+            logging.info(f"Capacity search report written to {self.output}")
+
+    def capacity_users(self):
+        if self.passed is None:
+            return 0
+        return min(int(round(self.passed * self.arrival_window)), self.max_users)
+
+    def report(self):
+        return {
+            "host": self.environment.host if self.environment else None,
+            "capacity_rate": self.passed,
+            "capacity_users": self.capacity_users(),
+            "lowest_failing_rate": self.failed,
+            "slos": [slo.description for slo in self.slos],
+            "settings": {
+                "start_rate": self.start_rate,
+                "max_rate": self.max_rate,
+                "min_rate": self.min_rate,
+                "growth": self.growth,
+                "arrival_window": self.arrival_window,
+                "stabilize": self.stabilize,
+                "measure": self.measure,
+                "trials": self.trials,
+                "precision": self.precision,
+                "max_users": self.max_users,
+            },
+            "rates": self.results,
+        }
@@ -0,0 +1,248 @@
+"""
+Expert claim strategies and contention metrics for ExpertController#claim.
+
+Every expert polls /expert/queue, which lists the waiting conversations
+oldest first, and claims one of them. The claim reads the conversation,
+checks assigned_expert_id and then updates it, so experts that pick the same
+conversation race: the loser gets 422 "already assigned", and two claims
+that pass the check together both succeed.
+
+A claim strategy decides which waiting conversation an expert claims:
+
+- head: the first one (the original ExpertUser behaviour; every expert
+  races for the same conversation)
+- random[:k]: a random one of the first k (default k = 5)
+- oldest-unassigned: the oldest one without an assigned expert that no
+  expert in this process has won or lost a claim for in the last minute
+  (see ClaimLedger)
+
+Specs are parsed with parse_claim_strategy("random:8").
+
+In the --claim-contention benchmark (ClaimExpertPersona) each claim is
+recorded as a CLAIM row next to the HTTP request; ExpertPersona claims the
+same way without them:
+
+- CLAIM "won": claim latency of successful claims
+- CLAIM "conflict": claim latency of claims lost to another expert
+- CLAIM "queue wait": time from the conversation's createdAt to a won
+  claim (createdAt has second resolution and comes from the server clock)
+- CLAIM "queue empty": polls that found nothing to claim
+- CLAIM "double claim": a conversation won twice in this process within
+  the ledger window, a lost update in the claim's check-then-update (failure)
+
+Conflicts are expected and don't fail the HTTP request; its failures are
+real errors. Double claims across workers only show in the database:
+
+    SELECT conversation_id, COUNT(*) FROM expert_assignments
+    GROUP BY conversation_id HAVING COUNT(*) > 1;
+
+claim_summary() turns the rows into success/conflict rates for the log.
+"""
+
+import random
+import time
+from collections import OrderedDict
+from datetime import datetime
+
+
+CLAIM_PATH = "/expert/conversations/:id/claim"
+
+
+class DoubleClaim(Exception):
+    """Recorded as the failure of CLAIM "double claim" entries."""
+
+
+class ClaimStrategy:
+    """Picks the waiting conversation to claim."""
+    name = None
+
+    def choose(self, waiting, ledger):
+        """
+        Args:
+            waiting (list): waitingConversations of /expert/queue, oldest first
+            ledger (ClaimLedger): Claims seen in this process
+
+        Returns:
+            dict: The conversation to claim, or None
+        """
+        raise NotImplementedError
+
+    @property
+    def description(self):
+        return self.name
+
+
+class HeadOfQueue(ClaimStrategy):
+    name = "head"
+
+    def choose(self, waiting, ledger):
+        return waiting[0] if waiting else None
+
+
+class RandomOfFirstK(ClaimStrategy):
+    """
+    A random one of the first k waiting conversations.
+
+    Args:
+        k (int): How far down the queue experts spread
+    """
+    name = "random"
+
+    def __init__(self, k=5):
+        if k < 1:
+            raise ValueError(f"{self.name} strategy needs k >= 1, got {k}")
+        self.k = k
+
+    def choose(self, waiting, ledger):
+        return random.choice(waiting[:self.k]) if waiting else None
+
+    @property
+    def description(self):
+        return f"{self.name}:{self.k}"
+
+
+class OldestUnassigned(ClaimStrategy):
+    name = "oldest-unassigned"
+
+    def choose(self, waiting, ledger):
+        candidates = [
+            conversation for conversation in waiting
+            if not conversation.get("assignedExpertId") and str(conversation.get("id")) not in ledger
+        ]
+        if not candidates:
+            return None
+        return min(candidates, key=lambda conversation: (conversation.get("createdAt") or "", int(conversation["id"])))
+
+
+CLAIM_STRATEGIES = {
+    strategy.name: strategy for strategy in (HeadOfQueue, RandomOfFirstK, OldestUnassigned)
+}
+
+
+def parse_claim_strategy(spec):
+    """
+    Build a strategy from "head", "random[:k]" or "oldest-unassigned".
+
+    Raises:
+        ValueError: Unknown name or bad k
+    """
+    name, _, k = spec.strip().lower().partition(":")
+    strategy = CLAIM_STRATEGIES.get(name)
+    if strategy is None:
+        raise ValueError(f"unknown claim strategy {spec!r}; expected one of {', '.join(CLAIM_STRATEGIES)}")
+    if strategy is RandomOfFirstK:
+        return RandomOfFirstK(int(k)) if k else RandomOfFirstK()
+    if k:
+        raise ValueError(f"{name} claim strategy takes no argument")
+    return strategy()
+
+
+class ClaimLedger:
+    """
+    Conversations claimed in this process in the last `window` seconds: who
+    won each one, and which ones were lost to a conflict.
+
+    Experts only race for a conversation while it waits in the queue, so a
+    claim is forgotten `window` seconds after it was made. The ledger holds
+    the conversations still being contested rather than every claim of the
+    run.
+
+    Args:
+        window (float): Seconds a claim is remembered
+    """
+
+    def __init__(self, window=60):
+        self.window = window
+        # conversation_id -> (expert_id, time.monotonic()), oldest first
+        self.winners = OrderedDict()
+        # conversation_id -> time.monotonic(), oldest first
+        self.conflicts = OrderedDict()
+
+    def __contains__(self, conversation_id):
+        self.expire()
+        return conversation_id in self.winners or conversation_id in self.conflicts
+
+    def won(self, conversation_id, expert_id):
+        """
+        Record a successful claim.
+
+        Returns:
+            The expert that already held the conversation, or None
+        """
+        self.expire()
+        previous = self.winners.pop(conversation_id, None)
+        self.winners[conversation_id] = (expert_id, time.monotonic())
+        return previous[0] if previous else None
+
+    def lost(self, conversation_id):
+        self.expire()
+        self.conflicts.pop(conversation_id, None)
+        self.conflicts[conversation_id] = time.monotonic()
+
+    def release(self, conversation_id):
+        """Forget a conversation returned to the queue by an unclaim."""
+        self.winners.pop(conversation_id, None)
+        self.conflicts.pop(conversation_id, None)
+
+    def expire(self, now=None):
+        """Forget claims older than the window."""
+        cutoff = (time.monotonic() if now is None else now) - self.window
+        while self.winners and next(iter(self.winners.values()))[1] < cutoff:
+            self.winners.popitem(last=False)
+        while self.conflicts and next(iter(self.conflicts.values())) < cutoff:
+            self.conflicts.popitem(last=False)
+
+
+def is_conflict(response):
+    """Whether a claim response is the 422 for a conversation another expert holds."""
+    return response.status_code == 422 and "already assigned" in (response.text or "")
+
+
+def queue_wait_ms(conversation, now=None):
+    """Milliseconds from a conversation's createdAt to now, or None without one."""
+    created_at = conversation.get("createdAt")
+    if not created_at:
+        return None
+    created = datetime.fromisoformat(created_at.replace("Z", "+00:00")).timestamp()
+    now = datetime.now().timestamp() if now is None else now
+    return max(0.0, (now - created) * 1000)
+
+
+def claim_summary(stats):
+    """
+    One log line of claim outcomes from a RequestStats, or None without claims.
+    """
+    entries = stats.entries
+    won = entries.get(("won", "CLAIM"))
+    conflict = entries.get(("conflict", "CLAIM"))
+    request = entries.get((CLAIM_PATH, "POST"))
+    attempts = request.num_requests if request else 0
+    if not attempts:
+        return None
+    won_count = won.num_requests if won else 0
+    conflict_count = conflict.num_requests if conflict else 0
+    errors = request.num_failures
+    double = entries.get(("double claim", "CLAIM"))
+    empty = entries.get(("queue empty", "CLAIM"))
+
+    parts = [
+        f"{attempts} attempts",
+        f"{won_count / attempts:.1%} won",
+        f"{conflict_count / attempts:.1%} conflicts",
+        f"{errors / attempts:.1%} errors",
+        f"{double.num_requests if double else 0} double claims",
+        f"{empty.num_requests if empty else 0} empty polls",
+    ]
+    for label, entry in (("claim", request), ("won", won), ("conflict", conflict)):
+        if entry and entry.num_requests:
+            parts.append(
+                f"{label} p50 {entry.get_response_time_percentile(0.5):.0f}ms "
+                f"p95 {entry.get_response_time_percentile(0.95):.0f}ms"
+            )
+    wait = entries.get(("queue wait", "CLAIM"))
+    if wait and wait.num_requests:
+        parts.append(
+            f"queue wait p50 {wait.get_response_time_percentile(0.5):.0f}ms "
+            f"p95 {wait.get_response_time_percentile(0.95):.0f}ms"
+        )
+    return ", ".join(parts)
@@ -0,0 +1,66 @@
+"""
+Counts of client-side events that aren't requests.
+
+Some things the personas notice are worth counting but have no latency of
+their own:
+
+- FALLBACK "/auth/register -> /auth/login": a registration that found the
+  name taken and logged in instead, so the server paid for two bcrypt rounds
+- CURSOR "<path> duplicate" / "<path> gap": an item version a --poll-cursor
+  server feed returned twice, or one that only an audit fetch returned (see
+  PollCursor in locustfile.py)
+
+Recording them as Locust request rows would add them to the Aggregated row,
+the total RPS and failure percentage, and the saved HTML reports that
+report_diff.py and usl_fit.py read. ClientEvents keeps them apart: workers
+send their counts with every stats report, and the master (or a local run)
+adds them up and logs them when the test stops.
+"""
+
+import logging
+from collections import Counter
+
+
+class ClientEvents:
+    """Per-run counts of (kind, name) client events."""
+    REPORT_KEY = "client_events"
+
+    def __init__(self):
+        self.counts = Counter()
+
+    def attach(self, environment, is_worker=False):
+        """
+        Ship counts to the master (workers) or collect and log them.
+
+        Args:
+            environment: Locust environment
+            is_worker (bool): This process is a worker
+        """
+        events = environment.events
+        if is_worker:
+            events.report_to_master.add_listener(self.on_report_to_master)
+        else:
+            events.worker_report.add_listener(self.on_worker_report)
+            events.test_start.add_listener(self.on_test_start)
+            events.test_stop.add_listener(self.on_test_stop)
+
+    def count(self, kind, name, n=1):
+        self.counts[(kind, name)] += n
+
+    def on_report_to_master(self, client_id, data):
+        if self.counts:
+            data[self.REPORT_KEY] = [[kind, name, n] for (kind, name), n in self.counts.items()]
+            self.counts = Counter()
+
+    def on_worker_report(self, client_id, data):
+        for kind, name, n in data.get(self.REPORT_KEY, ()):
+            self.counts[(kind, name)] += n
+
+    def on_test_start(self, **kwargs):
+        self.counts = Counter()
+
+    def on_test_stop(self, **kwargs):
+        if self.counts:
+            logging.info("Client events: " + ", ".join(
+                f"{kind} {name}: {n}" for (kind, name), n in sorted(self.counts.items())
+            ))
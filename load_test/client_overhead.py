@@ -0,0 +1,267 @@
+"""
+Load-generator overhead accounting for the locustfile personas.
+
+Locust measures a request's response time around the network call, but the
+call runs in a gevent greenlet. When the generator's own CPU is busy (JSON
+decoding of long lists, Python-side scanning, Locust's bookkeeping), the
+greenlet waits to be scheduled again and that wait is counted as response
+time. Numbers from a saturated generator therefore look like a slow backend.
+
+The profiler is off by default. With --overhead-report PREFIX it records,
+per process:
+
+- "task code": time each task spent outside its HTTP requests
+  (task wall time minus the response times of the requests it made, including
+  requests from greenlets it spawned, e.g. --concurrent-polls; parallel
+  requests are summed, capped at the task's wall time)
+- "json decode": time to decode each response body passed to
+  decode_json, with the body size as the response length
+- "event loop lag": how late a greenlet sleeping for
+  LAG_INTERVAL seconds wakes up; this delay is added to any response time
+  measured at the same moment
+- "cpu percent": process CPU usage, sampled by Locust every 10s
+- "task overhead percent": share of task time spent outside the network,
+  over the same 10s window
+
+When a window's CPU usage, task overhead share or worst event loop lag passes
+its threshold, the window is counted as "generator saturated" and a warning
+is logged (once until the generator recovers). Response times measured during
+such windows include generator delay and shouldn't be blamed on the backend:
+add workers, switch to --http-client fast, or lower the load.
+
+The measurements stay out of Locust's request stats, so they don't change
+request counts, RPS or failure rates. OverheadRecorder writes them per
+load-shape step to <prefix>_overhead.csv/.json: count, mean, percentiles and
+max of every metric (see step_report.py).
+"""
+
+import functools
+import logging
+import time
+
+import gevent
+
+from hdr_histogram import HdrHistogram
+from step_report import StepReporter
+
+
+HTTP_METHODS = {"GET", "POST", "PUT", "PATCH", "DELETE", "HEAD", "OPTIONS"}
+
+
+# Metric -> unit of its values
+METRICS = {
+    "task code": "ms",
+    "json decode": "ms",
+    "event loop lag": "ms",
+    "cpu percent": "%",
+    "task overhead percent": "%",
+    "generator saturated": "%",
+}
+PERCENTILES = (50, 95, 99)
+
+
+class OverheadProfiler:
+    """
+    Measures how much of each task the generator spends on itself.
+
+    Args:
+        threshold (float): Task overhead share, in percent, that counts as
+            saturated; 0 disables the check
+        cpu_threshold (float): Process CPU usage, in percent, that counts as
+            saturated; 0 disables the check
+    """
+    LAG_INTERVAL = 0.5
+    LAG_THRESHOLD_MS = 100
+
+    def __init__(self, threshold=25, cpu_threshold=85):
+        self.threshold = threshold
+        self.cpu_threshold = cpu_threshold
+        self.recorder = None
+        self.network_time = {}
+        self.saturated = False
+        self.lag_greenlet = None
+        self.reset_window()
+
+    def reset_window(self):
+        self.task_ms = 0.0
+        self.network_ms = 0.0
+        self.decode_ms = 0.0
+        self.max_lag_ms = 0.0
+
+    def attach(self, recorder):
+        """Start recording into an OverheadRecorder."""
+        self.recorder = recorder
+        events = recorder.environment.events
+        events.request.add_listener(self.on_request)
+        events.usage_monitor.add_listener(self.on_usage_monitor)
+        events.test_start.add_listener(self.on_test_start)
+        events.test_stop.add_listener(self.on_test_stop)
+
+    def install(self, user_class):
+        """Time every task of a user class."""
+        user_class.tasks = [self.wrap(task) for task in user_class.tasks]
+
+    def wrap(self, task):
+        @functools.wraps(task)
+        def timed_task(user):
+            greenlet = gevent.getcurrent()
+            network = self.network_time[greenlet] = [0.0]
+            started = time.perf_counter()
+            try:
+                task(user)
+            finally:
+                elapsed = (time.perf_counter() - started) * 1000
+                del self.network_time[greenlet]
+                self.task_ms += elapsed
+                self.network_ms += min(network[0], elapsed)
+                self.record("task code", max(0.0, elapsed - network[0]))
+        return timed_task
+
+    def network_of(self, greenlet):
+        """Network time accumulator of the task running in greenlet, or in a greenlet that spawned it."""
+        while greenlet is not None:
+            network = self.network_time.get(greenlet)
+            if network is not None:
+                return network
+            parent = getattr(greenlet, "spawning_greenlet", None)
+            greenlet = parent() if parent is not None else None
+        return None
+
+    def on_request(self, request_type, response_time, **kwargs):
+        if request_type not in HTTP_METHODS:
+            return
+        network = self.network_of(gevent.getcurrent())
+        if network is not None:
+            network[0] += response_time or 0
+
+    def decode_json(self, response):
+        """
+        response.json(), timed as "json decode" while the profiler is attached.
+
+        Works with both HTTP clients.
+        """
+        if self.recorder is None:
+            return response.json()
+        started = time.perf_counter()
+        try:
+            return response.json()
+        finally:
+            elapsed = (time.perf_counter() - started) * 1000
+            self.decode_ms += elapsed
+            self.record("json decode", elapsed, len(response.content or b""))
+
+    def on_test_start(self, **kwargs):
+        if self.lag_greenlet is None:
+            self.lag_greenlet = gevent.spawn(self.watch_loop_lag)
+        self.reset_window()
+
+    def on_test_stop(self, **kwargs):
+        if self.lag_greenlet is not None:
+            self.lag_greenlet.kill(block=False)
+            self.lag_greenlet = None
+
+    def watch_loop_lag(self):
+        while True:
+            started = time.perf_counter()
+            gevent.sleep(self.LAG_INTERVAL)
+            lag = max(0.0, (time.perf_counter() - started - self.LAG_INTERVAL) * 1000)
+            self.max_lag_ms = max(self.max_lag_ms, lag)
+            self.record("event loop lag", lag)
+
+    def on_usage_monitor(self, environment, cpu_usage, **kwargs):
+        """Evaluate the window since the last CPU sample (every 10s)."""
+        if self.lag_greenlet is None:
+            return
+        overhead = 100 * (self.task_ms - self.network_ms) / self.task_ms if self.task_ms else 0.0
+        self.record("cpu percent", cpu_usage)
+        if self.task_ms:
+            self.record("task overhead percent", overhead)
+
+        reasons = []
+        if self.cpu_threshold and cpu_usage >= self.cpu_threshold:
+            reasons.append(f"CPU {cpu_usage:.0f}%")
+        if self.threshold and self.task_ms and overhead >= self.threshold:
+            reasons.append(
+                f"{overhead:.0f}% of task time outside the network "
+                f"({self.decode_ms / self.task_ms:.0%} JSON decoding)"
+            )
+        if self.max_lag_ms >= self.LAG_THRESHOLD_MS:
+            reasons.append(f"event loop lag up to {self.max_lag_ms:.0f}ms")
+        self.reset_window()
+
+        if reasons:
+            message = "load generator saturated: " + ", ".join(reasons)
+            self.record("generator saturated", overhead)
+            if not self.saturated:
+                logging.warning(
+                    f"{message}. Response times include generator delay; add workers, "
+                    "use --http-client fast or lower the load."
+                )
+        elif self.saturated:
+            logging.info("load generator no longer saturated")
+        self.saturated = bool(reasons)
+
+    def record(self, name, value, length=0):
+        if self.recorder is not None:
+            self.recorder.record(name, value, length)
+
+
+class OverheadRecorder(StepReporter):
+    """
+    Collects the profiler's metrics per load-shape step.
+
+    Writes <prefix>_overhead.csv and <prefix>_overhead.json (see
+    StepReporter for the arguments). Values are kept in HdrHistograms at
+    1/1000 of their unit.
+    """
+    REPORT_KEY = "overhead"
+    FILE_SUFFIX = "_overhead"
+
+    def __init__(self, environment, current_step, output_prefix, is_worker=False):
+        self.histograms = {}
+        self.lengths = {}
+        super().__init__(environment, current_step, output_prefix, is_worker)
+
+    def histogram(self, name):
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            histogram = self.histograms[name] = HdrHistogram()
+        return histogram
+
+    def on_request(self, **kwargs):
+        # fed by OverheadProfiler.record, not by requests
+        pass
+
+    def record(self, name, value, length=0):
+        self.histogram(name).record(value * 1000)
+        if length:
+            self.lengths[name] = self.lengths.get(name, 0) + length
+
+    def take(self):
+        data = [[name, histogram.to_sparse(), self.lengths.get(name, 0)] for name, histogram in self.histograms.items()]
+        self.histograms = {}
+        self.lengths = {}
+        return data
+
+    def merge(self, data):
+        for name, sparse, length in data:
+            self.histogram(name).merge_sparse(sparse)
+            if length:
+                self.lengths[name] = self.lengths.get(name, 0) + length
+
+    def step_rows(self, duration):
+        rows = []
+        for name, histogram in sorted(self.histograms.items()):
+            values = histogram.percentiles(PERCENTILES)
+            rows.append({
+                "metric": name,
+                "unit": METRICS.get(name, ""),
+                "count": histogram.total,
+                "mean": round(histogram.mean() / 1000, 2),
+                **{f"p{p}": round(values[p] / 1000, 2) for p in PERCENTILES},
+                "max": round(histogram.max / 1000, 2),
+                "bytes": self.lengths.get(name, 0),
+            })
+        self.histograms = {}
+        self.lengths = {}
+        return rows
@@ -0,0 +1,164 @@
+"""
+Read-after-write consistency and visibility lag checks for scaled-out runs.
+
+With several app instances behind a balancer, a message written through
+one instance should be readable through any other at once. A per-instance
+cache, a lagging read replica or a stale cached response breaks that.
+ConsistencyPersona in locustfile.py samples its own writes:
+
+1. POST /messages to its own conversation
+2. look for the returned message ID in GET /conversations/:id/messages and
+   GET /api/messages/updates, right after the write and then at
+   READ_DELAYS intervals, until each path shows it or --consistency-timeout
+   passes
+
+The checker users, their requests ("... [consistency]") and every
+measurement are separate from the normal personas. Load is bounded: a fixed
+number of checkers (--consistency-checkers), one sample per checker every
+--consistency-interval seconds, at most 6 + timeout reads per path and
+sample (READ_DELAYS levels off at one read a second), and a fresh
+conversation every MESSAGES_PER_CONVERSATION samples so the message lists
+stay short.
+
+Every read path gets three CONSISTENCY rows:
+
+- "<path> read": every read-back; failed (StaleRead) when the message was
+  missing, so the failure rate is the stale read rate
+- "<path> visibility lag": time from the write's response to the start of
+  the first read that showed the message (about 0 for fresh reads), with
+  the number of reads it took as the response length
+- "<path> not visible": failed samples still missing after the timeout
+
+Lag is measured on one process's monotonic clock, so it needs no clock
+sync. With --consistency-report PREFIX, ConsistencyRecorder also writes
+<prefix>_consistency.csv/.json with one row per path and shape step (see
+step_report.py).
+"""
+
+from hdr_histogram import HdrHistogram
+from step_report import StepReporter
+
+
+READ_PATHS = ("/conversations/:id/messages", "/api/messages/updates")
+KINDS = ("read", "visibility lag", "not visible")
+
+# Pause before each read-back after the first, in seconds; the last one repeats
+READ_DELAYS = (0.05, 0.1, 0.2, 0.4, 0.8, 1.0)
+MESSAGES_PER_CONVERSATION = 25
+LAG_PERCENTILES = (50, 95, 99)
+
+# Per-path counters, in this order in the lists shipped to the master
+FIELDS = ("reads", "stale_reads", "visible", "fresh", "not_visible", "visible_reads")
+
+
+class StaleRead(Exception):
+    """A read-back that didn't show a message already written."""
+
+
+class NotVisible(Exception):
+    """A message still missing from a read path after the timeout."""
+
+
+def metric_name(path, kind):
+    """Name of the CONSISTENCY row for a read path and one of KINDS."""
+    return f"{path} {kind}"
+
+
+METRIC_NAMES = {metric_name(path, kind): (path, kind) for path in READ_PATHS for kind in KINDS}
+
+
+def read_delays():
+    """Pauses between read-backs: READ_DELAYS, then its last value forever."""
+    yield from READ_DELAYS
+    while True:
+        yield READ_DELAYS[-1]
+
+
+def contains_message(messages, message_id):
+    """Whether a decoded message list has a message with this ID."""
+    return isinstance(messages, list) and any(
+        isinstance(message, dict) and str(message.get("id")) == message_id for message in messages
+    )
+
+
+class ConsistencyRecorder(StepReporter):
+    """
+    Collects the CONSISTENCY rows per read path and per load-shape step.
+
+    Writes <prefix>_consistency.csv and <prefix>_consistency.json (see
+    StepReporter for the arguments).
+    """
+    REPORT_KEY = "consistency"
+    FILE_SUFFIX = "_consistency"
+
+    def __init__(self, environment, current_step, output_prefix, is_worker=False):
+        self.counters = {}
+        self.lags = {}
+        super().__init__(environment, current_step, output_prefix, is_worker)
+
+    def counter(self, path):
+        counter = self.counters.get(path)
+        if counter is None:
+            counter = self.counters[path] = [0] * len(FIELDS)
+        return counter
+
+    def lag_histogram(self, path):
+        histogram = self.lags.get(path)
+        if histogram is None:
+            histogram = self.lags[path] = HdrHistogram(max_value=600_000_000)
+        return histogram
+
+    def on_request(self, request_type, name, response_time, response_length, exception=None, **kwargs):
+        if request_type != "CONSISTENCY" or name not in METRIC_NAMES:
+            return
+        path, kind = METRIC_NAMES[name]
+        counter = self.counter(path)
+        if kind == "read":
+            counter[0] += 1
+            counter[1] += exception is not None
+        elif kind == "visibility lag":
+            counter[2] += 1
+            counter[3] += response_length == 1
+            counter[5] += response_length
+            self.lag_histogram(path).record(response_time * 1000)
+        else:
+            counter[4] += 1
+
+    def take(self):
+        data = [
+            [path, counter, self.lags[path].to_sparse() if path in self.lags else None]
+            for path, counter in self.counters.items()
+        ]
+        self.counters = {}
+        self.lags = {}
+        return data
+
+    def merge(self, data):
+        for path, values, sparse in data:
+            counter = self.counter(path)
+            for i, value in enumerate(values):
+                counter[i] += value
+            if sparse is not None:
+                self.lag_histogram(path).merge_sparse(sparse)
+
+    def step_rows(self, duration):
+        rows = []
+        for path, values in sorted(self.counters.items()):
+            c = dict(zip(FIELDS, values))
+            samples = c["visible"] + c["not_visible"]
+            histogram = self.lags.get(path)
+            lag = histogram.percentiles(LAG_PERCENTILES) if histogram else {}
+            rows.append({
+                "path": path,
+                "samples": samples,
+                "fresh_pct": round(100 * c["fresh"] / samples, 2) if samples else "",
+                "not_visible": c["not_visible"],
+                "reads": c["reads"],
+                "stale_read_pct": round(100 * c["stale_reads"] / c["reads"], 2) if c["reads"] else "",
+                "reads_per_sample": round(c["visible_reads"] / c["visible"], 2) if c["visible"] else "",
+                **{f"lag_p{p}_ms": round(lag[p] / 1000, 1) if lag else "" for p in LAG_PERCENTILES},
+                "lag_max_ms": round(histogram.max / 1000, 1) if histogram else "",
+            })
+        self.counters = {}
+        self.lags = {}
+        return rows
@@ -0,0 +1,168 @@
+"""
+HdrHistogram-style latency recording with per-step percentile reports.
+
+HdrHistogram keeps a fixed array of log-linear buckets, so memory does not
+grow with the number of requests, and every bucket is narrower than a fixed
+fraction of its value, so tail percentiles stay accurate. Locust's own
+response-time buckets round more coarsely and are aggregated over the whole
+run.
+
+StepLatencyRecorder keeps one histogram per stats row (request type + name)
+for the current step of the load shape. When the step changes, it writes
+p50/p90/p99/p99.9/max for every row to CSV and JSON. In distributed runs,
+workers attach their histograms to the regular stats report and the master
+merges them (see step_report.py).
+"""
+
+import math
+from array import array
+
+from step_report import StepReporter
+
+
+PERCENTILES = (50, 90, 99, 99.9)
+
+
+class HdrHistogram:
+    """
+    Fixed-size log-linear histogram of integer microsecond values.
+
+    Values below 2**SUB_BUCKET_BITS get a bucket each. Above that, every
+    power-of-two range is split into 2**SUB_BUCKET_BITS buckets, so a bucket
+    is never wider than 1/1024 (about 0.1%) of the values it holds. With the
+    default one-hour range that is about 23.5k counters (190 KB) per histogram,
+    however many values are recorded. Values beyond the range are counted in
+    the last bucket; the true maximum is tracked separately.
+    """
+    SUB_BUCKET_BITS = 10
+
+    def __init__(self, max_value=3_600_000_000):
+        self.sub_bucket_count = 1 << self.SUB_BUCKET_BITS
+        self.last_index = self.index_of(max_value)
+        self.counts = array("Q", bytes(8 * (self.last_index + 1)))
+        self.total = 0
+        self.sum = 0
+        self.max = 0
+
+    def index_of(self, value):
+        if value < self.sub_bucket_count:
+            return value
+        shift = value.bit_length() - 1 - self.SUB_BUCKET_BITS
+        return (shift + 1) * self.sub_bucket_count + (value >> shift) - self.sub_bucket_count
+
+    def highest_value_of(self, index):
+        """Largest value that falls into bucket index."""
+        if index < self.sub_bucket_count:
+            return index
+        shift = index // self.sub_bucket_count - 1
+        mantissa = index % self.sub_bucket_count + self.sub_bucket_count
+        return ((mantissa + 1) << shift) - 1
+
+    def record(self, value, count=1):
+        """Record a value in microseconds."""
+        value = max(0, int(value))
+        self.counts[min(self.index_of(value), self.last_index)] += count
+        self.total += count
+        self.sum += value * count
+        if value > self.max:
+            self.max = value
+
+    def percentiles(self, percentiles=PERCENTILES):
+        """
+        Values at the given percentiles, in one pass over the buckets.
+
+        Returns:
+            dict: percentile -> value in microseconds (0 when empty)
+        """
+        result = {p: 0 for p in percentiles}
+        if not self.total:
+            return result
+        targets = sorted((max(1, math.ceil(p / 100 * self.total)), p) for p in percentiles)
+        seen = 0
+        position = 0
+        for index, count in enumerate(self.counts):
+            if not count:
+                continue
+            seen += count
+            while position < len(targets) and seen >= targets[position][0]:
+                result[targets[position][1]] = min(self.highest_value_of(index), self.max)
+                position += 1
+            if position == len(targets):
+                break
+        return result
+
+    def mean(self):
+        return self.sum / self.total if self.total else 0
+
+    def to_sparse(self):
+        """Non-empty buckets as parallel lists, small enough to ship to the master."""
+        indexes = [i for i, count in enumerate(self.counts) if count]
+        return {
+            "indexes": indexes,
+            "counts": [self.counts[i] for i in indexes],
+            "sum": self.sum,
+            "max": self.max,
+        }
+
+    def merge_sparse(self, sparse):
+        """Add the buckets of another histogram's to_sparse() output."""
+        for index, count in zip(sparse["indexes"], sparse["counts"]):
+            self.counts[index] += count
+            self.total += count
+        self.sum += sparse["sum"]
+        self.max = max(self.max, sparse["max"])
+
+
+class StepLatencyRecorder(StepReporter):
+    """
+    Collects HdrHistograms per stats row and per load-shape step.
+
+    Writes <prefix>_steps.csv and <prefix>_steps.json (see StepReporter for
+    the arguments).
+    """
+    REPORT_KEY = "hdr_histograms"
+    FILE_SUFFIX = "_steps"
+
+    def __init__(self, environment, current_step, output_prefix, is_worker=False):
+        self.histograms = {}
+        super().__init__(environment, current_step, output_prefix, is_worker)
+
+    def histogram(self, key):
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            histogram = self.histograms[key] = HdrHistogram()
+        return histogram
+
+    def on_request(self, request_type, name, response_time, **kwargs):
+        if response_time is None:
+            return
+        self.histogram((request_type, name)).record(response_time * 1000)
+
+    def take(self):
+        data = [
+            [request_type, name, histogram.to_sparse()]
+            for (request_type, name), histogram in self.histograms.items()
+        ]
+        self.histograms = {}
+        return data
+
+    def merge(self, data):
+        for request_type, name, sparse in data:
+            self.histogram((request_type, name)).merge_sparse(sparse)
+
+    def step_rows(self, duration):
+        rows = []
+        for (request_type, name), histogram in sorted(self.histograms.items()):
+            if not histogram.total:
+                continue
+            values = histogram.percentiles()
+            rows.append({
+                "type": request_type,
+                "name": name,
+                "count": histogram.total,
+                "mean_ms": round(histogram.mean() / 1000, 3),
+                **{f"p{p:g}_ms": round(values[p] / 1000, 3) for p in PERCENTILES},
+                "max_ms": round(histogram.max / 1000, 3),
+            })
+        self.histograms = {}
+        return rows
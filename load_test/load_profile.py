@@ -0,0 +1,354 @@
+"""
+Declarative arrival-rate profiles for the locustfile's load shape.
+
+A profile is a list of segments, each describing the arrival rate (new
+users/sec) over its duration. Users are never stopped, so the user target at
+time t is the integral of the arrival rate up to t, capped at max_users.
+
+Segment types:
+    step   {rate, duration}                   constant arrival rate
+    gap    {duration}                         no arrivals; users hold steady (alias: plateau)
+    ramp   {from, to, duration}               rate changes linearly
+    spike  {peak, duration, base=0}           rate rises linearly from base to peak
+                                              over the first half, then back down
+    sine   {mean, amplitude, period, duration, phase=0}
+                                              diurnal curve: mean + amplitude * sin(2*pi*t/period + phase)
+    steps  {rates, active, gap=0}             shorthand for step/gap pairs, one per rate
+
+Top-level keys:
+    segments   list of segments (required)
+    max_users  cap on the user target (default 30000)
+    end        "hold" keeps the final users running, "stop" ends the test (default "hold")
+
+Profiles are YAML or JSON files, or a JSON string given directly on the
+command line, e.g.:
+
+    --shape-profile profiles/spike.yaml
+    --shape-profile '{"segments": [{"type": "ramp", "from": 0, "to": 50, "duration": 300}]}'
+
+The cumulative user count at each segment boundary is computed once, when
+the profile is loaded, so evaluating the profile at a point in time is O(1).
+
+Run this module on a profile to validate it and print its schedule:
+
+    python load_profile.py profiles/spike.yaml
+"""
+
+import bisect
+import json
+import math
+import os
+import sys
+
+
+DEFAULT_PROFILE = {
+    "max_users": 30000,
+    "end": "hold",
+    "segments": [
+        {"type": "steps", "rates": [2, 8, 32, 64, 128, 256, 512, 1024], "active": 60, "gap": 10},
+    ],
+}
+
+
+class Segment:
+    """A span of the profile with its own arrival-rate curve."""
+    type = None
+    fields = {}
+
+    def __init__(self, duration, label):
+        self.duration = duration
+        self.label = label
+
+    def rate(self, t):
+        """Arrival rate (users/sec) t seconds into the segment."""
+        raise NotImplementedError
+
+    def arrivals(self, t):
+        """Users arrived in the first t seconds of the segment."""
+        raise NotImplementedError
+
+
+class Step(Segment):
+    type = "step"
+    fields = {"rate": True, "duration": True}
+
+    def __init__(self, rate, duration):
+        super().__init__(duration, f"{rate:g}/s")
+        self.constant_rate = rate
+
+    def rate(self, t):
+        return self.constant_rate
+
+    def arrivals(self, t):
+        return self.constant_rate * t
+
+
+class Gap(Step):
+    type = "gap"
+    fields = {"duration": True}
+
+    def __init__(self, duration):
+        super().__init__(0, duration)
+        self.label = "gap"
+
+
+class Ramp(Segment):
+    type = "ramp"
+    fields = {"from": True, "to": True, "duration": True}
+
+    def __init__(self, start_rate, end_rate, duration):
+        super().__init__(duration, f"ramp {start_rate:g}->{end_rate:g}/s")
+        self.start_rate = start_rate
+        self.slope = (end_rate - start_rate) / duration
+
+    def rate(self, t):
+        return self.start_rate + self.slope * t
+
+    def arrivals(self, t):
+        return self.start_rate * t + self.slope * t * t / 2
+
+
+class Spike(Segment):
+    type = "spike"
+    fields = {"peak": True, "duration": True, "base": False}
+
+    def __init__(self, peak, duration, base=0):
+        super().__init__(duration, f"spike {peak:g}/s")
+        half = duration / 2
+        self.up = Ramp(base, peak, half)
+        self.down = Ramp(peak, base, half)
+        self.half = half
+
+    def rate(self, t):
+        if t < self.half:
+            return self.up.rate(t)
+        return self.down.rate(t - self.half)
+
+    def arrivals(self, t):
+        if t < self.half:
+            return self.up.arrivals(t)
+        return self.up.arrivals(self.half) + self.down.arrivals(t - self.half)
+
+
+class Sine(Segment):
+    type = "sine"
+    fields = {"mean": True, "amplitude": True, "period": True, "duration": True, "phase": False}
+
+    def __init__(self, mean, amplitude, period, duration, phase=0):
+        super().__init__(duration, f"sine {mean:g}+-{amplitude:g}/s")
+        self.mean = mean
+        self.amplitude = amplitude
+        self.omega = 2 * math.pi / period
+        self.phase = phase
+
+    def rate(self, t):
+        return self.mean + self.amplitude * math.sin(self.omega * t + self.phase)
+
+    def arrivals(self, t):
+        return self.mean * t + self.amplitude / self.omega * (math.cos(self.phase) - math.cos(self.omega * t + self.phase))
+
+
+SEGMENT_TYPES = {cls.type: cls for cls in (Step, Gap, Ramp, Spike, Sine)}
+
+
+def build_segments(spec, where):
+    """
+    Validate one segment spec and turn it into Segment objects.
+
+    Args:
+        spec (dict): Segment spec from the profile
+        where (str): Position in the profile, for error messages
+
+    Returns:
+        list: Segments (the steps shorthand expands to several)
+    """
+    if not isinstance(spec, dict) or "type" not in spec:
+        raise ValueError(f"{where}: segment must be a mapping with a 'type'")
+    kind = spec["type"]
+    params = {k: v for k, v in spec.items() if k != "type"}
+
+    if kind == "plateau":
+        kind = "gap"
+    if kind == "steps":
+        unknown = set(params) - {"rates", "active", "gap"}
+        if unknown:
+            raise ValueError(f"{where}: unknown steps field(s) {sorted(unknown)}")
+        rates, active, gap = params.get("rates"), params.get("active"), params.get("gap", 0)
+        if not isinstance(rates, list) or not rates:
+            raise ValueError(f"{where}: steps needs a non-empty 'rates' list")
+        segments = []
+        for i, rate in enumerate(rates):
+            segments += build_segments({"type": "step", "rate": rate, "duration": active}, f"{where}.rates[{i}]")
+            if gap:
+                segments += build_segments({"type": "gap", "duration": gap}, f"{where}.gap")
+        return segments
+
+    cls = SEGMENT_TYPES.get(kind)
+    if cls is None:
+        raise ValueError(f"{where}: unknown segment type {kind!r}")
+    missing = [name for name, required in cls.fields.items() if required and name not in params]
+    unknown = set(params) - set(cls.fields)
+    if missing:
+        raise ValueError(f"{where}: {kind} is missing {missing}")
+    if unknown:
+        raise ValueError(f"{where}: unknown {kind} field(s) {sorted(unknown)}")
+    for name, value in params.items():
+        if not isinstance(value, (int, float)) or isinstance(value, bool):
+            raise ValueError(f"{where}: {kind}.{name} must be a number")
+        if name != "phase" and value < 0:
+            raise ValueError(f"{where}: {kind}.{name} must not be negative")
+    if params["duration"] <= 0:
+        raise ValueError(f"{where}: {kind}.duration must be positive")
+    if kind == "sine":
+        if params["period"] <= 0:
+            raise ValueError(f"{where}: sine.period must be positive")
+        if params["amplitude"] > params["mean"]:
+            raise ValueError(f"{where}: sine.amplitude must not exceed mean (rates can't go negative)")
+
+    if kind == "ramp":
+        return [Ramp(params["from"], params["to"], params["duration"])]
+    return [cls(**params)]
+
+
+def read_spec(source):
+    """
+    Read a YAML/JSON spec file, or parse an inline JSON string.
+
+    Args:
+        source (str): File path, or a string starting with "{"
+
+    Returns:
+        The parsed document
+    """
+    if source.lstrip().startswith("{"):
+        return json.loads(source)
+
+    with open(source) as f:
+        text = f.read()
+    if os.path.splitext(source)[1].lower() in (".yaml", ".yml"):
+        try:
+            import yaml
+        except ImportError:
+            raise ValueError(f"{source}: reading YAML needs PyYAML (pip install pyyaml)")
+        return yaml.safe_load(text)
+    return json.loads(text)
+
+
+class LoadProfile:
+    """
+    A validated profile with precomputed segment boundaries.
+
+    starts[i] and users_before[i] hold the start time of segment i and the
+    user target at that moment, so at() only evaluates the current segment.
+    """
+    def __init__(self, segments, max_users=30000, end="hold"):
+        self.segments = segments
+        self.max_users = max_users
+        self.end = end
+
+        self.starts = []
+        self.users_before = []
+        elapsed = users = 0.0
+        for segment in segments:
+            self.starts.append(elapsed)
+            self.users_before.append(users)
+            elapsed += segment.duration
+            users += segment.arrivals(segment.duration)
+        self.duration = elapsed
+        self.total_users = users
+        self.cursor = 0
+
+    @classmethod
+    def from_dict(cls, spec):
+        """Validate a profile mapping and build it."""
+        if not isinstance(spec, dict):
+            raise ValueError("profile must be a mapping")
+        unknown = set(spec) - {"segments", "max_users", "end"}
+        if unknown:
+            raise ValueError(f"unknown profile field(s) {sorted(unknown)}")
+        max_users = spec.get("max_users", 30000)
+        end = spec.get("end", "hold")
+        if not isinstance(max_users, int) or max_users <= 0:
+            raise ValueError("max_users must be a positive integer")
+        if end not in ("hold", "stop"):
+            raise ValueError("end must be 'hold' or 'stop'")
+        segment_specs = spec.get("segments")
+        if not isinstance(segment_specs, list) or not segment_specs:
+            raise ValueError("profile needs a non-empty 'segments' list")
+
+        segments = []
+        for i, segment_spec in enumerate(segment_specs):
+            segments += build_segments(segment_spec, f"segments[{i}]")
+        return cls(segments, max_users=max_users, end=end)
+
+    @classmethod
+    def load(cls, source):
+        """
+        Load a profile from a YAML/JSON file, or from an inline JSON string.
+
+        Args:
+            source (str): File path, or a string starting with "{"
+        """
+        return cls.from_dict(read_spec(source))
+
+    def label(self, index):
+        """Label of segment index, as returned by at(); "hold" past the end."""
+        return self.segments[index].label if index < len(self.segments) else "hold"
+
+    def locate(self, run_time):
+        """
+        Index of the segment containing run_time.
+
+        Run time only moves forward during a test, so the cached cursor
+        normally advances by at most one; bisect covers any jump backwards.
+        """
+        cursor = self.cursor
+        if run_time < self.starts[cursor]:
+            cursor = bisect.bisect_right(self.starts, run_time) - 1
+        while cursor + 1 < len(self.segments) and run_time >= self.starts[cursor + 1]:
+            cursor += 1
+        self.cursor = cursor
+        return cursor
+
+    def at(self, run_time):
+        """
+        Evaluate the profile.
+
+        Returns:
+            tuple: (user target, spawn rate, segment index), or None once the
+                profile is over and end is "stop". Past the end with "hold",
+                the segment index is len(segments).
+        """
+        if run_time >= self.duration:
+            if self.end == "stop":
+                return None
+            return (min(int(self.total_users), self.max_users), 0, len(self.segments))
+
+        index = self.locate(run_time)
+        segment = self.segments[index]
+        t = run_time - self.starts[index]
+        users = self.users_before[index] + segment.arrivals(t)
+        return (min(int(users), self.max_users), segment.rate(t), index)
+
+
+def main():
+    if len(sys.argv) != 2:
+        print(f"usage: {sys.argv[0]} PROFILE", file=sys.stderr)
+        return 2
+    try:
+        profile = LoadProfile.load(sys.argv[1])
+    except (OSError, ValueError) as e:
+        print(f"invalid profile: {e}", file=sys.stderr)
+        return 1
+
+    print(f"{'#':>3} {'start':>8} {'duration':>9} {'users at start':>15}  segment")
+    for i, segment in enumerate(profile.segments):
+        users = min(int(profile.users_before[i]), profile.max_users)
+        print(f"{i:>3} {profile.starts[i]:>7.0f}s {segment.duration:>8.0f}s {users:>15}  {segment.label}")
+    print(f"total: {profile.duration:.0f}s, {min(int(profile.total_users), profile.max_users)} users "
+          f"(cap {profile.max_users}), then {profile.end}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
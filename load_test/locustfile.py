@@ -5,73 +5,97 @@ User personas:
 1. IdleUser: Logs in and polls for updates every 5 seconds (weight: 10)
 2. ActiveUser: Creates conversations, sends messages, and browses (weight: 3)
 3. ExpertUser: Checks expert queue, claims conversations, responds (weight: 1)
+4. StreamingUser: Holds an SSE connection instead of polling (weight: 10,
+   replaces IdleUser with --update-mode sse)
+5. ReplayUser: Replays captured production traffic (--replay, replaces all
+   of the above; see traffic_replay.py)
+6. ClaimExpertUser + ClaimAskerUser: Expert claim contention benchmark
+   (--claim-contention, replaces all of the above; see claim_contention.py)
+7. ConsistencyUser: Read-after-write checker, added to any of the above
+   (--consistency-checkers; see consistency.py)
+
+Every persona is defined once and runs on either HTTP client:
+- IdleUser / ActiveUser / ExpertUser / StreamingUser / ReplayUser / ClaimExpertUser /
+  ClaimAskerUser / ConsistencyUser use python-requests (HttpUser)
+- FastIdleUser / FastActiveUser / FastExpertUser / FastStreamingUser / FastReplayUser /
+  FastClaimExpertUser / FastClaimAskerUser / FastConsistencyUser use geventhttpclient
+  (FastHttpUser)
+
+Pick the set with --http-client requests|fast (or LOCUST_HTTP_CLIENT).
+The fast client uses far less CPU per request, so a single worker can keep
+up with the 512-1024 users/sec steps. See bench_http_clients.py.
 """
 
+import json
+import logging
+import math
 import random
+import re
 import threading
-from datetime import datetime
-from locust import HttpUser, task, between
+import time
+from datetime import datetime, timedelta
+import gevent
+import locust
+from gevent.event import AsyncResult
+from locust import HttpUser, FastHttpUser, User, task, between, constant, constant_pacing, events
+from locust.exception import StopUser
+from locust.runners import MasterRunner, WorkerRunner
+
+from user_fixture import read_manifest, read_user_fixture
+from token_manager import TokenManager, session_cookie
 
 
 from locust import LoadTestShape
 
+from load_profile import DEFAULT_PROFILE, LoadProfile
+from open_loop import ARRIVAL_PROCESSES, OpenLoopScheduler
+from hdr_histogram import StepLatencyRecorder
+from bandwidth import ACCEPT_ENCODINGS, BandwidthRecorder, count_decoded, force_accept_encoding
+from capacity_finder import CapacitySearch
+from consistency import (
+    MESSAGES_PER_CONVERSATION, READ_PATHS, ConsistencyRecorder, NotVisible, StaleRead, contains_message,
+    metric_name, read_delays,
+)
+from claim_contention import (
+    CLAIM_PATH, ClaimLedger, DoubleClaim, HeadOfQueue, claim_summary, is_conflict,
+    parse_claim_strategy, queue_wait_ms,
+)
+from selection import Uniform, parse_selection
+from traffic_replay import Replayer, bind_user, refuse_cookies
+from client_overhead import OverheadProfiler, OverheadRecorder
+from client_events import ClientEvents
+
 class DynamicArrivalRateWithGaps(LoadTestShape):
     """
-    Each arrival-rate step:
+    Arrival-rate load shape driven by a declarative profile (see load_profile.py).
+
+    Without --shape-profile it runs the default schedule. Each arrival-rate step:
         - 60 seconds @ rate[i] users/sec
-        - 20 seconds @ 0 users/sec (stabilization gap)
+        - 10 seconds @ 0 users/sec (stabilization gap)
 
     Arrival rate steps:
         2, 8, 32, 64, 128, 256, 512, 1024 users/sec
-    """
 
-    # Core configuration
-    active_duration = 60  # duration of high-rate arrival
-    gap_duration = 10     # duration of stabilization gap
-    arrival_rates = [2, 8, 32, 64, 128, 256, 512, 1024]  # users/sec step schedule
+    Segment boundaries are precomputed when the profile loads, so tick is O(1).
+    With --capacity-search the profile is replaced by a CapacitySearch (see
+    capacity_finder.py), which picks each trial's rate from the last results.
+    The segment being run is kept in current_step as (index, label), for
+    per-step reports.
+    """
 
-    max_users = 30000  # safety cap
+    profile = LoadProfile.from_dict(DEFAULT_PROFILE)
+    current_step = None
 
     def tick(self):
-        run_time = self.get_run_time()
-
-        # Each cycle = active_duration + gap_duration
-        cycle_duration = self.active_duration + self.gap_duration
-
-        # Which cycle are we in?
-        cycle_index = int(run_time // cycle_duration)
-
-        # If we've finished all cycles, hold steady at final users, zero new arrivals
-        if cycle_index >= len(self.arrival_rates):
-            return (min(self._total_users_full_schedule(), self.max_users), 0)
-
-        # Time inside the current cycle
-        time_into_cycle = run_time % cycle_duration
-
-        # Active 60s window?
-        in_active_phase = time_into_cycle < self.active_duration
-
-        # Determine spawn rate
-        spawn_rate = self.arrival_rates[cycle_index] if in_active_phase else 0
-
-        # Compute total users accumulated so far
-        total_users = 0
-
-        # Accumulate users from full completed cycles
-        for i in range(cycle_index):
-            total_users += self.arrival_rates[i] * self.active_duration  # only active part adds users
-
-        # Accumulate users within *this* cycle if still in active phase
-        if in_active_phase:
-            total_users += self.arrival_rates[cycle_index] * time_into_cycle
-
-        # Cap users
-        total_users = min(int(total_users), self.max_users)
-
-        return (total_users, spawn_rate)
-
-    def _total_users_full_schedule(self):
-        return sum(rate * self.active_duration for rate in self.arrival_rates)
+        point = self.profile.at(self.get_run_time())
+        if point is None:
+            return None
+        total_users, spawn_rate, index = point
+        self.current_step = (index, self.profile.label(index))
+        # Locust rejects a zero spawn rate whenever the user target changes,
+        # which happens at the first tick of a gap as the fractional target
+        # rounds up. The target itself already follows the arrival rate.
+        return (total_users, max(spawn_rate, 1))
 
 
 
@@ -91,88 +115,643 @@ def auth_headers(token):
     return {"Authorization": f"Bearer {token}"}
 
 
+class SSEParser:
+    """
+    Incremental parser for text/event-stream bodies.
+
+    Feed it raw chunks as they arrive; it returns the events completed by
+    each chunk and keeps any partial event buffered for the next one.
+    """
+    def __init__(self):
+        self.buffer = b""
+
+    def feed(self, chunk):
+        """
+        Add a chunk of the stream.
+
+        Returns:
+            list: (event name, data) tuples for every event completed so far
+        """
+        self.buffer += chunk.replace(b"\r\n", b"\n")
+        events = []
+        while True:
+            end = self.buffer.find(b"\n\n")
+            if end < 0:
+                return events
+            block, self.buffer = self.buffer[:end], self.buffer[end + 2:]
+            event, data = "message", []
+            for line in block.decode("utf-8", "replace").split("\n"):
+                if line.startswith("event:"):
+                    event = line[6:].strip()
+                elif line.startswith("data:"):
+                    data.append(line[5:].lstrip())
+            if data or event != "message":
+                events.append((event, "\n".join(data)))
+
+
+def iter_stream_chunks(response):
+    """
+    Yield body bytes of a streamed response as soon as they arrive.
+
+    iter_content() on both clients blocks until a full chunk is buffered,
+    which would hold back small SSE events, so read what is available
+    instead: read1() on the urllib3 response behind python-requests, and
+    line-by-line reads on the geventhttpclient response behind FastHttpUser.
+    """
+    raw = getattr(response, "raw", None)
+    if raw is not None:
+        read = lambda: raw.read1(65536)
+    else:
+        read = lambda: response._response.readline(b"\n")
+    while True:
+        chunk = read()
+        if not chunk:
+            return
+        yield chunk
+
+
+def close_stream(response):
+    """Close a streamed response on either client, dropping its connection."""
+    if hasattr(response, "raw"):
+        response.close()
+    else:
+        response.release()
+
+
 class UserNameGenerator:
     """
     Generates deterministic usernames to ensure reproducibility across test runs.
     Uses prime number multiplication to distribute usernames evenly.
+
+    Position k of the sequence maps to user_{(seed + k * prime) % max_users}.
+    The prime never divides max_users, so the sequence is a permutation of
+    the whole namespace and each name comes up once per pass.
+
+    For distributed runs the positions are split into partition_count
+    contiguous slices of S = max_users // partition_count: partition p takes
+    positions p * S ... (p + 1) * S - 1 and cycles through them. Workers
+    sharing seed and namespace but using different partitions never generate
+    the same name; a worker repeats its own names after S users.
     """
     PRIME_NUMBERS = [2, 3, 5, 7, 11, 13, 17, 19, 23, 29, 31, 37, 41, 43, 47, 53, 59, 61, 67, 71, 73, 79, 83, 89, 97]
 
-    def __init__(self, max_users=MAX_USERS, seed=None, prime_number=None):
-        self.seed = seed or random.randint(0, max_users)
-        self.prime_number = prime_number or random.choice(self.PRIME_NUMBERS)
+    def __init__(self, max_users=MAX_USERS, seed=None, prime_number=None, partition_index=0, partition_count=1):
+        if seed is None:
+            seed = random.randint(0, max_users)
+        if prime_number is None:
+            coprimes = [p for p in self.PRIME_NUMBERS if max_users % p != 0] or [1]
+            prime_number = random.Random(seed).choice(coprimes)
+        if max_users % prime_number == 0 and prime_number != 1:
+            raise ValueError(f"prime_number {prime_number} divides max_users {max_users}; names would repeat")
+        if not 0 <= partition_index < partition_count:
+            raise ValueError(f"partition_index {partition_index} outside 0..{partition_count - 1}")
+        if max_users < partition_count:
+            raise ValueError(f"{max_users} names can't be split into {partition_count} partitions")
+
+        self.seed = seed
+        self.prime_number = prime_number
+        self.partition_index = partition_index
+        self.partition_count = partition_count
+        self.slice_size = max_users // partition_count
+        self.slice_start = partition_index * self.slice_size
         self.current_index = -1
         self.max_users = max_users
     
     def generate_username(self):
         """Generate next username in sequence."""
         self.current_index += 1
-        return f"user_{(self.seed + self.current_index * self.prime_number) % self.max_users}"
+        position = self.slice_start + self.current_index % self.slice_size
+        return f"user_{(self.seed + position * self.prime_number) % self.max_users}"
+
+
+class IndexedSet:
+    """
+    Insertion-ordered set with O(1) add, membership test and removal, and
+    O(1) expected random picks by age (see selection.py).
+
+    Items live in a list in insertion order with an item -> index map
+    alongside it. Removing an item leaves a hole (None) in the list; `head`
+    skips the holes at the front, so the oldest item is always
+    slots[head], which makes the optional eviction policies O(1) per
+    evicted item:
+
+    - max_size: once full, adding an item evicts the oldest one
+    - max_age: items older than this many seconds are dropped lazily
+
+    Once holes (including the evicted prefix) outnumber the items, the list
+    is compacted (amortized O(1)), so a pick that lands on a hole and is
+    retried needs about two tries at most on average.
+
+    Not thread-safe on its own; callers that share an instance hold a lock.
+    """
+    def __init__(self, max_size=None, max_age=None):
+        self.max_size = max_size
+        self.max_age = max_age
+        self.slots = []
+        self.added_at = []
+        self.head = 0
+        self.positions = {}
+
+    def __len__(self):
+        return len(self.positions)
+
+    def __contains__(self, item):
+        return item in self.positions
+
+    def __iter__(self):
+        return iter(self.positions)
+
+    def add(self, item):
+        """
+        Add an item if it is not already present.
+
+        Returns:
+            bool: True if the item was added
+        """
+        if item in self.positions:
+            return False
+        self.positions[item] = len(self.slots)
+        self.slots.append(item)
+        self.added_at.append(time.monotonic())
+        self.evict()
+        return True
+
+    def discard(self, item):
+        """Remove an item if present."""
+        position = self.positions.pop(item, None)
+        if position is None:
+            return
+        self.slots[position] = None
+        while self.head < len(self.slots) and self.slots[self.head] is None:
+            self.head += 1
+        if len(self.slots) > 2 * len(self.positions) + 16:
+            self.compact()
+
+    def compact(self):
+        """Drop the holes, keeping insertion order."""
+        live = [i for i in range(self.head, len(self.slots)) if self.slots[i] is not None]
+        self.slots = [self.slots[i] for i in live]
+        self.added_at = [self.added_at[i] for i in live]
+        self.head = 0
+        for position, item in enumerate(self.slots):
+            self.positions[item] = position
+
+    def oldest(self):
+        """The item added longest ago, or None if the set is empty."""
+        return self.slots[self.head] if self.positions else None
+
+    def random_item(self, selection=None):
+        """
+        Random item, or None if the set is empty.
+
+        Args:
+            selection (Selection): How to weigh items by age (default uniform)
+        """
+        if self.max_age is not None:
+            self.evict()
+        if not self.positions:
+            return None
+        span = len(self.slots) - self.head
+        while True:
+            rank = selection.rank(span) if selection is not None else random.randrange(span)
+            item = self.slots[self.head + rank]
+            if item is not None:
+                return item
+
+    def evict(self):
+        """Drop the oldest items that exceed max_size or max_age."""
+        if self.max_size is not None:
+            while len(self.positions) > self.max_size:
+                self.discard(self.slots[self.head])
+        if self.max_age is not None:
+            cutoff = time.monotonic() - self.max_age
+            while self.positions and self.added_at[self.head] < cutoff:
+                self.discard(self.slots[self.head])
+
+
+class PollCursor:
+    """
+    Server-side cursor for one */updates feed.
+
+    since is the newest timestamp the server has returned on the feed, so the
+    load generator's clock never enters into it. The API filters with
+    "> since" on second-precision timestamps, which means items from the
+    cursor's own second come back on the next poll. Every item version
+    returned twice is a duplicate.
+
+    Every audit_every polls (0 = never) the feed is fetched in full instead.
+    Items older than the cursor that no incremental poll returned are gaps.
+    Only max_seen item versions are remembered; the newest timestamp among
+    the forgotten ones is the watermark, and audits don't judge items at or
+    below it, so forgetting an item never makes it a gap.
+
+    Args:
+        key (callable): Item -> identity of one version of the item
+        timestamp (callable): Item -> ISO-8601 timestamp the feed filters on
+        audit_every (int): Polls between full audit fetches
+        max_seen (int): Item versions remembered for duplicate/gap detection
+    """
+    def __init__(self, key, timestamp, audit_every=0, max_seen=20000):
+        self.key = key
+        self.timestamp = timestamp
+        self.audit_every = audit_every
+        self.since = None
+        self.max_seen = max_seen
+        self.seen = IndexedSet()
+        self.stamps = {}
+        self.watermark = ""
+        self.polls = 0
+
+    def remember(self, key, stamp):
+        """
+        Remember an item version, forgetting the oldest one past max_seen.
+
+        Returns:
+            bool: False if the version was already remembered
+        """
+        if not self.seen.add(key):
+            return False
+        self.stamps[key] = stamp
+        if len(self.seen) > self.max_seen:
+            oldest = self.seen.oldest()
+            self.seen.discard(oldest)
+            self.watermark = max(self.watermark, self.stamps.pop(oldest))
+        return True
+
+    def next_poll(self):
+        """
+        Parameters of the next poll.
+
+        Returns:
+            tuple: (since to send or None, whether this poll is an audit)
+        """
+        self.polls += 1
+        audit = bool(self.since and self.audit_every and self.polls % self.audit_every == 0)
+        return (None if audit else self.since), audit
+
+    def update(self, items, audit=False):
+        """
+        Account for the items of a poll response.
+
+        Returns:
+            tuple: (duplicates, gaps) lists of items
+        """
+        duplicates, gaps = [], []
+        for item in items:
+            key = self.key(item)
+            stamp = self.timestamp(item) or ""
+            if audit:
+                # newer items are left for the next incremental poll
+                if self.since and self.watermark < stamp < self.since and self.remember(key, stamp):
+                    gaps.append(item)
+                continue
+            if not self.remember(key, stamp):
+                duplicates.append(item)
+            if stamp > (self.since or ""):
+                self.since = stamp
+        return duplicates, gaps
+
+
+def conversation_version(conversation):
+    return (conversation.get("id"), conversation.get("updatedAt"))
+
+
+def expert_queue_items(body):
+    """Waiting and assigned conversations of an /api/expert-queue/updates response."""
+    items = []
+    for entry in body or []:
+        items += entry.get("waitingConversations", []) + entry.get("assignedConversations", [])
+    return items
+
+
+# Per */updates feed: items of a response, item version key, cursor timestamp
+UPDATE_FEEDS = {
+    "/api/conversations/updates": (lambda body: body or [], conversation_version, lambda c: c.get("updatedAt")),
+    "/api/messages/updates": (lambda body: body or [], lambda m: m.get("id"), lambda m: m.get("timestamp")),
+    "/api/expert-queue/updates": (expert_queue_items, conversation_version, lambda c: c.get("updatedAt")),
+}
 
 
 class UserStore:
     """
     Thread-safe storage for registered users and conversations.
     Allows active users to interact with existing users and conversations.
+
+    Users live in a dense list with a username -> position map alongside it,
+    so storing, sampling and emptiness checks are all O(1) no matter how many
+    users the run has registered.
+
+    A listener (see UserStoreSync) can be attached to be told about every
+    local change so it can be shared with the other Locust processes.
     """
     def __init__(self):
-        self.used_usernames = {}
-        self.conversation_ids = []
+        self.listener = None
+        self.users = []
+        self.user_positions = {}
+        self.conversation_ids = IndexedSet()
         self.username_lock = threading.Lock()
         self.conversation_lock = threading.Lock()
+        self.user_selection = Uniform()
+        self.conversation_selection = Uniform()
     
     def get_random_user(self):
-        """Get a random existing user from the store."""
+        """Get a stored user, picked by user_selection (see selection.py)."""
         with self.username_lock:
-            if not self.used_usernames:
+            if not self.users:
                 return None
-            random_username = random.choice(list(self.used_usernames.keys()))
-            return self.used_usernames[random_username]
+            return self.users[self.user_selection.rank(len(self.users))]
+
+    def store_user(self, username, auth_token, user_id, propagate=True, session_cookie=None):
+        """
+        Store a newly registered/logged in user.
 
-    def store_user(self, username, auth_token, user_id):
-        """Store a newly registered/logged in user."""
+        Storing a username that is already present refreshes its token in
+        place, so personas holding the returned dict see the new token.
+
+        Args:
+            propagate (bool): Report the change to the listener; False when
+                applying changes that came from another process
+            session_cookie (str): Cookie header for the user's Rails session,
+                used by TokenManager to call /auth/refresh
+        """
         with self.username_lock:
-            self.used_usernames[username] = {
-                "username": username,
-                "auth_token": auth_token,
-                "user_id": user_id
-            }
-            return self.used_usernames[username]
+            position = self.user_positions.get(username)
+            if position is not None:
+                user = self.users[position]
+                user["auth_token"] = auth_token
+                user["user_id"] = user_id
+                if session_cookie:
+                    user["session_cookie"] = session_cookie
+            else:
+                user = {
+                    "username": username,
+                    "auth_token": auth_token,
+                    "user_id": user_id,
+                    "session_cookie": session_cookie
+                }
+                self.user_positions[username] = len(self.users)
+                self.users.append(user)
+
+            if propagate and self.listener:
+                self.listener.user_stored(user)
+            return user
     
+    def load_users(self, users, password=None):
+        """
+        Bulk-load pre-provisioned users, e.g. from a fixture file.
+
+        Loaded users are not reported to the listener: every process loads
+        the same fixture itself.
+
+        Args:
+            users (list): (username, user_id, auth_token, session_cookie) tuples
+            password (str): The users' password, if it isn't their username;
+                TokenManager logs in with it when a token can't be refreshed
+
+        Returns:
+            int: Number of users added
+        """
+        with self.username_lock:
+            added = 0
+            for username, user_id, auth_token, session_cookie in users:
+                if username in self.user_positions:
+                    continue
+                self.user_positions[username] = len(self.users)
+                user = {
+                    "username": username,
+                    "auth_token": auth_token,
+                    "user_id": user_id,
+                    "session_cookie": session_cookie
+                }
+                if password:
+                    user["password"] = password
+                self.users.append(user)
+                added += 1
+            return added
+
+    def get_user(self, position):
+        """The user stored at a position (in storing order), or None if there is none yet."""
+        with self.username_lock:
+            return self.users[position] if position < len(self.users) else None
+
     def has_users(self):
         """Check if any users exist in the store."""
-        with self.username_lock:
-            return len(self.used_usernames) > 0
+        # len() of a list is atomic, so the hot on_start check skips the lock
+        return len(self.users) > 0
+
+    def user_count(self):
+        """Number of users in the store."""
+        return len(self.users)
     
-    def add_conversation(self, conversation_id):
+    def configure_conversations(self, max_size=None, max_age=None):
+        """
+        Bound the conversation registry for long soak runs.
+
+        Args:
+            max_size (int): Keep at most this many conversations, evicting the oldest
+            max_age (float): Forget conversations registered more than this many seconds ago
+        """
+        with self.conversation_lock:
+            self.conversation_ids.max_size = max_size
+            self.conversation_ids.max_age = max_age
+            self.conversation_ids.evict()
+
+    def load_conversations(self, id_ranges):
+        """
+        Bulk-load seeded conversation IDs, e.g. from a dataset manifest.
+
+        Like load_users, nothing is reported to the listener. With a size
+        limit only the newest (highest) IDs are loaded.
+
+        Args:
+            id_ranges (list): range objects of conversation IDs
+
+        Returns:
+            int: Number of conversations added
+        """
+        with self.conversation_lock:
+            remaining = self.conversation_ids.max_size
+            newest = []
+            for ids in reversed(id_ranges):
+                if remaining is not None:
+                    ids = ids[-remaining:] if remaining else ids[:0]
+                    remaining -= len(ids)
+                newest.append(ids)
+            added = 0
+            for ids in reversed(newest):
+                for conversation_id in ids:
+                    added += self.conversation_ids.add(str(conversation_id))
+            return added
+
+    def add_conversation(self, conversation_id, propagate=True):
         """Add a conversation ID to the global store."""
+        with self.conversation_lock:
+            added = self.conversation_ids.add(conversation_id)
+            if added and propagate and self.listener:
+                self.listener.conversation_added(conversation_id)
+
+    def remove_conversation(self, conversation_id, propagate=True):
+        """Forget a conversation, e.g. once it has been resolved."""
         with self.conversation_lock:
             if conversation_id not in self.conversation_ids:
-                self.conversation_ids.append(conversation_id)
+                return
+            self.conversation_ids.discard(conversation_id)
+            if propagate and self.listener:
+                self.listener.conversation_removed(conversation_id)
     
     def get_random_conversation(self):
-        """Get a random conversation ID from the store."""
+        """Get a stored conversation ID, picked by conversation_selection."""
         with self.conversation_lock:
-            if not self.conversation_ids:
-                return None
-            return random.choice(self.conversation_ids)
+            return self.conversation_ids.random_item(self.conversation_selection)
     
     def has_conversations(self):
         """Check if any conversations exist in the store."""
-        with self.conversation_lock:
-            return len(self.conversation_ids) > 0
+        return len(self.conversation_ids) > 0
+
+class UserStoreSync:
+    """
+    Shares a UserStore between the master and all workers of a distributed run.
+
+    Each process buffers its local changes (new or refreshed users, added and
+    removed conversations) and sends them as one delta message per flush
+    interval. Workers send their deltas to the master, which applies them and
+    forwards them to every worker; a worker skips deltas it originated. A
+    worker that joins late asks the master for a snapshot of everything seen
+    so far, sent in chunks of SNAPSHOT_CHUNK entries.
+
+    With this in place, the existing-user path (NEW_USER_PROB) reuses users
+    registered on any worker, just like a single-process run.
+    """
+    DELTA_MESSAGE = "user_store_delta"
+    SNAPSHOT_REQUEST_MESSAGE = "user_store_snapshot_request"
+    SNAPSHOT_CHUNK = 5000
+
+    def __init__(self, store, runner, flush_interval=1.0):
+        self.store = store
+        self.runner = runner
+        self.flush_interval = flush_interval
+        self.is_master = isinstance(runner, MasterRunner)
+        self.origin = None if self.is_master else runner.client_id
+        self.pending_users = []
+        self.pending_conversations = []
+        self.pending_removed = []
+
+        store.listener = self
+        runner.register_message(self.DELTA_MESSAGE, self.on_delta)
+        if self.is_master:
+            runner.register_message(self.SNAPSHOT_REQUEST_MESSAGE, self.on_snapshot_request)
+        else:
+            runner.send_message(self.SNAPSHOT_REQUEST_MESSAGE)
+        self.greenlet = gevent.spawn(self.flush_loop)
+
+    def user_stored(self, user):
+        self.pending_users.append((user["username"], user["auth_token"], user["user_id"], user.get("session_cookie")))
+
+    def conversation_added(self, conversation_id):
+        self.pending_conversations.append(conversation_id)
+
+    def conversation_removed(self, conversation_id):
+        self.pending_removed.append(conversation_id)
+
+    def flush_loop(self):
+        while True:
+            gevent.sleep(self.flush_interval)
+            self.flush()
+
+    def flush(self):
+        """Send everything buffered since the last flush as one delta."""
+        if not (self.pending_users or self.pending_conversations or self.pending_removed):
+            return
+        delta = {
+            "origin": self.origin,
+            "users": self.pending_users,
+            "conversations": self.pending_conversations,
+            "removed": self.pending_removed,
+        }
+        self.pending_users = []
+        self.pending_conversations = []
+        self.pending_removed = []
+        self.runner.send_message(self.DELTA_MESSAGE, delta)
+
+    def apply(self, delta):
+        """Apply a delta from another process without echoing it back."""
+        for username, auth_token, user_id, cookie in delta["users"]:
+            self.store.store_user(username, auth_token, user_id, propagate=False, session_cookie=cookie)
+        for conversation_id in delta["conversations"]:
+            self.store.add_conversation(conversation_id, propagate=False)
+        for conversation_id in delta["removed"]:
+            self.store.remove_conversation(conversation_id, propagate=False)
+
+    def on_delta(self, environment, msg, **kwargs):
+        delta = msg.data
+        if delta["origin"] is not None and delta["origin"] == self.origin:
+            return
+        self.apply(delta)
+        if self.is_master:
+            self.runner.send_message(self.DELTA_MESSAGE, delta)
+
+    def on_snapshot_request(self, environment, msg, **kwargs):
+        with self.store.username_lock:
+            users = [
+                (u["username"], u["auth_token"], u["user_id"], u.get("session_cookie"))
+                for u in self.store.users
+            ]
+        with self.store.conversation_lock:
+            conversations = list(self.store.conversation_ids)
+
+        chunk = self.SNAPSHOT_CHUNK
+        for start in range(0, max(len(users), len(conversations)), chunk):
+            self.runner.send_message(
+                self.DELTA_MESSAGE,
+                {
+                    "origin": None,
+                    "users": users[start:start + chunk],
+                    "conversations": conversations[start:start + chunk],
+                    "removed": [],
+                },
+                client_id=msg.node_id,
+            )
 
 
 user_store = UserStore()
 user_name_generator = UserNameGenerator(max_users=MAX_USERS)
+token_manager = TokenManager(user_store)
+overhead_profiler = OverheadProfiler()
+client_events = ClientEvents()
+
+# End-to-end delivery tracking: "[lt:<nonce>:<sender id>:<sent at ms>]" tags
+# appended to sent messages, and the nonces this process has already seen.
+DELIVERY_TAG = re.compile(r"\[lt:([0-9a-f]{12}):(\d+):(\d+)\]")
+# Nonces are remembered for DELIVERY_HORIZON seconds after they are first
+# seen; later sightings are older than that and are never recorded, so a
+# forgotten nonce can't be counted twice.
+DELIVERY_HORIZON = 300
+delivered_nonces = IndexedSet(max_age=DELIVERY_HORIZON)
+
+# Traffic replay (see ReplayPersona): whether this process is replaying, and
+# captured identity -> AsyncResult of the UserStore user it maps to.
+replay_running = False
+replay_identities = {}
+
+# Recent claims won and lost by the experts in this process, and how they pick
+# (see claim_contention.py)
+claim_ledger = ClaimLedger()
+claim_strategy = HeadOfQueue()
 
 
 class ChatBackend():
     """
     Base class for all user personas.
     Provides common authentication and API interaction methods.
+
+    Only the client calls shared by HttpSession and FastHttpSession are used
+    here (get/post/put with json, params, headers and name, and response
+    status_code/json()), so the helpers work unchanged on either HTTP client.
     """        
-    
+    # Epoch ms after which messages can only reach this user as deliveries
+    # (see record_deliveries); None until the baseline fetch
+    delivery_watermark = None
+
     def login(self, username, password):
         """
         Login an existing user.
@@ -190,12 +769,13 @@ class ChatBackend():
             name="/auth/login"
         )
         if response.status_code == 200:
-            data = response.json()
+            data = self.decode_json(response)
             user_data = data.get("user", {})
             return user_store.store_user(
                 username, 
                 data.get("token"), 
-                str(user_data.get("id"))
+                str(user_data.get("id")),
+                session_cookie=session_cookie(response)
             )
         return None
         
@@ -216,15 +796,272 @@ class ChatBackend():
             name="/auth/register"
         )
         if response.status_code == 201 or response.status_code == 200:
-            data = response.json()
+            data = self.decode_json(response)
             user_data = data.get("user", {})
             return user_store.store_user(
                 username, 
                 data.get("token"), 
-                str(user_data.get("id"))
+                str(user_data.get("id")),
+                session_cookie=session_cookie(response)
             )
         return None
 
+    def register_or_login(self, username, password):
+        """
+        Register a new user, falling back to login if the name is taken.
+
+        Each fallback means the server paid for two bcrypt rounds, so it is
+        counted as a FALLBACK client event (see client_events.py).
+
+        Returns:
+            dict: User info with auth_token and user_id, or None if both failed
+        """
+        user = self.register(username, password)
+        if user:
+            return user
+        client_events.count("FALLBACK", "/auth/register -> /auth/login")
+        return self.login(username, password)
+
+    def auth_headers(self, user):
+        """
+        Authorization headers for a user, refreshing its token first if it is
+        about to expire (see token_manager.py).
+
+        Args:
+            user (dict): User info with auth_token and user_id
+
+        Returns:
+            dict: Headers dictionary with Authorization header
+        """
+        return auth_headers(token_manager.token_for(self, user))
+
+    def pick_conversation(self, conversation_ids):
+        """
+        One of a persona's own conversations, picked by --conversation-selection.
+
+        Args:
+            conversation_ids: Non-empty IndexedSet or list, oldest first
+        """
+        selection = user_store.conversation_selection
+        if isinstance(conversation_ids, IndexedSet):
+            return conversation_ids.random_item(selection)
+        return conversation_ids[selection.rank(len(conversation_ids))]
+
+    def claim_from_queue(self, user, record=False):
+        """
+        Poll /expert/queue and claim the waiting conversation --claim-strategy
+        picks.
+
+        Args:
+            user (dict): The expert's user info
+            record (bool): Record the outcome as CLAIM rows (the
+                --claim-contention benchmark, see claim_contention.py)
+
+        Returns:
+            str: ID of the claimed conversation, or None
+        """
+        response = self.client.get(
+            "/expert/queue",
+            headers=self.auth_headers(user),
+            name="/expert/queue"
+        )
+        if response.status_code != 200:
+            return None
+
+        waiting = self.decode_json(response).get("waitingConversations", [])
+        conversation = claim_strategy.choose(waiting, claim_ledger)
+        if conversation is None:
+            if record:
+                self.record_metric("CLAIM", "queue empty")
+            return None
+
+        conversation_id = str(conversation.get("id"))
+        with self.client.post(
+            f"/expert/conversations/{conversation_id}/claim",
+            headers=self.auth_headers(user),
+            name=CLAIM_PATH,
+            catch_response=True,
+        ) as claim_response:
+            latency = claim_response.request_meta["response_time"]
+            if claim_response.status_code == 200:
+                holder = claim_ledger.won(conversation_id, user.get("user_id"))
+                if record:
+                    self.record_metric("CLAIM", "won", latency)
+                    wait = queue_wait_ms(conversation)
+                    if wait is not None:
+                        self.record_metric("CLAIM", "queue wait", wait)
+                    if holder is not None:
+                        self.record_metric("CLAIM", "double claim", exception=DoubleClaim(
+                            f"conversation {conversation_id} claimed by experts {holder} and {user.get('user_id')}"
+                        ))
+                return conversation_id
+            if is_conflict(claim_response):
+                claim_response.success()
+                claim_ledger.lost(conversation_id)
+                if record:
+                    self.record_metric("CLAIM", "conflict", latency)
+        return None
+
+    def decode_json(self, response):
+        """
+        response.json(), with the decode time recorded for --overhead-report (see client_overhead.py)
+        and array items counted for --bandwidth-report (see bandwidth.py).
+        """
+        body = overhead_profiler.decode_json(response)
+        count_decoded(response, body)
+        return body
+
+    def negotiate_encoding(self):
+        """Apply --accept-encoding to this user's client (see bandwidth.py)."""
+        options = self.environment.parsed_options
+        value = ACCEPT_ENCODINGS.get(getattr(options, "accept_encoding", "default"))
+        if value:
+            force_accept_encoding(self.client, value)
+
+    def record_metric(self, request_type, name, value=0, length=0, exception=None):
+        """
+        Report a custom measurement as its own row in the Locust stats.
+
+        Args:
+            request_type (str): Stats "Type" column, groups related metrics
+            name (str): Stats "Name" column
+            value (float): Recorded as the response time, in milliseconds
+            length (int): Recorded as the response length, in bytes
+            exception (Exception): Record the entry as a failure
+        """
+        self.environment.events.request.fire(
+            request_type=request_type,
+            name=name,
+            response_time=value,
+            response_length=length,
+            exception=exception,
+            context={},
+        )
+
+    def tag_message(self, content):
+        """
+        Append a delivery tag to a message for end-to-end latency tracking.
+
+        The tag carries a random nonce, the sender's user ID and the send time
+        in epoch milliseconds. Only --delivery-sample-rate of messages are
+        tagged.
+
+        Args:
+            content (str): Message text
+
+        Returns:
+            str: Message text, tagged if sampled
+        """
+        sample_rate = getattr(self.environment.parsed_options, "delivery_sample_rate", 1.0)
+        if random.random() >= sample_rate:
+            return content
+        sent_at = int(time.time() * 1000)
+        return f"{content} [lt:{random.getrandbits(48):012x}:{self.user.get('user_id')}:{sent_at}]"
+
+    def record_deliveries(self, body, channel):
+        """
+        Record delivery latency for tagged messages from other users in a response body.
+
+        Only call this for incremental polls and live SSE events: baseline
+        and audit fetches return history, not deliveries. Messages sent
+        before this user's delivery_watermark (the end of its baseline fetch,
+        or its first stream open) could have been in that history and are
+        skipped, as are messages older than DELIVERY_HORIZON.
+
+        Scans the raw body with a regex instead of decoding JSON, and records
+        each nonce once per process, the first time any user here sees it.
+        Latency is wall-clock time since the sender's timestamp, so across
+        machines it assumes their clocks are synced.
+
+        Args:
+            body (str): Response text from /api/messages/updates or an SSE event
+            channel (str): How the message was seen, e.g. "poll" or "sse"
+        """
+        if "[lt:" not in body or self.delivery_watermark is None:
+            return
+        now = time.time() * 1000
+        my_id = self.user.get("user_id")
+        for nonce, sender_id, sent_at in DELIVERY_TAG.findall(body):
+            latency = now - int(sent_at)
+            if (
+                sender_id == my_id
+                or int(sent_at) < self.delivery_watermark
+                or latency >= DELIVERY_HORIZON * 1000
+                or not delivered_nonces.add(nonce)
+            ):
+                continue
+            self.record_metric("E2E", f"message delivery [{channel}]", max(0.0, latency))
+
+    def open_update_stream(self, user):
+        """
+        Open the SSE stream at /api/updates/stream.
+
+        Args:
+            user (dict): User info with auth_token and user_id
+
+        Returns:
+            Response: Streamed response; read it with iter_stream_chunks
+        """
+        headers = self.auth_headers(user)
+        headers["Accept"] = "text/event-stream"
+        return self.client.get(
+            "/api/updates/stream",
+            headers=headers,
+            stream=True,
+            name="/api/updates/stream"
+        )
+
+    def poll_updates(self, user, path, params):
+        """
+        GET one */updates feed.
+
+        With --poll-cursor client (the original behaviour), since is the load
+        generator's clock at the end of the previous poll cycle. With server,
+        it comes from the feed's PollCursor, and duplicates and gaps are
+        counted as CURSOR "<path> duplicate" / "<path> gap" client events
+        (see client_events.py). Audit fetches are reported as
+        "<path> [audit]", so the endpoint's own row measures only incremental
+        polls.
+
+        Args:
+            user (dict): User info with auth_token and user_id
+            path (str): Feed path, a key of UPDATE_FEEDS
+            params (dict): Query parameters identifying the user
+
+        Returns:
+            tuple: (the poll response, whether it was an incremental poll
+                rather than a baseline or audit fetch)
+        """
+        options = self.environment.parsed_options
+        if getattr(options, "poll_cursor", "server") == "client":
+            if self.last_check_time:
+                params["since"] = self.last_check_time.isoformat()
+            response = self.client.get(path, params=params, headers=self.auth_headers(user), name=path)
+            return response, "since" in params
+
+        items_of, key, timestamp = UPDATE_FEEDS[path]
+        cursor = self.poll_cursors.get(path)
+        if cursor is None:
+            cursor = self.poll_cursors[path] = PollCursor(
+                key, timestamp, audit_every=getattr(options, "poll_audit_every", 0)
+            )
+        since, audit = cursor.next_poll()
+        if since:
+            params["since"] = since
+        response = self.client.get(
+            path,
+            params=params,
+            headers=self.auth_headers(user),
+            name=f"{path} [audit]" if audit else path
+        )
+        if response.status_code == 200:
+            duplicates, gaps = cursor.update(items_of(self.decode_json(response)), audit=audit)
+            if duplicates:
+                client_events.count("CURSOR", f"{path} duplicate", len(duplicates))
+            if gaps:
+                client_events.count("CURSOR", f"{path} gap", len(gaps))
+        return response, "since" in params
+
     def check_conversation_updates(self, user):
         """
         Check for conversation updates since last check.
@@ -235,17 +1072,7 @@ class ChatBackend():
         Returns:
             bool: True if request successful
         """
-        params = {"userId": user.get("user_id")}
-        if self.last_check_time:
-            params["since"] = self.last_check_time.isoformat()
-        
-        response = self.client.get(
-            "/api/conversations/updates",
-            params=params,
-            headers=auth_headers(user.get("auth_token")),
-            name="/api/conversations/updates"
-        )
-        
+        response, _ = self.poll_updates(user, "/api/conversations/updates", {"userId": user.get("user_id")})
         return response.status_code == 200
     
     def check_message_updates(self, user):
@@ -258,17 +1085,12 @@ class ChatBackend():
         Returns:
             bool: True if request successful
         """
-        params = {"userId": user.get("user_id")}
-        if self.last_check_time:
-            params["since"] = self.last_check_time.isoformat()
-        
-        response = self.client.get(
-            "/api/messages/updates",
-            params=params,
-            headers=auth_headers(user.get("auth_token")),
-            name="/api/messages/updates"
-        )
-        
+        response, incremental = self.poll_updates(user, "/api/messages/updates", {"userId": user.get("user_id")})
+        if response.status_code == 200:
+            if incremental:
+                self.record_deliveries(response.text, "poll")
+            elif self.delivery_watermark is None:
+                self.delivery_watermark = time.time() * 1000
         return response.status_code == 200
     
     def check_expert_queue_updates(self, user):
@@ -281,23 +1103,12 @@ class ChatBackend():
         Returns:
             bool: True if request successful
         """
-        params = {"expertId": user.get("user_id")}
-        if self.last_check_time:
-            params["since"] = self.last_check_time.isoformat()
-        
-        response = self.client.get(
-            "/api/expert-queue/updates",
-            params=params,
-            headers=auth_headers(user.get("auth_token")),
-            name="/api/expert-queue/updates"
-        )
-        
+        response, _ = self.poll_updates(user, "/api/expert-queue/updates", {"expertId": user.get("user_id")})
         return response.status_code == 200
 
-
 NEW_USER_PROB = 0.3  # 30% chance to create a new user
 
-class IdleUser(HttpUser, ChatBackend):
+class IdlePersona(User, ChatBackend):
     """
     Persona: A user that logs in and is idle but their browser polls for updates.
     Checks for message updates, conversation updates, and expert queue updates every 5 seconds.
@@ -307,6 +1118,7 @@ class IdleUser(HttpUser, ChatBackend):
     
     Weight: 10 (most common user type - represents passive users with browsers open)
     """
+    abstract = True
     weight = 10
     wait_time = between(5, 5)  # Check every 5 seconds
 
@@ -321,14 +1133,15 @@ class IdleUser(HttpUser, ChatBackend):
     #         raise Exception(f"Failed to login or register user {username}")
 
     def on_start(self):
+        self.negotiate_encoding()
         self.last_check_time = None
+        self.poll_cursors = {}
 
         # If we already have some users and the dice say "existing user":
-        if user_store.used_usernames and random.random() > NEW_USER_PROB:
+        if user_store.has_users() and random.random() > NEW_USER_PROB:
             existing_user = user_store.get_random_user()
-            # You can either:
-            # 1) Assume they are already logged in (use stored token)
-            # 2) Or actively log them in again each time, if token might be expired
+            # Reuse the stored token; self.auth_headers() refreshes it before
+            # it expires (see token_manager.py)
             self.user = existing_user
             return
 
@@ -337,28 +1150,109 @@ class IdleUser(HttpUser, ChatBackend):
         password = username
 
         # Try register first, fall back to login if already exists
-        self.user = self.register(username, password) or self.login(username, password)
+        self.user = self.register_or_login(username, password)
 
         if not self.user:
             raise Exception("IdleUser: Failed to register or login user")
         
     @task
     def poll_for_updates(self):
-        """Poll for all types of updates (simulates browser polling)."""
-        # Check conversation updates
-        self.check_conversation_updates(self.user)
-        
-        # Check message updates
-        self.check_message_updates(self.user)
-        
-        # Check expert queue updates
-        self.check_expert_queue_updates(self.user)
-        
+        """
+        Poll for all types of updates (simulates browser polling).
+
+        With --concurrent-polls the three requests go out in parallel, as a
+        browser sends them. Either way, the time for the whole cycle is
+        recorded as POLL "poll cycle", the page-level latency the user feels.
+        """
+        started = time.perf_counter()
+        polls = (self.check_conversation_updates, self.check_message_updates, self.check_expert_queue_updates)
+
+        if getattr(self.environment.parsed_options, "concurrent_polls", False):
+            gevent.joinall([gevent.spawn(poll, self.user) for poll in polls], raise_error=True)
+        else:
+            for poll in polls:
+                poll(self.user)
+
+        self.record_metric("POLL", "poll cycle", (time.perf_counter() - started) * 1000)
+
         # Update last check time
         self.last_check_time = datetime.utcnow()
 
 
-class ActiveUser(HttpUser, ChatBackend):
+class StreamingPersona(User, ChatBackend):
+    """
+    Persona: A user whose browser holds an SSE connection to /api/updates/stream
+    instead of polling the three */updates endpoints every 5 seconds.
+
+    Replaces IdleUser when running with --update-mode sse, to find how many
+    concurrent streams a Puma process holds compared with the polling model.
+    Stream health is reported as SSE rows in the stats:
+    - "time to first event": from opening the stream to its first event
+    - "event: <name>": one row per event type; req/s is events/sec and the
+      response time is the gap since the previous event on the same stream
+    - "reconnect": every stream opened after the user's first one
+    - "stream dropped": failures while reading an open stream
+
+    Weight: 10 (same population as IdleUser, which it stands in for)
+    """
+    abstract = True
+    weight = 10
+    wait_time = between(1, 2)  # Back off briefly before reconnecting
+
+    def on_start(self):
+        self.negotiate_encoding()
+        self.streams_opened = 0
+
+        # If we already have some users and the dice say "existing user":
+        if user_store.has_users() and random.random() > NEW_USER_PROB:
+            self.user = user_store.get_random_user()
+            return
+
+        # Otherwise: create a brand-new user (new signup)
+        username = user_name_generator.generate_username()
+        password = username
+        self.user = self.register_or_login(username, password)
+
+        if not self.user:
+            raise Exception("StreamingUser: Failed to register or login user")
+
+    @task
+    def hold_update_stream(self):
+        """Open the update stream and read events until it ends or the session limit is hit."""
+        if self.streams_opened:
+            self.record_metric("SSE", "reconnect")
+        self.streams_opened += 1
+
+        session_seconds = getattr(self.environment.parsed_options, "sse_session_seconds", 0)
+        started = time.perf_counter()
+        last_event_at = None
+        response = self.open_update_stream(self.user)
+        if response.status_code != 200:
+            return
+        if self.delivery_watermark is None:
+            self.delivery_watermark = time.time() * 1000
+
+        parser = SSEParser()
+        try:
+            for chunk in iter_stream_chunks(response):
+                now = time.perf_counter()
+                for event, data in parser.feed(chunk):
+                    if event == "message-update":
+                        self.record_deliveries(data, "sse")
+                    if last_event_at is None:
+                        self.record_metric("SSE", "time to first event", (now - started) * 1000)
+                    gap = now - (last_event_at or started)
+                    self.record_metric("SSE", f"event: {event}", gap * 1000, len(data))
+                    last_event_at = now
+                if session_seconds and now - started >= session_seconds:
+                    break
+        except Exception as e:
+            self.record_metric("SSE", "stream dropped", (time.perf_counter() - started) * 1000, exception=e)
+        finally:
+            close_stream(response)
+
+
+class ActivePersona(User, ChatBackend):
     """
     Persona: An active user who creates conversations, sends messages, and browses.
     Represents students or users actively using the help desk system to ask questions
@@ -366,19 +1260,22 @@ class ActiveUser(HttpUser, ChatBackend):
     
     Weight: 3 (less common than idle users, but generates more load per user)
     """
+    abstract = True
     weight = 3
     wait_time = between(5, 10)  # Wait 10-30 seconds between actions
 
     def on_start(self):
+        self.negotiate_encoding()
         self.last_check_time = None
-        self.my_conversation_ids = []
+        self.poll_cursors = {}
+        max_tracked = getattr(self.environment.parsed_options, "max_user_conversations", 0)
+        self.my_conversation_ids = IndexedSet(max_size=max_tracked or None)
 
         # If we already have some users and the dice say "existing user":
-        if user_store.used_usernames and random.random() > NEW_USER_PROB:
+        if user_store.has_users() and random.random() > NEW_USER_PROB:
             existing_user = user_store.get_random_user()
-            # You can either:
-            # 1) Assume they are already logged in (use stored token)
-            # 2) Or actively log them in again each time, if token might be expired
+            # Reuse the stored token; self.auth_headers() refreshes it before
+            # it expires (see token_manager.py)
             self.user = existing_user
             return
 
@@ -387,7 +1284,7 @@ class ActiveUser(HttpUser, ChatBackend):
         password = username
 
         # Try register first, fall back to login if already exists
-        self.user = self.register(username, password) or self.login(username, password)
+        self.user = self.register_or_login(username, password)
 
         if not self.user:
             raise Exception("IdleUser: Failed to register or login user")
@@ -398,7 +1295,7 @@ class ActiveUser(HttpUser, ChatBackend):
     #     username = user_name_generator.generate_username()
     #     password = username
     #     # Try to register first, if it fails (user exists), then login
-    #     self.user = self.register(username, password) or self.login(username, password)
+    #     self.user = self.register_or_login(username, password)
     #     if not self.user:
     #         raise Exception(f"Failed to login or register user {username}")
 
@@ -413,15 +1310,15 @@ class ActiveUser(HttpUser, ChatBackend):
             json={
                 "title": f"Question about {random.choice(['Rails', 'Ruby', 'AWS', 'Docker', 'Database'])} - {datetime.utcnow().isoformat()}"
             },
-            headers=auth_headers(self.user.get("auth_token")),
+            headers=self.auth_headers(self.user),
             name="/conversations [create]"
         )
         
         if response.status_code == 201:
-            data = response.json()
+            data = self.decode_json(response)
             conversation_id = str(data.get("id"))
             if conversation_id:
-                self.my_conversation_ids.append(conversation_id)
+                self.my_conversation_ids.add(conversation_id)
                 user_store.add_conversation(conversation_id)
 
     @task(5)
@@ -434,14 +1331,14 @@ class ActiveUser(HttpUser, ChatBackend):
             # self.create_conversation()
             return
         
-        conversation_id = random.choice(self.my_conversation_ids)
+        conversation_id = self.pick_conversation(self.my_conversation_ids)
         response = self.client.post(
             "/messages",
             json={
                 "conversationId": conversation_id,
-                "content": f"Message at {datetime.utcnow().isoformat()}"
+                "content": self.tag_message(f"Message at {datetime.utcnow().isoformat()}")
             },
-            headers=auth_headers(self.user.get("auth_token")),
+            headers=self.auth_headers(self.user),
             name="/messages [create]"
         )
 
@@ -453,33 +1350,46 @@ class ActiveUser(HttpUser, ChatBackend):
         """
         response = self.client.get(
             "/conversations",
-            headers=auth_headers(self.user.get("auth_token")),
+            headers=self.auth_headers(self.user),
             name="/conversations [list]"
         )
         
         # Update local conversation list from response
         if response.status_code == 200:
-            data = response.json()
+            data = self.decode_json(response)
             if isinstance(data, list):
                 for conv in data:
                     conv_id = str(conv.get("id"))
-                    if conv_id and conv_id not in self.my_conversation_ids:
-                        self.my_conversation_ids.append(conv_id)
+                    if conv.get("status") == "resolved":
+                        self.my_conversation_ids.discard(conv_id)
+                        user_store.remove_conversation(conv_id)
+                    elif conv_id:
+                        self.my_conversation_ids.add(conv_id)
 
     @task(4)
     def get_conversation_messages(self):
         """
         Get messages for a specific conversation.
         Weight: 4 (common browsing action)
+
+        Users without conversations of their own browse one from the shared
+        store instead, picked by --conversation-selection: any signed-in user
+        may read a conversation's messages, and the index is cached per
+        conversation, so these reads are where hot conversations show up.
         """
-        if not self.my_conversation_ids:
+        if self.my_conversation_ids:
+            conversation_id = self.pick_conversation(self.my_conversation_ids)
+            name = "/conversations/:id/messages [list]"
+        else:
+            conversation_id = user_store.get_random_conversation()
+            name = "/conversations/:id/messages [browse]"
+        if conversation_id is None:
             return
-        
-        conversation_id = random.choice(self.my_conversation_ids)
+
         response = self.client.get(
             f"/conversations/{conversation_id}/messages",
-            headers=auth_headers(self.user.get("auth_token")),
-            name="/conversations/:id/messages [list]"
+            headers=self.auth_headers(self.user),
+            name=name
         )
 
     @task(1)
@@ -492,17 +1402,17 @@ class ActiveUser(HttpUser, ChatBackend):
             # self.create_conversation()
             return
         
-        conversation_id = random.choice(self.my_conversation_ids)
+        conversation_id = self.pick_conversation(self.my_conversation_ids)
         
         # First get messages
         response = self.client.get(
             f"/conversations/{conversation_id}/messages",
-            headers=auth_headers(self.user.get("auth_token")),
+            headers=self.auth_headers(self.user),
             name="/conversations/:id/messages [list]"
         )
         
         if response.status_code == 200:
-            messages = response.json()
+            messages = self.decode_json(response)
             if isinstance(messages, list) and messages:
                 # Find an unread message from someone else
                 for msg in messages:
@@ -510,7 +1420,7 @@ class ActiveUser(HttpUser, ChatBackend):
                         message_id = str(msg.get("id"))
                         self.client.put(
                             f"/messages/{message_id}/read",
-                            headers=auth_headers(self.user.get("auth_token")),
+                            headers=self.auth_headers(self.user),
                             name="/messages/:id/read"
                         )
                         break
@@ -523,31 +1433,33 @@ class ActiveUser(HttpUser, ChatBackend):
         """
         response = self.client.get(
             "/auth/me",
-            headers=auth_headers(self.user.get("auth_token")),
+            headers=self.auth_headers(self.user),
             name="/auth/me"
         )
 
 
-class ExpertUser(HttpUser, ChatBackend):
+class ExpertPersona(User, ChatBackend):
     """
     Persona: An expert user who checks the expert queue and responds to help requests.
     Represents support staff, TAs, or experts in the help desk system who answer questions.
     
     Weight: 1 (least common, but important for system functionality)
     """
+    abstract = True
     weight = 1
     wait_time = between(10, 15)  # Experts check less frequently
 
     def on_start(self):
+        self.negotiate_encoding()
         self.last_check_time = None
+        self.poll_cursors = {}
         self.claimed_conversations = []
 
         # If we already have some users and the dice say "existing user":
-        if user_store.used_usernames and random.random() > NEW_USER_PROB:
+        if user_store.has_users() and random.random() > NEW_USER_PROB:
             existing_user = user_store.get_random_user()
-            # You can either:
-            # 1) Assume they are already logged in (use stored token)
-            # 2) Or actively log them in again each time, if token might be expired
+            # Reuse the stored token; self.auth_headers() refreshes it before
+            # it expires (see token_manager.py)
             self.user = existing_user
             return
 
@@ -556,7 +1468,7 @@ class ExpertUser(HttpUser, ChatBackend):
         password = username
 
         # Try register first, fall back to login if already exists
-        self.user = self.register(username, password) or self.login(username, password)
+        self.user = self.register_or_login(username, password)
 
         if not self.user:
             raise Exception("IdleUser: Failed to register or login user")
@@ -567,7 +1479,7 @@ class ExpertUser(HttpUser, ChatBackend):
     #     username = user_name_generator.generate_username()
     #     password = username
     #     # Try to register first, if it fails (user exists), then login
-    #     self.user = self.register(username, password) or self.login(username, password)
+    #     self.user = self.register_or_login(username, password)
     #     if not self.user:
     #         raise Exception(f"Failed to login or register user {username}")
 
@@ -575,29 +1487,12 @@ class ExpertUser(HttpUser, ChatBackend):
     @task(5)
     def claim_help_request(self):
         """
-        Claim a help request from the queue.
+        Claim a help request from the queue, picked by --claim-strategy.
         Weight: 5 (common action for active experts)
         """
-        # First get the queue
-        response = self.client.get(
-            "/expert/queue",
-            headers=auth_headers(self.user.get("auth_token")),
-            name="/expert/queue"
-        )
-        
-        if response.status_code == 200:
-            data = response.json()
-            waiting = data.get("waitingConversations", [])
-            if waiting:
-                conversation_id = str(waiting[0].get("id"))
-                claim_response = self.client.post(
-                    f"/expert/conversations/{conversation_id}/claim",
-                    headers=auth_headers(self.user.get("auth_token")),
-                    name="/expert/conversations/:id/claim"
-                )
-                
-                if claim_response.status_code == 200:
-                    self.claimed_conversations.append(conversation_id)
+        conversation_id = self.claim_from_queue(self.user)
+        if conversation_id:
+            self.claimed_conversations.append(conversation_id)
 
     @task(4)
     def respond_to_conversation(self):
@@ -609,14 +1504,14 @@ class ExpertUser(HttpUser, ChatBackend):
             # self.claim_help_request()
             return
         
-        conversation_id = random.choice(self.claimed_conversations)
+        conversation_id = self.pick_conversation(self.claimed_conversations)
         response = self.client.post(
             "/messages",
             json={
                 "conversationId": conversation_id,
-                "content": f"Expert response: {random.choice(['Let me help you with that.', 'Here is the solution...', 'Try this approach...', 'Have you considered...'])} [{datetime.utcnow().isoformat()}]"
+                "content": self.tag_message(f"Expert response: {random.choice(['Let me help you with that.', 'Here is the solution...', 'Try this approach...', 'Have you considered...'])} [{datetime.utcnow().isoformat()}]")
             },
-            headers=auth_headers(self.user.get("auth_token")),
+            headers=self.auth_headers(self.user),
             name="/messages [create]"
         )
 
@@ -630,10 +1525,10 @@ class ExpertUser(HttpUser, ChatBackend):
             # self.claim_help_request()
             return
         
-        conversation_id = random.choice(self.claimed_conversations)
+        conversation_id = self.pick_conversation(self.claimed_conversations)
         response = self.client.get(
             f"/conversations/{conversation_id}/messages",
-            headers=auth_headers(self.user.get("auth_token")),
+            headers=self.auth_headers(self.user),
             name="/conversations/:id/messages [list]"
         )
 
@@ -646,15 +1541,16 @@ class ExpertUser(HttpUser, ChatBackend):
         if not self.claimed_conversations:
             return
         
-        conversation_id = random.choice(self.claimed_conversations)
+        conversation_id = self.pick_conversation(self.claimed_conversations)
         response = self.client.post(
             f"/expert/conversations/{conversation_id}/unclaim",
-            headers=auth_headers(self.user.get("auth_token")),
+            headers=self.auth_headers(self.user),
             name="/expert/conversations/:id/unclaim"
         )
         
         if response.status_code == 200:
             self.claimed_conversations.remove(conversation_id)
+            claim_ledger.release(conversation_id)
 
     @task(2)
     def check_for_updates(self):
@@ -673,7 +1569,7 @@ class ExpertUser(HttpUser, ChatBackend):
         """
         response = self.client.get(
             "/expert/profile",
-            headers=auth_headers(self.user.get("auth_token")),
+            headers=self.auth_headers(self.user),
             name="/expert/profile"
         )
 
@@ -685,6 +1581,1081 @@ class ExpertUser(HttpUser, ChatBackend):
         """
         response = self.client.get(
             "/expert/assignments/history",
-            headers=auth_headers(self.user.get("auth_token")),
+            headers=self.auth_headers(self.user),
             name="/expert/assignments/history"
-        )
\ No newline at end of file
+        )
+
+class ReplayPersona(User, ChatBackend):
+    """
+    Persona: replays captured production traffic instead of weighted tasks
+    (see traffic_replay.py).
+
+    Selected by --replay. The first instance in each process replays the
+    stream once, sending every event at its captured time divided by
+    --replay-speed, as the UserStore user its captured identity maps to.
+    Requests are named "[replay] <path with :id>"; schedule lag and drops
+    are REPLAY rows. Further instances in the same process stop at once.
+
+    The client keeps no cookies: every request sends its mapped user's
+    session cookie explicitly, next to that user's JWT.
+
+    Weight: 1 (run exactly one per process)
+    """
+    abstract = True
+    weight = 1
+    wait_time = constant(0)
+
+    def on_start(self):
+        self.negotiate_encoding()
+        refuse_cookies(self.client)
+
+    @task
+    def replay(self):
+        global replay_running
+        if replay_running:
+            logging.warning("ReplayUser: the stream is already replayed by another user in this process")
+            raise StopUser()
+        replay_running = True
+
+        options = self.environment.parsed_options
+        partition = (0, 1)
+        if isinstance(self.environment.runner, WorkerRunner):
+            count = max(options.expect_workers, 1)
+            partition = (self.environment.runner.worker_index % count, count)
+        self.replayer = Replayer(
+            self.environment,
+            options.replay,
+            speed=options.replay_speed,
+            partition=partition,
+            max_outstanding=options.replay_max_outstanding,
+        )
+        try:
+            self.replayer.run(self.replay_request)
+        finally:
+            replay_running = False
+        raise StopUser()
+
+    def on_stop(self):
+        replayer = getattr(self, "replayer", None)
+        if replayer is not None:
+            replayer.stop()
+
+    def replay_request(self, identity, method, path, name, body):
+        """Send one captured request as the user mapped to its identity."""
+        user = self.replay_user(identity)
+        if user is None:
+            return
+        headers = self.auth_headers(user)
+        if user.get("session_cookie"):
+            headers["Cookie"] = user["session_cookie"]
+        kwargs = {"headers": headers, "name": name}
+        if body is not None:
+            kwargs["json"] = body
+        self.client.request(method, bind_user(path, user.get("user_id")), **kwargs)
+
+    def replay_user(self, identity):
+        """
+        The UserStore user a captured identity maps to, registering one if needed.
+
+        Identity N is the Nth stored user when the store has one; later
+        identities get new users. Concurrent first requests of the same
+        identity wait for a single registration.
+        """
+        mapped = replay_identities.get(identity)
+        if mapped is None:
+            mapped = replay_identities[identity] = AsyncResult()
+            user = user_store.get_user(identity)
+            if user is None:
+                username = user_name_generator.generate_username()
+                user = self.register_or_login(username, username)
+            mapped.set(user)
+        return mapped.get()
+
+
+class ClaimExpertPersona(User, ChatBackend):
+    """
+    Persona: one of a fixed pool of experts racing to claim help requests
+    (see claim_contention.py).
+
+    Selected by --claim-contention, which sets the pool size with
+    --claim-experts. Every --claim-poll-interval seconds each expert polls
+    the queue and claims the conversation --claim-strategy picks. Claims are
+    kept, so every conversation is claimed at most once by design.
+
+    Weight: fixed count (--claim-experts)
+    """
+    abstract = True
+    weight = 1
+    wait_time = constant_pacing(1)
+
+    def on_start(self):
+        self.negotiate_encoding()
+        # A new account per expert, so no two experts share an identity
+        username = user_name_generator.generate_username()
+        self.user = self.register_or_login(username, username)
+        if not self.user:
+            raise Exception("ClaimExpertUser: Failed to register or login user")
+
+    @task
+    def claim(self):
+        self.claim_from_queue(self.user, record=True)
+
+
+class ClaimAskerPersona(User, ChatBackend):
+    """
+    Persona: fills the expert queue for the claim contention benchmark.
+
+    Selected by --claim-contention; every user not in the expert pool is an
+    asker and creates a conversation every --claim-ask-interval seconds, so
+    the arrival rate is (users - experts) / interval.
+
+    Weight: 1 (the remaining users)
+    """
+    abstract = True
+    weight = 1
+    wait_time = constant_pacing(1)
+
+    def on_start(self):
+        self.negotiate_encoding()
+        if user_store.has_users() and random.random() > NEW_USER_PROB:
+            self.user = user_store.get_random_user()
+            return
+        username = user_name_generator.generate_username()
+        self.user = self.register_or_login(username, username)
+        if not self.user:
+            raise Exception("ClaimAskerUser: Failed to register or login user")
+
+    @task
+    def ask(self):
+        self.client.post(
+            "/conversations",
+            json={"title": f"Claim contention question - {datetime.utcnow().isoformat()}"},
+            headers=self.auth_headers(self.user),
+            name="/conversations [create]"
+        )
+
+
+CONTENTION_PERSONAS = (ClaimExpertPersona, ClaimAskerPersona)
+
+
+class ConsistencyPersona(User, ChatBackend):
+    """
+    Persona: checks that its own messages are readable right after they are
+    written, for runs with several app instances (see consistency.py).
+
+    Added to any run by --consistency-checkers (a fixed count). Every
+    --consistency-interval seconds it sends a message to its own
+    conversation and reads it back through both message read paths at once,
+    again and again, until they show it or --consistency-timeout passes.
+
+    Weight: fixed count (--consistency-checkers)
+    """
+    abstract = True
+    weight = 1
+    wait_time = constant_pacing(5)
+
+    def on_start(self):
+        self.negotiate_encoding()
+        username = user_name_generator.generate_username()
+        self.user = self.register_or_login(username, username)
+        if not self.user:
+            raise Exception("ConsistencyUser: Failed to register or login user")
+        self.conversation_id = None
+        self.samples_in_conversation = 0
+
+    def open_conversation(self):
+        """Create the conversation the next samples are written to."""
+        response = self.client.post(
+            "/conversations",
+            json={"title": f"Consistency check - {datetime.utcnow().isoformat()}"},
+            headers=self.auth_headers(self.user),
+            name="/conversations [consistency]"
+        )
+        if response.status_code != 201:
+            return None
+        self.samples_in_conversation = 0
+        return str(self.decode_json(response).get("id"))
+
+    @task
+    def check_read_after_write(self):
+        """Write one message and time until each read path shows it."""
+        if self.conversation_id is None or self.samples_in_conversation >= MESSAGES_PER_CONVERSATION:
+            self.conversation_id = self.open_conversation()
+            if self.conversation_id is None:
+                return
+
+        response = self.client.post(
+            "/messages",
+            json={
+                "conversationId": self.conversation_id,
+                "content": f"Consistency check at {datetime.utcnow().isoformat()}"
+            },
+            headers=self.auth_headers(self.user),
+            name="/messages [consistency]"
+        )
+        written = time.perf_counter()
+        if response.status_code != 201:
+            return
+        self.samples_in_conversation += 1
+        message = self.decode_json(response)
+        message_id = str(message.get("id"))
+        # since from the server's own timestamp, one second early for its rounding
+        since = datetime.fromisoformat(message["timestamp"].replace("Z", "+00:00")) - timedelta(seconds=1)
+
+        pending = {
+            READ_PATHS[0]: (f"/conversations/{self.conversation_id}/messages", {}),
+            READ_PATHS[1]: ("/api/messages/updates", {"userId": self.user.get("user_id"), "since": since.isoformat()}),
+        }
+        reads = dict.fromkeys(pending, 0)
+        timeout = self.environment.parsed_options.consistency_timeout
+        delays = read_delays()
+        while True:
+            rounds = {
+                path: gevent.spawn(self.read_back, path, url, params, message_id)
+                for path, (url, params) in pending.items()
+            }
+            gevent.joinall(list(rounds.values()), raise_error=True)
+            for path, greenlet in rounds.items():
+                started = greenlet.value
+                if started is None:
+                    continue
+                reads[path] += 1
+                if started is not False:
+                    self.record_metric(
+                        "CONSISTENCY", metric_name(path, "visibility lag"), (started - written) * 1000, reads[path]
+                    )
+                    del pending[path]
+            if not pending:
+                return
+            if time.perf_counter() - written >= timeout:
+                for path in pending:
+                    self.record_metric("CONSISTENCY", metric_name(path, "not visible"), exception=NotVisible(
+                        f"message not visible after {timeout:g}s"
+                    ))
+                return
+            gevent.sleep(next(delays))
+
+    def read_back(self, path, url, params, message_id):
+        """
+        Read one path and record whether it shows the message.
+
+        Returns:
+            The perf_counter() time the read started if it showed the message,
+            False for a stale read, None if the request failed
+        """
+        started = time.perf_counter()
+        response = self.client.get(
+            url,
+            params=params,
+            headers=self.auth_headers(self.user),
+            name=f"{path} [consistency]"
+        )
+        if response.status_code != 200:
+            return None
+        if contains_message(self.decode_json(response), message_id):
+            self.record_metric("CONSISTENCY", metric_name(path, "read"))
+            return started
+        self.record_metric("CONSISTENCY", metric_name(path, "read"), exception=StaleRead(
+            "written message missing from the response"
+        ))
+        return False
+
+
+# Concrete personas: each persona runs on both HTTP clients. The task code is
+# shared; only the client (python-requests vs. geventhttpclient) differs.
+HTTP_CLIENTS = ("requests", "fast")
+UPDATE_MODES = ("polling", "sse")
+
+
+class IdleUser(HttpUser, IdlePersona):
+    """IdlePersona on the python-requests client."""
+
+
+class ActiveUser(HttpUser, ActivePersona):
+    """ActivePersona on the python-requests client."""
+
+
+class ExpertUser(HttpUser, ExpertPersona):
+    """ExpertPersona on the python-requests client."""
+
+
+class StreamingUser(HttpUser, StreamingPersona):
+    """StreamingPersona on the python-requests client."""
+
+
+class ReplayUser(HttpUser, ReplayPersona):
+    """ReplayPersona on the python-requests client."""
+
+
+class ClaimExpertUser(HttpUser, ClaimExpertPersona):
+    """ClaimExpertPersona on the python-requests client."""
+
+
+class ClaimAskerUser(HttpUser, ClaimAskerPersona):
+    """ClaimAskerPersona on the python-requests client."""
+
+
+class ConsistencyUser(HttpUser, ConsistencyPersona):
+    """ConsistencyPersona on the python-requests client."""
+
+
+class ChatFastHttpUser(FastHttpUser):
+    """
+    FastHttpUser that identifies itself like python-requests.
+
+    ApplicationController#detect_locust_request looks for "python-requests"
+    in the User-Agent to keep load test traffic away from Bedrock; the
+    geventhttpclient default User-Agent would slip past it.
+    """
+    abstract = True
+    default_headers = {"User-Agent": "python-requests (locust FastHttpUser)"}
+
+
+class FastIdleUser(ChatFastHttpUser, IdlePersona):
+    """IdlePersona on the geventhttpclient client."""
+
+
+class FastActiveUser(ChatFastHttpUser, ActivePersona):
+    """ActivePersona on the geventhttpclient client."""
+
+
+class FastExpertUser(ChatFastHttpUser, ExpertPersona):
+    """ExpertPersona on the geventhttpclient client."""
+
+
+class FastStreamingUser(ChatFastHttpUser, StreamingPersona):
+    """StreamingPersona on the geventhttpclient client."""
+
+
+class FastReplayUser(ChatFastHttpUser, ReplayPersona):
+    """ReplayPersona on the geventhttpclient client."""
+
+
+class FastClaimExpertUser(ChatFastHttpUser, ClaimExpertPersona):
+    """ClaimExpertPersona on the geventhttpclient client."""
+
+
+class FastClaimAskerUser(ChatFastHttpUser, ClaimAskerPersona):
+    """ClaimAskerPersona on the geventhttpclient client."""
+
+
+class FastConsistencyUser(ChatFastHttpUser, ConsistencyPersona):
+    """ConsistencyPersona on the geventhttpclient client."""
+
+
+@events.init_command_line_parser.add_listener
+def add_custom_arguments(parser):
+    parser.add_argument(
+        "--http-client",
+        choices=HTTP_CLIENTS,
+        default="requests",
+        env_var="LOCUST_HTTP_CLIENT",
+        help="HTTP client used by the personas: 'requests' (HttpUser) or 'fast' (FastHttpUser)",
+    )
+    parser.add_argument(
+        "--update-mode",
+        choices=UPDATE_MODES,
+        default="polling",
+        env_var="LOCUST_UPDATE_MODE",
+        help="How idle browsers get updates: 'polling' (IdleUser) or 'sse' (StreamingUser)",
+    )
+    parser.add_argument(
+        "--sse-session-seconds",
+        type=float,
+        default=0,
+        env_var="LOCUST_SSE_SESSION_SECONDS",
+        help="Close and reopen each SSE stream after this many seconds (0 = hold until the server drops it)",
+    )
+    parser.add_argument(
+        "--shape-profile",
+        default=None,
+        env_var="LOCUST_SHAPE_PROFILE",
+        help="Arrival-rate profile for the load shape: a YAML/JSON file or an inline JSON string (see load_profile.py)",
+    )
+    parser.add_argument(
+        "--capacity-search",
+        default=None,
+        env_var="LOCUST_CAPACITY_SEARCH",
+        help="Search for the highest arrival rate that meets the SLOs in this spec, a YAML/JSON file "
+             "or inline JSON string (see capacity_finder.py); replaces the shape profile",
+    )
+    parser.add_argument(
+        "--hdr-report",
+        default=None,
+        env_var="LOCUST_HDR_REPORT",
+        help="Record HdrHistograms per endpoint and shape step; write percentiles to <prefix>_steps.csv/.json",
+    )
+    parser.add_argument(
+        "--bandwidth-report",
+        default=None,
+        env_var="LOCUST_BANDWIDTH_REPORT",
+        help="Record response sizes, items and compression per endpoint and shape step; "
+             "write them to <prefix>_bandwidth.csv/.json",
+    )
+    parser.add_argument(
+        "--accept-encoding",
+        choices=ACCEPT_ENCODINGS,
+        default="default",
+        env_var="LOCUST_ACCEPT_ENCODING",
+        help="Accept-Encoding sent on every request; 'default' keeps the HTTP client's own header",
+    )
+    parser.add_argument(
+        "--overhead-report",
+        default=None,
+        env_var="LOCUST_OVERHEAD_REPORT",
+        help="Profile the load generator's own CPU, task and event loop overhead; write it per shape step "
+             "to <prefix>_overhead.csv/.json (see client_overhead.py)",
+    )
+    parser.add_argument(
+        "--overhead-threshold",
+        type=float,
+        default=25,
+        env_var="LOCUST_OVERHEAD_THRESHOLD",
+        help="Flag the generator as saturated when this percentage of task time is spent outside the network "
+             "(see client_overhead.py); 0 disables the check",
+    )
+    parser.add_argument(
+        "--overhead-cpu-threshold",
+        type=float,
+        default=85,
+        env_var="LOCUST_OVERHEAD_CPU_THRESHOLD",
+        help="Flag the generator as saturated at this process CPU percentage; 0 disables the check",
+    )
+    parser.add_argument(
+        "--replay",
+        default=None,
+        env_var="LOCUST_REPLAY",
+        help="Replay this event stream (see traffic_replay.py) instead of running the personas; "
+             "run one user per process",
+    )
+    parser.add_argument(
+        "--replay-speed",
+        type=float,
+        default=1.0,
+        env_var="LOCUST_REPLAY_SPEED",
+        help="Replay the captured timing this many times faster (e.g. 1, 5, 20)",
+    )
+    parser.add_argument(
+        "--replay-max-outstanding",
+        type=int,
+        default=10000,
+        env_var="LOCUST_REPLAY_MAX_OUTSTANDING",
+        help="Replayed requests allowed in flight per process before new ones are dropped",
+    )
+    parser.add_argument(
+        "--claim-contention",
+        action="store_true",
+        default=False,
+        env_var="LOCUST_CLAIM_CONTENTION",
+        help="Run the expert claim contention benchmark (see claim_contention.py) instead of the personas; "
+             "-u counts experts plus askers",
+    )
+    parser.add_argument(
+        "--claim-experts",
+        type=int,
+        default=8,
+        env_var="LOCUST_CLAIM_EXPERTS",
+        help="Experts racing for claims in the contention benchmark; the other users create conversations",
+    )
+    parser.add_argument(
+        "--claim-strategy",
+        default="head",
+        env_var="LOCUST_CLAIM_STRATEGY",
+        help="Which waiting conversation experts claim: head, random[:k] or oldest-unassigned",
+    )
+    parser.add_argument(
+        "--claim-poll-interval",
+        type=float,
+        default=1.0,
+        env_var="LOCUST_CLAIM_POLL_INTERVAL",
+        help="Seconds between each contention expert's queue poll and claim",
+    )
+    parser.add_argument(
+        "--claim-ask-interval",
+        type=float,
+        default=1.0,
+        env_var="LOCUST_CLAIM_ASK_INTERVAL",
+        help="Seconds between conversations each contention asker creates",
+    )
+    parser.add_argument(
+        "--consistency-checkers",
+        type=int,
+        default=0,
+        env_var="LOCUST_CONSISTENCY_CHECKERS",
+        help="Add this many read-after-write checkers (see consistency.py) on top of the other users (0 = off)",
+    )
+    parser.add_argument(
+        "--consistency-interval",
+        type=float,
+        default=5.0,
+        env_var="LOCUST_CONSISTENCY_INTERVAL",
+        help="Seconds between each checker's write-and-read-back samples",
+    )
+    parser.add_argument(
+        "--consistency-timeout",
+        type=float,
+        default=10.0,
+        env_var="LOCUST_CONSISTENCY_TIMEOUT",
+        help="Give up reading a sample back after this many seconds and record it as not visible",
+    )
+    parser.add_argument(
+        "--consistency-report",
+        default=None,
+        env_var="LOCUST_CONSISTENCY_REPORT",
+        help="Write stale read rates and visibility lag per read path and shape step to "
+             "<prefix>_consistency.csv/.json",
+    )
+    parser.add_argument(
+        "--arrival-process",
+        choices=ARRIVAL_PROCESSES,
+        default="closed",
+        env_var="LOCUST_ARRIVAL_PROCESS",
+        help="'closed' waits for each task (Locust default); 'poisson'/'constant' start tasks on an open-loop schedule",
+    )
+    parser.add_argument(
+        "--open-loop-max-outstanding",
+        type=int,
+        default=10000,
+        env_var="LOCUST_OPEN_LOOP_MAX_OUTSTANDING",
+        help="Open-loop tasks allowed in flight per process before new ones are dropped",
+    )
+    parser.add_argument(
+        "--poll-cursor",
+        choices=("server", "client"),
+        default="server",
+        env_var="LOCUST_POLL_CURSOR",
+        help="Where */updates polls take since from: the newest timestamp the server returned (server), "
+             "or the load generator's clock after the previous poll (client, the original behaviour)",
+    )
+    parser.add_argument(
+        "--poll-audit-every",
+        type=int,
+        default=0,
+        env_var="LOCUST_POLL_AUDIT_EVERY",
+        help="With --poll-cursor server, fetch a feed in full every N polls to detect gaps "
+             "(0 = never; audits add unfiltered full-history queries to the workload)",
+    )
+    parser.add_argument(
+        "--concurrent-polls",
+        action="store_true",
+        default=False,
+        env_var="LOCUST_CONCURRENT_POLLS",
+        help="Send IdleUser's three update polls in parallel, like a browser",
+    )
+    parser.add_argument(
+        "--delivery-sample-rate",
+        type=float,
+        default=1.0,
+        env_var="LOCUST_DELIVERY_SAMPLE_RATE",
+        help="Fraction of sent messages tagged for end-to-end delivery latency (0 disables)",
+    )
+    parser.add_argument(
+        "--user-selection",
+        default="uniform",
+        env_var="LOCUST_USER_SELECTION",
+        help="How stored users are picked: uniform, zipf[:s] (oldest hottest) or recency[:s] (see selection.py)",
+    )
+    parser.add_argument(
+        "--conversation-selection",
+        default="uniform",
+        env_var="LOCUST_CONVERSATION_SELECTION",
+        help="How stored and per-persona conversations are picked: uniform, zipf[:s] or recency[:s]",
+    )
+    parser.add_argument(
+        "--run-metadata",
+        default=None,
+        env_var="LOCUST_RUN_METADATA",
+        help="Write the run's configuration (personas, client, shape, selection, ...) to this JSON file at test start",
+    )
+    parser.add_argument(
+        "--max-stored-conversations",
+        type=int,
+        default=0,
+        env_var="LOCUST_MAX_STORED_CONVERSATIONS",
+        help="Cap on conversation IDs kept in the shared store, oldest evicted first (0 = unbounded)",
+    )
+    parser.add_argument(
+        "--stored-conversation-ttl",
+        type=float,
+        default=0,
+        env_var="LOCUST_STORED_CONVERSATION_TTL",
+        help="Forget stored conversation IDs after this many seconds (0 = never)",
+    )
+    parser.add_argument(
+        "--max-user-conversations",
+        type=int,
+        default=0,
+        env_var="LOCUST_MAX_USER_CONVERSATIONS",
+        help="Cap on conversations each ActiveUser tracks, oldest dropped first (0 = unbounded)",
+    )
+    parser.add_argument(
+        "--username-space",
+        type=int,
+        default=MAX_USERS,
+        env_var="LOCUST_USERNAME_SPACE",
+        help="Number of distinct user_N names the generator draws from",
+    )
+    parser.add_argument(
+        "--username-seed",
+        type=int,
+        default=None,
+        env_var="LOCUST_USERNAME_SEED",
+        help="Seed for the username sequence (default: random, chosen by the master)",
+    )
+    parser.add_argument(
+        "--username-partitions",
+        type=int,
+        default=None,
+        env_var="LOCUST_USERNAME_PARTITIONS",
+        help="Disjoint username slices for distributed runs (default: --expect-workers); at least the worker count",
+    )
+    parser.add_argument(
+        "--dataset-manifest",
+        default=None,
+        env_var="LOCUST_DATASET_MANIFEST",
+        help="Manifest from seed_dataset.py to preload the seeded users, tokens and conversations from",
+    )
+    parser.add_argument(
+        "--user-fixture",
+        default=None,
+        env_var="LOCUST_USER_FIXTURE",
+        help="Fixture file from provision_users.py to preload users and tokens from",
+    )
+    parser.add_argument(
+        "--local-user-store",
+        action="store_true",
+        default=False,
+        env_var="LOCUST_LOCAL_USER_STORE",
+        help="In distributed runs, keep users and conversations per worker instead of sharing them",
+    )
+    parser.add_argument(
+        "--user-store-sync-interval",
+        type=float,
+        default=1.0,
+        env_var="LOCUST_USER_STORE_SYNC_INTERVAL",
+        help="Seconds between user store deltas sent between master and workers",
+    )
+    parser.add_argument(
+        "--token-refresh-lead",
+        type=float,
+        default=60,
+        env_var="LOCUST_TOKEN_REFRESH_LEAD",
+        help="Refresh stored users' JWTs this many seconds before they expire (0 = never refresh)",
+    )
+    parser.add_argument(
+        "--token-refresh-jitter",
+        type=float,
+        default=60,
+        env_var="LOCUST_TOKEN_REFRESH_JITTER",
+        help="Add a random 0..N seconds to each token's refresh lead so refreshes spread out",
+    )
+
+
+@events.init.add_listener
+def select_user_classes(environment, runner=None, **kwargs):
+    """
+    Keep only the persona set matching --http-client and --update-mode, or
+    only ReplayUser with --replay, or only the claim contention personas with
+    --claim-contention (the expert pool as a fixed count). ConsistencyUser
+    joins any of these as a fixed count with --consistency-checkers.
+
+    Skipped when user classes are named explicitly on the command line, and on
+    workers, which must be able to spawn whatever class the master dispatches.
+    """
+    options = environment.parsed_options
+    if options is None or getattr(options, "user_classes", None):
+        return
+    if isinstance(runner, WorkerRunner):
+        return
+
+    client_base = FastHttpUser if options.http_client == "fast" else HttpUser
+    if options.replay and options.claim_contention:
+        raise ValueError("--replay and --claim-contention can't be combined")
+    if options.replay:
+        unused_persona = (IdlePersona, StreamingPersona, ActivePersona, ExpertPersona) + CONTENTION_PERSONAS
+    elif options.claim_contention:
+        unused_persona = (IdlePersona, StreamingPersona, ActivePersona, ExpertPersona, ReplayPersona)
+        ClaimExpertPersona.fixed_count = options.claim_experts
+    else:
+        unused_persona = (
+            IdlePersona if options.update_mode == "sse" else StreamingPersona, ReplayPersona,
+        ) + CONTENTION_PERSONAS
+    if options.consistency_checkers > 0:
+        ConsistencyPersona.fixed_count = options.consistency_checkers
+    else:
+        unused_persona += (ConsistencyPersona,)
+    environment.user_classes[:] = [
+        user_class for user_class in environment.user_classes
+        if (not issubclass(user_class, (HttpUser, FastHttpUser)) or issubclass(user_class, client_base))
+        and not issubclass(user_class, unused_persona)
+    ]
+
+
+@events.init.add_listener
+def enable_overhead_profiler(environment, runner=None, **kwargs):
+    """
+    Time the request-driven personas' tasks when --overhead-report is given
+    (see client_overhead.py); the master only collects the workers' reports.
+
+    Registered before enable_open_loop so that open-loop tasks are timed in
+    the greenlet that runs them rather than the one that schedules them.
+    """
+    options = environment.parsed_options
+    if options is None or not options.overhead_report:
+        return
+    recorder = OverheadRecorder(
+        environment,
+        lambda: current_shape_step(environment),
+        options.overhead_report,
+        is_worker=isinstance(runner, WorkerRunner),
+    )
+    if isinstance(runner, MasterRunner):
+        return
+    overhead_profiler.attach(recorder)
+    for user_class in environment.user_classes:
+        if issubclass(user_class, (IdlePersona, ActivePersona, ExpertPersona) + CONTENTION_PERSONAS):
+            overhead_profiler.install(user_class)
+
+
+@events.init.add_listener
+def enable_open_loop(environment, runner=None, **kwargs):
+    """Put the request-driven personas on an open-loop arrival schedule (see open_loop.py)."""
+    options = environment.parsed_options
+    if options is None or options.arrival_process == "closed" or isinstance(runner, MasterRunner):
+        return
+    scheduler = OpenLoopScheduler(
+        environment,
+        process=options.arrival_process,
+        max_outstanding=options.open_loop_max_outstanding,
+    )
+    for user_class in environment.user_classes:
+        # StreamingUser holds one long request per task; a schedule means nothing there
+        if issubclass(user_class, (IdlePersona, ActivePersona, ExpertPersona)):
+            scheduler.install(user_class)
+
+
+def current_shape_step(environment):
+    """(step index, step label) of the running load shape, for the per-step reports."""
+    shape = environment.shape_class
+    if shape is None:
+        return (0, "run")
+    return getattr(shape, "current_step", None)
+
+
+@events.init.add_listener
+def enable_hdr_report(environment, runner=None, **kwargs):
+    """Start per-step HdrHistogram recording when --hdr-report is given."""
+    options = environment.parsed_options
+    if options is None or not options.hdr_report:
+        return
+
+    StepLatencyRecorder(
+        environment,
+        lambda: current_shape_step(environment),
+        options.hdr_report,
+        is_worker=isinstance(runner, WorkerRunner),
+    )
+
+
+@events.init.add_listener
+def enable_client_events(environment, runner=None, **kwargs):
+    """Collect FALLBACK/CURSOR client event counts (see client_events.py)."""
+    client_events.attach(environment, is_worker=isinstance(runner, WorkerRunner))
+
+
+@events.init.add_listener
+def enable_bandwidth_report(environment, runner=None, **kwargs):
+    """Start per-step response size recording when --bandwidth-report is given."""
+    options = environment.parsed_options
+    if options is None or not options.bandwidth_report:
+        return
+
+    BandwidthRecorder(
+        environment,
+        lambda: current_shape_step(environment),
+        options.bandwidth_report,
+        is_worker=isinstance(runner, WorkerRunner),
+    )
+
+
+@events.init.add_listener
+def enable_consistency_report(environment, runner=None, **kwargs):
+    """Start the per-step read-after-write report when --consistency-report is given."""
+    options = environment.parsed_options
+    if options is None or not options.consistency_report:
+        return
+
+    ConsistencyRecorder(
+        environment,
+        lambda: current_shape_step(environment),
+        options.consistency_report,
+        is_worker=isinstance(runner, WorkerRunner),
+    )
+
+
+@events.init.add_listener
+def load_shape_profile(environment, **kwargs):
+    """
+    Load and validate --shape-profile or --capacity-search before the run
+    starts; a bad spec aborts startup.
+
+    --replay takes its timing from the capture, so it turns the shape off and
+    the run uses -u/-r (one user per process). So does --claim-contention,
+    whose load is set by the user count and intervals.
+    """
+    options = environment.parsed_options
+    shape = environment.shape_class
+    if options is None or not isinstance(shape, DynamicArrivalRateWithGaps):
+        return
+    if options.shape_profile and options.capacity_search:
+        raise ValueError("--shape-profile and --capacity-search can't be combined")
+    if options.replay:
+        if options.shape_profile or options.capacity_search:
+            raise ValueError("--replay can't be combined with --shape-profile or --capacity-search")
+        environment.shape_class = None
+        return
+    if options.claim_contention:
+        if options.shape_profile or options.capacity_search:
+            raise ValueError("--claim-contention can't be combined with --shape-profile or --capacity-search")
+        environment.shape_class = None
+        return
+
+    if options.capacity_search:
+        shape.profile = CapacitySearch.load(options.capacity_search)
+        shape.profile.bind(environment)
+        logging.info(
+            f"Capacity search {options.capacity_search}: "
+            + "; ".join(slo.description for slo in shape.profile.slos)
+        )
+    elif options.shape_profile:
+        shape.profile = LoadProfile.load(options.shape_profile)
+        logging.info(
+            f"Loaded shape profile {options.shape_profile}: {len(shape.profile.segments)} segments, "
+            f"{shape.profile.duration:.0f}s"
+        )
+
+
+@events.init.add_listener
+def configure_user_store(environment, runner=None, **kwargs):
+    options = environment.parsed_options
+    if options is None:
+        return
+    user_store.configure_conversations(
+        max_size=options.max_stored_conversations or None,
+        max_age=options.stored_conversation_ttl or None,
+    )
+    if options.user_fixture:
+        started = time.perf_counter()
+        loaded = user_store.load_users(read_user_fixture(options.user_fixture))
+        logging.info(
+            f"Loaded {loaded} users from {options.user_fixture} in {time.perf_counter() - started:.3f}s"
+        )
+    if options.dataset_manifest:
+        started = time.perf_counter()
+        users, conversation_ids, password = read_manifest(options.dataset_manifest)
+        loaded = user_store.load_users(users, password=password)
+        conversations = user_store.load_conversations(conversation_ids)
+        logging.info(
+            f"Loaded {loaded} users and {conversations} conversations from {options.dataset_manifest} "
+            f"in {time.perf_counter() - started:.3f}s"
+        )
+    if isinstance(runner, (MasterRunner, WorkerRunner)) and not options.local_user_store:
+        UserStoreSync(user_store, runner, flush_interval=options.user_store_sync_interval)
+
+
+@events.init.add_listener
+def choose_username_seed(environment, runner=None, **kwargs):
+    """Pick the shared username seed on the master; workers receive it with their first spawn."""
+    options = environment.parsed_options
+    if options is None or isinstance(runner, WorkerRunner):
+        return
+    if options.username_seed is None:
+        options.username_seed = random.randint(0, options.username_space)
+
+
+@events.test_start.add_listener
+def configure_token_refresh(environment, **kwargs):
+    """Apply the token refresh settings; on workers these arrive from the master at the first spawn."""
+    options = environment.parsed_options
+    if options is None:
+        return
+    token_manager.lead = options.token_refresh_lead
+    token_manager.jitter = options.token_refresh_jitter
+
+
+@events.test_start.add_listener
+def configure_overhead_thresholds(environment, **kwargs):
+    """Apply the generator saturation thresholds; on workers these arrive from the master at the first spawn."""
+    options = environment.parsed_options
+    if options is None:
+        return
+    overhead_profiler.threshold = options.overhead_threshold
+    overhead_profiler.cpu_threshold = options.overhead_cpu_threshold
+
+
+@events.init.add_listener
+def validate_selection(environment, **kwargs):
+    """Reject bad --user-selection/--conversation-selection specs at startup."""
+    options = environment.parsed_options
+    if options is None:
+        return
+    parse_selection(options.user_selection)
+    parse_selection(options.conversation_selection)
+
+
+@events.test_start.add_listener
+def configure_selection(environment, **kwargs):
+    """Apply the selection distributions; on workers these arrive from the master at the first spawn."""
+    options = environment.parsed_options
+    if options is None:
+        return
+    user_store.user_selection = parse_selection(options.user_selection)
+    user_store.conversation_selection = parse_selection(options.conversation_selection)
+
+
+@events.init.add_listener
+def validate_claim_strategy(environment, **kwargs):
+    """Reject a bad --claim-strategy spec at startup."""
+    options = environment.parsed_options
+    if options is None:
+        return
+    parse_claim_strategy(options.claim_strategy)
+
+
+@events.test_start.add_listener
+def configure_claim_contention(environment, **kwargs):
+    """Apply the claim strategy and intervals; on workers these arrive from the master at the first spawn."""
+    global claim_strategy
+    options = environment.parsed_options
+    if options is None:
+        return
+    claim_strategy = parse_claim_strategy(options.claim_strategy)
+    ClaimExpertPersona.wait_time = constant_pacing(options.claim_poll_interval)
+    ClaimAskerPersona.wait_time = constant_pacing(options.claim_ask_interval)
+    if options.claim_contention and not isinstance(environment.runner, WorkerRunner):
+        logging.info(
+            f"Claim contention: {options.claim_experts} experts, strategy {claim_strategy.description}, "
+            f"polling every {options.claim_poll_interval:g}s"
+        )
+
+
+@events.test_start.add_listener
+def configure_consistency_checks(environment, **kwargs):
+    """Apply the checkers' sample interval; on workers it arrives from the master at the first spawn."""
+    options = environment.parsed_options
+    if options is None:
+        return
+    ConsistencyPersona.wait_time = constant_pacing(options.consistency_interval)
+
+
+@events.test_stop.add_listener
+def log_claim_summary(environment, **kwargs):
+    """Log claim success/conflict rates and latencies (see claim_contention.py)."""
+    if isinstance(environment.runner, WorkerRunner):
+        return
+    summary = claim_summary(environment.stats)
+    if summary:
+        logging.info(f"Claims ({claim_strategy.description}): {summary}")
+
+
+@events.test_start.add_listener
+def write_run_metadata(environment, **kwargs):
+    """
+    Log the settings that shape the workload and write them to --run-metadata.
+
+    Runs on the master (or the only process); every option is included so
+    two runs can be compared later.
+    """
+    options = environment.parsed_options
+    if options is None or isinstance(environment.runner, WorkerRunner):
+        return
+    metadata = {
+        "started_at": datetime.utcnow().isoformat() + "Z",
+        "host": environment.host,
+        "locust_version": locust.__version__,
+        "user_classes": [user_class.__name__ for user_class in environment.user_classes],
+        "shape": type(environment.shape_class).__name__ if environment.shape_class else None,
+        "selection": {
+            "users": user_store.user_selection.description,
+            "conversations": user_store.conversation_selection.description,
+        },
+        "stored_users": user_store.user_count(),
+        "stored_conversations": len(user_store.conversation_ids),
+        "options": {
+            key: value for key, value in vars(options).items()
+            if isinstance(value, (str, int, float, bool, type(None), list))
+        },
+    }
+    logging.info(
+        f"Selection: users {metadata['selection']['users']}, conversations {metadata['selection']['conversations']}"
+    )
+    if options.run_metadata:
+        with open(options.run_metadata, "w") as f:
+            json.dump(metadata, f, indent=1, default=str)
+
+
+def peak_users(environment):
+    """Most users the run can reach: the shape profile's peak, or -u without a shape."""
+    options = environment.parsed_options
+    profile = getattr(environment.shape_class, "profile", None)
+    if profile is None:
+        return options.num_users or 0
+    total = getattr(profile, "total_users", None)
+    if total is None:
+        return profile.max_users
+    return min(int(total), profile.max_users)
+
+
+@events.init.add_listener
+def validate_username_partitions(environment, runner=None, **kwargs):
+    """
+    Fail at startup when a worker's slice of the username namespace has fewer
+    names than the new users it may register, which would make workers reuse
+    names.
+
+    Only about NEW_USER_PROB of spawned users register a new name; the rest
+    log in as stored users. Runs on the master, after load_shape_profile has
+    loaded the peak.
+    """
+    options = environment.parsed_options
+    if options is None or not isinstance(runner, MasterRunner):
+        return
+    workers = max(options.expect_workers, 1)
+    partitions = options.username_partitions or workers
+    if partitions < workers:
+        raise ValueError(f"--username-partitions {partitions} is less than --expect-workers {workers}")
+    slice_size = options.username_space // partitions
+    per_worker = math.ceil(peak_users(environment) * NEW_USER_PROB / workers)
+    if slice_size < per_worker:
+        raise ValueError(
+            f"--username-space {options.username_space} in {partitions} partitions leaves {slice_size} names "
+            f"per worker, fewer than the {per_worker} new users each of {workers} workers may register; "
+            f"raise --username-space to at least {per_worker * partitions}"
+        )
+
+
+@events.test_start.add_listener
+def configure_username_partition(environment, **kwargs):
+    """Give this process its own slice of the username namespace."""
+    global user_name_generator
+    options = environment.parsed_options
+    if options is None:
+        return
+
+    partition_index, partition_count = 0, 1
+    if isinstance(environment.runner, WorkerRunner):
+        partition_count = options.username_partitions or max(options.expect_workers, 1)
+        partition_index = environment.runner.worker_index % partition_count
+        if partition_index != environment.runner.worker_index:
+            # a worker that (re)connected after the first partition_count ones
+            logging.warning(
+                f"worker index {environment.runner.worker_index} is beyond {partition_count} username partitions; "
+                f"sharing partition {partition_index}, so usernames may collide with another worker's. "
+                "Raise --username-partitions to leave room for reconnecting workers."
+            )
+    user_name_generator = UserNameGenerator(
+        max_users=options.username_space,
+        seed=options.username_seed,
+        partition_index=partition_index,
+        partition_count=partition_count,
+    )
@@ -0,0 +1,143 @@
+"""
+Open-loop execution for the locustfile personas.
+
+In Locust's normal closed loop a user waits for a task to finish before its
+wait_time starts, so when the backend slows down the generator sends less
+load and the reported latencies look better than what users would see
+(coordinated omission). In open-loop mode each user instead follows an
+arrival schedule that ignores response times:
+
+- Intended start times come from a Poisson process (exponential gaps) or a
+  constant-rate one. The mean gap is the persona's mean wait_time, so both
+  modes offer the same average load as the closed loop while the backend
+  keeps up.
+- At each intended time the task is started in its own greenlet and the user
+  moves on to the next intended time without waiting for it.
+- Every HTTP request made by such a task gets a second stats row,
+  "<name> [from intended]", whose response time is measured from the task's
+  intended start rather than the actual send time.
+- How late each task started is recorded as OPEN "schedule lag". A growing
+  lag means the generator itself fell behind.
+- At most max_outstanding tasks run at once per process. Tasks over the
+  limit are skipped and counted as OPEN "dropped (max outstanding)".
+"""
+
+import functools
+import logging
+import random
+import time
+
+import gevent
+from gevent.pool import Group
+
+
+ARRIVAL_PROCESSES = ("closed", "poisson", "constant")
+HTTP_METHODS = {"GET", "POST", "PUT", "PATCH", "DELETE", "HEAD", "OPTIONS"}
+WAIT_TIME_SAMPLES = 1000
+
+
+class OpenLoopScheduler:
+    """Rewires user classes to run their tasks on an arrival schedule."""
+
+    def __init__(self, environment, process="poisson", max_outstanding=10000):
+        if process not in ("poisson", "constant"):
+            raise ValueError(f"unknown arrival process {process!r}")
+        self.environment = environment
+        self.process = process
+        self.max_outstanding = max_outstanding
+        self.tasks = Group()
+        self.task_lags = {}
+        environment.events.request.add_listener(self.on_request)
+        environment.events.test_stop.add_listener(self.on_test_stop)
+
+    def install(self, user_class):
+        """
+        Switch a user class to open-loop execution.
+
+        Samples the class's wait_time to find the mean gap between tasks, then
+        replaces wait_time with the schedule and wraps every task so it is
+        started in the background.
+        """
+        mean_gap = sum(user_class.wait_time(None) for _ in range(WAIT_TIME_SAMPLES)) / WAIT_TIME_SAMPLES
+        user_class.open_loop_gap = mean_gap
+        user_class.wait_time = lambda user: self.next_wait(user)
+        user_class.tasks = [self.wrap(task) for task in user_class.tasks]
+        logging.info(f"{user_class.__name__}: open-loop {self.process} arrivals, mean gap {mean_gap:.2f}s")
+
+    def wrap(self, task):
+        @functools.wraps(task)
+        def start_in_background(user):
+            self.dispatch(user, task)
+        return start_in_background
+
+    def next_wait(self, user):
+        """wait_time replacement: sleep until the next intended start."""
+        gap = user.open_loop_gap
+        if self.process == "poisson":
+            gap = random.expovariate(1 / gap) if gap > 0 else 0
+        user.open_loop_next = user.open_loop_intended + gap
+        return max(0.0, user.open_loop_next - time.monotonic())
+
+    def dispatch(self, user, task):
+        now = time.monotonic()
+        intended = getattr(user, "open_loop_next", None) or now
+        user.open_loop_intended = intended
+        lag = max(0.0, now - intended)
+        self.record("schedule lag", lag * 1000)
+
+        if len(self.tasks) >= self.max_outstanding:
+            self.record("dropped (max outstanding)", 0)
+            return
+        self.tasks.spawn(self.run_task, user, task, lag)
+
+    def run_task(self, user, task, lag):
+        current = gevent.getcurrent()
+        self.task_lags[current] = lag
+        try:
+            task(user)
+        except gevent.GreenletExit:
+            raise
+        except Exception as e:
+            logging.error(f"{type(user).__name__} open-loop task {task.__name__} failed: {e!r}")
+            self.environment.events.user_error.fire(user_instance=user, exception=e, tb=e.__traceback__)
+        finally:
+            self.task_lags.pop(current, None)
+
+    def on_request(self, request_type, name, response_time, response_length, exception=None, context=None, **kwargs):
+        """Add the "[from intended]" row for HTTP requests made by open-loop tasks."""
+        if request_type not in HTTP_METHODS or (context or {}).get("open_loop"):
+            return
+        lag = self.lag_of(gevent.getcurrent())
+        if lag is None:
+            return
+        self.environment.events.request.fire(
+            request_type=request_type,
+            name=f"{name} [from intended]",
+            response_time=response_time + lag * 1000,
+            response_length=response_length,
+            exception=exception,
+            context={"open_loop": True},
+        )
+
+    def lag_of(self, greenlet):
+        """Schedule lag of the open-loop task running in greenlet, or in a greenlet that spawned it."""
+        while greenlet is not None:
+            lag = self.task_lags.get(greenlet)
+            if lag is not None:
+                return lag
+            parent = getattr(greenlet, "spawning_greenlet", None)
+            greenlet = parent() if parent is not None else None
+        return None
+
+    def on_test_stop(self, **kwargs):
+        self.tasks.kill(block=False)
+
+    def record(self, name, value):
+        self.environment.events.request.fire(
+            request_type="OPEN",
+            name=name,
+            response_time=value,
+            response_length=0,
+            exception=None,
+            context={"open_loop": True},
+        )
@@ -0,0 +1,113 @@
+"""
+Pre-provision load test accounts so runs don't start by measuring bcrypt.
+
+Registers (or, if the name is taken, logs in) N users in parallel and writes
+their usernames, user IDs, JWTs and session cookies to a fixture file (see
+user_fixture.py). Point the locustfile at it with --user-fixture and the
+personas start without registering or logging in.
+
+The JWTs expire 15 minutes after each user was provisioned, so in a large
+fixture most are stale by the time the run starts. The Rails session lasts
+24 hours: TokenManager trades a user's session cookie for a fresh JWT at
+/auth/refresh, which is cheap, instead of a bcrypt login. Run the load test
+within 24 hours of provisioning.
+
+Usernames use their own prefix so they never collide with the user_N names
+the personas register during the run. The password equals the username, as
+it does for the personas.
+
+Usage:
+    python provision_users.py --host http://localhost:3000 --count 100000 \
+        --concurrency 200 --output users.fixture
+"""
+
+import argparse
+import json
+import sys
+import time
+
+import gevent
+from gevent.pool import Pool
+from geventhttpclient import HTTPClient
+from geventhttpclient.url import URL
+
+from token_manager import cookie_header
+from user_fixture import write_user_fixture
+
+
+JSON_HEADERS = {"Content-Type": "application/json", "Accept": "application/json"}
+
+
+def provision_user(client, username):
+    """
+    Register a user, falling back to login if it already exists.
+
+    Returns:
+        tuple: (username, user_id, auth_token, session_cookie), or None if
+            both calls failed
+    """
+    body = json.dumps({"username": username, "password": username})
+    for path in ("/auth/register", "/auth/login"):
+        response = client.post(path, body=body, headers=JSON_HEADERS)
+        payload = response.read()
+        if response.status_code in (200, 201):
+            data = json.loads(payload)
+            return (
+                username, str(data.get("user", {}).get("id")), data.get("token"),
+                cookie_header(response.get("Set-Cookie")),
+            )
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", required=True, help="backend base URL")
+    parser.add_argument("--count", type=int, required=True, help="number of users to provision")
+    parser.add_argument("--concurrency", type=int, default=100, help="parallel requests in flight")
+    parser.add_argument("--prefix", default="provisioned_user_", help="username prefix")
+    parser.add_argument("--output", default="users.fixture", help="fixture file to write")
+    args = parser.parse_args()
+
+    client = HTTPClient.from_url(
+        URL(args.host),
+        concurrency=args.concurrency,
+        connection_timeout=30,
+        network_timeout=120,
+    )
+    pool = Pool(args.concurrency)
+    users = []
+    failures = 0
+    started = time.perf_counter()
+
+    def run(index):
+        nonlocal failures
+        try:
+            user = provision_user(client, f"{args.prefix}{index}")
+        except Exception as e:
+            print(f"{args.prefix}{index}: {e}", file=sys.stderr)
+            user = None
+        if user is None:
+            failures += 1
+        else:
+            users.append(user)
+
+    def report_progress():
+        while True:
+            gevent.sleep(5)
+            print(f"{len(users)} provisioned, {failures} failed")
+
+    reporter = gevent.spawn(report_progress)
+    for index in range(args.count):
+        pool.spawn(run, index)
+    pool.join()
+    reporter.kill()
+    client.close()
+
+    write_user_fixture(args.output, users)
+    elapsed = time.perf_counter() - started
+    print(f"Wrote {len(users)} users to {args.output} in {elapsed:.1f}s ({failures} failed)")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,282 @@
+"""
+Compare saved Locust HTML reports and flag regressions.
+
+Locust embeds the run's statistics as JSON (window.templateArgs) near the end
+of the HTML report. This tool extracts that JSON without decoding the rest of
+the page, normalizes it per endpoint ("METHOD name", plus "Aggregated"), and
+diffs every report against a baseline:
+
+    python report_diff.py "base_application/single instance.html" base_application/verticalscale.html
+    python report_diff.py base_application/ --baseline "base_application/single instance.html"
+
+Directories are expanded to the *.html files in them, so a history of runs
+can be compared in one call. For each run the tool prints RPS, p50/p95/p99
+and failure rate per endpoint with their change from the baseline, marks
+regressions beyond the thresholds with "!", and ends with a one-line summary
+per run. It exits with status 1 if any run regressed, for use in CI.
+
+A regression is, per endpoint with at least --min-requests requests in both
+runs:
+    - RPS dropping by more than --max-rps-drop percent
+    - a percentile rising by more than --max-latency-increase percent
+    - the failure rate rising by more than --max-failure-increase points
+"""
+
+import argparse
+import json
+import mmap
+import os
+import sys
+
+
+TEMPLATE_MARKER = b"window.templateArgs = "
+PERCENTILES = ("0.5", "0.95", "0.99")
+AGGREGATED = "Aggregated"
+
+
+class EndpointStats:
+    """Normalized statistics of one stats row."""
+
+    def __init__(self, requests, failures, rps, avg_ms, percentiles):
+        self.requests = requests
+        self.failures = failures
+        self.rps = rps
+        self.avg_ms = avg_ms
+        self.percentiles = percentiles
+
+    @property
+    def failure_rate(self):
+        return self.failures / self.requests if self.requests else 0.0
+
+    def to_dict(self):
+        return {
+            "requests": self.requests,
+            "failures": self.failures,
+            "rps": self.rps,
+            "failure_rate": self.failure_rate,
+            "avg_ms": self.avg_ms,
+            "percentiles": self.percentiles,
+        }
+
+
+class Run:
+    """One saved report: run metadata plus EndpointStats keyed by "METHOD name"."""
+
+    def __init__(self, path, host, start_time, end_time, duration, endpoints):
+        self.path = path
+        self.name = os.path.splitext(os.path.basename(path))[0]
+        self.host = host
+        self.start_time = start_time
+        self.end_time = end_time
+        self.duration = duration
+        self.endpoints = endpoints
+
+    def to_dict(self):
+        return {
+            "path": self.path,
+            "host": self.host,
+            "start_time": self.start_time,
+            "end_time": self.end_time,
+            "duration": self.duration,
+            "endpoints": {key: stats.to_dict() for key, stats in self.endpoints.items()},
+        }
+
+
+def extract_template_args(path):
+    """
+    Read the statistics JSON embedded in a Locust HTML report.
+
+    The file is memory-mapped and searched from the end, where Locust puts the
+    JSON, so only the JSON itself is decoded.
+
+    Returns:
+        dict: The report's templateArgs
+    """
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        marker = data.rfind(TEMPLATE_MARKER)
+        if marker < 0:
+            raise ValueError(f"{path}: no embedded statistics found (not a Locust 2.x HTML report?)")
+        end = data.find(b"</script>", marker)
+        raw = data[marker + len(TEMPLATE_MARKER):end if end >= 0 else len(data)]
+    args, _ = json.JSONDecoder().raw_decode(raw.decode("utf-8").strip())
+    return args
+
+
+def endpoint_key(method, name):
+    return f"{method} {name}" if method else name
+
+
+def read_report(path):
+    """
+    Extract and normalize one HTML report.
+
+    Returns:
+        Run: The report's metadata and per-endpoint statistics
+    """
+    args = extract_template_args(path)
+    percentiles = {
+        endpoint_key(row["method"], row["name"]): row
+        for row in args.get("response_time_statistics", [])
+    }
+    endpoints = {}
+    for row in args.get("requests_statistics", []):
+        key = endpoint_key(row["method"], row["name"])
+        distribution = percentiles.get(key, {})
+        endpoints[key] = EndpointStats(
+            requests=row["num_requests"],
+            failures=row["num_failures"],
+            rps=row.get("total_rps", 0.0),
+            avg_ms=row.get("avg_response_time", 0.0),
+            percentiles={
+                p: distribution.get(p, row.get(f"response_time_percentile_{p}"))
+                for p in PERCENTILES
+            },
+        )
+    return Run(
+        path,
+        host=args.get("host"),
+        start_time=args.get("start_time"),
+        end_time=args.get("end_time"),
+        duration=args.get("duration"),
+        endpoints=endpoints,
+    )
+
+
+def expand_paths(paths):
+    """Report paths, with directories replaced by the *.html files in them."""
+    expanded = []
+    for path in paths:
+        if os.path.isdir(path):
+            expanded += sorted(
+                os.path.join(path, name) for name in os.listdir(path) if name.lower().endswith(".html")
+            )
+        else:
+            expanded.append(path)
+    return expanded
+
+
+def percent_change(old, new):
+    if old is None or new is None:
+        return None
+    if old == 0:
+        return 0.0 if new == 0 else float("inf")
+    return (new - old) / old * 100
+
+
+def compare(base, run, thresholds):
+    """
+    Diff one run against the baseline.
+
+    Args:
+        base (Run): Baseline run
+        run (Run): Run to compare
+        thresholds (argparse.Namespace): max_rps_drop, max_latency_increase,
+            max_failure_increase and min_requests
+
+    Returns:
+        list: (endpoint key, base EndpointStats or None, EndpointStats or None,
+            list of regression descriptions) per endpoint, Aggregated last
+    """
+    keys = sorted(set(base.endpoints) | set(run.endpoints), key=lambda key: (key == AGGREGATED, key))
+    rows = []
+    for key in keys:
+        old, new = base.endpoints.get(key), run.endpoints.get(key)
+        regressions = []
+        if old and new and min(old.requests, new.requests) >= thresholds.min_requests:
+            rps_change = percent_change(old.rps, new.rps)
+            if rps_change is not None and -rps_change > thresholds.max_rps_drop:
+                regressions.append(f"rps {rps_change:+.0f}%")
+            for p in PERCENTILES:
+                change = percent_change(old.percentiles[p], new.percentiles[p])
+                if change is not None and change > thresholds.max_latency_increase:
+                    regressions.append(f"p{float(p) * 100:g} {change:+.0f}%")
+            failure_change = (new.failure_rate - old.failure_rate) * 100
+            if failure_change > thresholds.max_failure_increase:
+                regressions.append(f"failures {failure_change:+.1f}pt")
+        rows.append((key, old, new, regressions))
+    return rows
+
+
+def format_change(old, new, unit="", digits=0):
+    change = percent_change(old, new)
+    if change is None:
+        return f"{'-':>22}"
+    value = f"{new:.{digits}f}{unit}"
+    if change == float("inf"):
+        return f"{value:>12} {'new':>9}"
+    return f"{value:>12} {change:>+8.0f}%"
+
+
+def print_comparison(base, run, rows, only_regressions):
+    print(f"\n=== {run.name} vs {base.name} ({run.duration or '?'}, {run.host or '?'})")
+    header = f"{'endpoint':<44} {'rps':>22} " + " ".join(
+        f"{'p' + format(float(p) * 100, 'g'):>22}" for p in PERCENTILES
+    ) + f" {'failures':>16}"
+    print(header)
+    for key, old, new, regressions in rows:
+        if only_regressions and not regressions:
+            continue
+        if old is None or new is None:
+            print(f"  {key:<42} only in {base.name if new is None else run.name}")
+            continue
+        flag = "!" if regressions else " "
+        cells = [format_change(old.rps, new.rps, digits=1)]
+        cells += [format_change(old.percentiles[p], new.percentiles[p], "ms") for p in PERCENTILES]
+        failure_change = (new.failure_rate - old.failure_rate) * 100
+        cells.append(f"{new.failure_rate:>8.1%} {failure_change:>+6.1f}pt")
+        print(f"{flag} {key[:42]:<42} " + " ".join(cells))
+        if regressions:
+            print(f"    regressed: {', '.join(regressions)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("reports", nargs="+", help="HTML reports, or directories of them")
+    parser.add_argument("--baseline", help="report to compare against (default: the first one)")
+    parser.add_argument("--max-rps-drop", type=float, default=10, help="allowed RPS drop, percent")
+    parser.add_argument("--max-latency-increase", type=float, default=20, help="allowed percentile increase, percent")
+    parser.add_argument("--max-failure-increase", type=float, default=1, help="allowed failure-rate increase, points")
+    parser.add_argument("--min-requests", type=int, default=100, help="ignore endpoints with fewer requests")
+    parser.add_argument("--only-regressions", action="store_true", help="print regressed endpoints only")
+    parser.add_argument("--json", action="store_true", help="print the normalized reports as JSON and exit")
+    args = parser.parse_args()
+
+    paths = expand_paths(args.reports)
+    if args.baseline:
+        paths = [args.baseline] + [path for path in paths if os.path.abspath(path) != os.path.abspath(args.baseline)]
+    try:
+        runs = [read_report(path) for path in paths]
+    except (OSError, ValueError) as e:
+        print(e, file=sys.stderr)
+        return 2
+
+    if args.json:
+        json.dump([run.to_dict() for run in runs], sys.stdout, indent=1)
+        print()
+        return 0
+    if len(runs) < 2:
+        print("need a baseline and at least one report to compare", file=sys.stderr)
+        return 2
+
+    base = runs[0]
+    summary = []
+    for run in runs[1:]:
+        rows = compare(base, run, args)
+        print_comparison(base, run, rows, args.only_regressions)
+        summary.append((run, sum(1 for row in rows if row[3])))
+
+    print(f"\n{'run':<32} {'rps':>9} {'p95':>9} {'failures':>9} {'regressed endpoints':>20}")
+    for run, regressed in [(base, None)] + summary:
+        total = run.endpoints.get(AGGREGATED)
+        if total is None:
+            print(f"{run.name[:32]:<32} {'no aggregated row':>29}")
+            continue
+        print(
+            f"{run.name[:32]:<32} {total.rps:>9.1f} {total.percentiles['0.95'] or 0:>7.0f}ms "
+            f"{total.failure_rate:>9.1%} {'baseline' if regressed is None else regressed:>20}"
+        )
+    return 1 if any(regressed for _, regressed in summary) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,422 @@
+"""
+Seed the database with a large synthetic history before a load test.
+
+Runs normally start from a nearly empty database, so the queries behind
+/api/messages/updates (all of a user's conversation IDs, then messages by
+created_at) and /conversations/:id/messages never see production-sized
+tables. This tool generates users, conversations, messages and expert
+assignments with realistic skew and loads them in one of two ways:
+
+    # SQL file of batched multi-row INSERTs for the dev database (fast; millions of rows)
+    python seed_dataset.py --users 200000 --sql seed.sql.gz --manifest dataset.json
+    gunzip -c seed.sql.gz | mysql -u root help_desk_backend_development
+
+    # through the API (any environment; slower, and every row is created "now")
+    python seed_dataset.py --users 2000 --api http://localhost:3000 --manifest dataset.json
+
+Then start Locust with --dataset-manifest dataset.json: every process loads
+the seeded users (with tokens) and conversation IDs into its UserStore.
+
+Distributions (all configurable):
+- conversations per user: bounded Zipf, k - 1 for k in 1..max; with the
+  defaults 61% of users have none, the mean is about 3 and a few users
+  have hundreds
+- messages per conversation: bounded Zipf in 1..max, mean about 10 with
+  the defaults
+- message length: log-normal characters (median e^mu)
+- conversation status: waiting/active/resolved mix; active and resolved
+  conversations get an expert (the first --expert-fraction of the users)
+  and an expert assignment, and their messages alternate between initiator
+  and expert
+- timestamps: conversations start uniformly over --history-days, and
+  messages follow at exponential gaps, never later than now
+
+SQL mode writes explicit IDs from --id-start, so pick a start above the IDs
+already in the database; MySQL continues AUTO_INCREMENT after them. Its
+users all share one bcrypt digest for the password "seeded-password"
+(hashing millions of passwords would take hours), and their manifest tokens
+are signed locally with --jwt-secret and live for --token-ttl seconds. The
+manifest records the shared password, so once a token expires TokenManager
+logs the user in with it. A wrong --jwt-secret makes every seeded user's
+requests fail with 401 until the tokens expire.
+
+API mode registers users with their username as password, like the personas
+do (see provision_users.py), and keeps each user's session cookie in the
+manifest: its JWTs expire after 15 minutes, the session after 24 hours.
+"""
+
+import argparse
+import base64
+import gzip
+import hashlib
+import hmac
+import json
+import math
+import random
+import sys
+import time
+from bisect import bisect_left
+from itertools import accumulate
+
+from gevent.pool import Pool
+from geventhttpclient import HTTPClient
+from geventhttpclient.url import URL
+
+from provision_users import provision_user
+from user_fixture import id_ranges, write_manifest
+
+
+SEEDED_PASSWORD = "seeded-password"
+# bcrypt (cost 10) of SEEDED_PASSWORD, shared by every user seeded through SQL
+SEEDED_PASSWORD_DIGEST = "$2b$10$/EAUE.VdjpD6.De6Lgcv1.l3yDQkoCm.Muk0OjMfk8jX3fWMQ.ktq"
+STATUSES = ("waiting", "active", "resolved")
+TOPICS = ("Rails", "Ruby", "AWS", "Docker", "Database", "Redis", "Puma", "MySQL")
+WORDS = (
+    "the request returns a list of messages for each conversation and the expert replies "
+    "with steps to reproduce the error after deploying the new version of the service "
+).split()
+JSON_HEADERS = {"Content-Type": "application/json", "Accept": "application/json"}
+
+TABLE_COLUMNS = {
+    "users": ("id", "username", "password_digest", "last_active_at", "created_at", "updated_at"),
+    "expert_profiles": ("id", "user_id", "bio", "knowledge_base_links", "created_at", "updated_at"),
+    "conversations": (
+        "id", "title", "status", "initiator_id", "assigned_expert_id", "last_message_at", "created_at", "updated_at",
+    ),
+    "messages": ("id", "conversation_id", "sender_id", "sender_role", "content", "is_read", "created_at", "updated_at"),
+    "expert_assignments": (
+        "id", "conversation_id", "expert_id", "status", "assigned_at", "resolved_at", "created_at", "updated_at",
+    ),
+}
+
+
+class BoundedZipf:
+    """Samples k in 1..n with probability proportional to k^-s."""
+
+    def __init__(self, s, n):
+        self.cumulative = list(accumulate(k ** -s for k in range(1, n + 1)))
+
+    def sample(self, rng):
+        return bisect_left(self.cumulative, rng.random() * self.cumulative[-1]) + 1
+
+
+class DatasetGenerator:
+    """
+    Generates the rows of a synthetic dataset.
+
+    Args:
+        args (argparse.Namespace): Command line settings
+        now (float): Epoch seconds of the newest possible timestamp
+    """
+
+    def __init__(self, args, now):
+        self.args = args
+        self.now = now
+        self.rng = random.Random(args.seed)
+        self.conversation_counts = BoundedZipf(args.conversations_zipf, args.max_conversations_per_user + 1)
+        self.message_counts = BoundedZipf(args.messages_zipf, args.max_messages_per_conversation)
+        self.status_weights = list(accumulate(args.status_mix))
+        self.filler = " ".join(self.rng.choice(WORDS) for _ in range(20000))
+        self.experts = max(1, math.ceil(args.users * args.expert_fraction))
+
+    def message_content(self):
+        length = int(self.rng.lognormvariate(self.args.message_length_mu, self.args.message_length_sigma))
+        length = max(1, min(length, self.args.max_message_length))
+        start = self.rng.randrange(len(self.filler) - length) if length < len(self.filler) else 0
+        return self.filler[start:start + length].strip() or "ok"
+
+    def status(self):
+        return STATUSES[bisect_left(self.status_weights, self.rng.random() * self.status_weights[-1])]
+
+    def conversations(self):
+        """
+        Conversations in initiator order.
+
+        Yields:
+            tuple: (initiator index, status, expert index or None, created_at,
+                message count)
+        """
+        history = self.args.history_days * 86400
+        for initiator in range(self.args.users):
+            for _ in range(self.conversation_counts.sample(self.rng) - 1):
+                status = self.status()
+                expert = None
+                if status != "waiting":
+                    expert = self.rng.randrange(self.experts)
+                    if expert == initiator:
+                        expert = (expert + 1) % self.args.users
+                created_at = self.now - self.rng.random() * history
+                yield initiator, status, expert, created_at, self.message_counts.sample(self.rng)
+
+    def message_times(self, created_at, count):
+        """Message timestamps after created_at at exponential gaps, capped at now."""
+        gap = self.args.message_gap_minutes * 60
+        at = created_at
+        times = []
+        for _ in range(count):
+            at = min(self.now, at + self.rng.expovariate(1 / gap))
+            times.append(at)
+        return times
+
+
+def sign_token(user_id, secret, expires_at):
+    """An HS256 JWT in the backend's format (see JwtService)."""
+    def encode(part):
+        return base64.urlsafe_b64encode(json.dumps(part, separators=(",", ":")).encode()).rstrip(b"=")
+
+    signing_input = encode({"alg": "HS256", "typ": "JWT"}) + b"." + encode({"user_id": user_id, "exp": int(expires_at)})
+    signature = base64.urlsafe_b64encode(hmac.new(secret.encode(), signing_input, hashlib.sha256).digest()).rstrip(b"=")
+    return (signing_input + b"." + signature).decode()
+
+
+def sql_timestamp(at):
+    return time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(at)) + f".{int(at % 1 * 1000000):06d}"
+
+
+def sql_value(value):
+    if type(value) is str:
+        return "'" + value.replace("\\", "\\\\").replace("'", "''") + "'"
+    if value is None:
+        return "NULL"
+    if type(value) is bool:
+        return "1" if value else "0"
+    return str(value)
+
+
+class SqlWriter:
+    """
+    Writes rows as batched multi-row INSERTs.
+
+    Args:
+        path (str): SQL file; gzip-compressed if it ends in .gz
+        batch_size (int): Rows per INSERT statement
+    """
+
+    def __init__(self, path, batch_size=1000):
+        if path.endswith(".gz"):
+            # level 1: most of the time at the default level goes to compression
+            self.file = gzip.open(path, "wt", compresslevel=1, encoding="utf-8")
+        else:
+            self.file = open(path, "w", encoding="utf-8")
+        self.batch_size = batch_size
+        self.batches = {table: [] for table in TABLE_COLUMNS}
+        self.counts = {table: 0 for table in TABLE_COLUMNS}
+        self.file.write("SET foreign_key_checks = 0;\nSET unique_checks = 0;\nSET autocommit = 0;\n")
+
+    def add(self, table, row):
+        batch = self.batches[table]
+        batch.append("(" + ",".join(sql_value(value) for value in row) + ")")
+        self.counts[table] += 1
+        if len(batch) >= self.batch_size:
+            self.flush(table)
+
+    def flush(self, table):
+        batch = self.batches[table]
+        if batch:
+            self.file.write(f"INSERT INTO {table} ({','.join(TABLE_COLUMNS[table])}) VALUES\n")
+            self.file.write(",\n".join(batch))
+            self.file.write(";\n")
+            batch.clear()
+
+    def close(self):
+        for table in TABLE_COLUMNS:
+            self.flush(table)
+        self.file.write("COMMIT;\nSET unique_checks = 1;\nSET foreign_key_checks = 1;\n")
+        self.file.close()
+
+
+def seed_sql(args, generator):
+    """
+    Write the dataset as SQL.
+
+    Returns:
+        tuple: (users as (username, user_id, auth_token, session_cookie)
+            tuples, conversation ID ranges, row counts)
+    """
+    writer = SqlWriter(args.sql, args.batch_size)
+    now = generator.now
+    expires_at = now + args.token_ttl
+    user_ids = range(args.id_start, args.id_start + args.users)
+    users = []
+    for index, user_id in enumerate(user_ids):
+        username = f"{args.prefix}{index}"
+        created = sql_timestamp(now - args.history_days * 86400)
+        writer.add("users", (user_id, username, SEEDED_PASSWORD_DIGEST, sql_timestamp(now), created, created))
+        writer.add("expert_profiles", (user_id, user_id, "", "[]", created, created))
+        users.append((username, str(user_id), sign_token(user_id, args.jwt_secret, expires_at), None))
+
+    conversation_id = message_id = assignment_id = args.id_start
+    for initiator, status, expert, created_at, message_count in generator.conversations():
+        times = generator.message_times(created_at, message_count)
+        last_at = times[-1]
+        initiator_id = user_ids[initiator]
+        expert_id = user_ids[expert] if expert is not None else None
+        title = f"Question about {generator.rng.choice(TOPICS)} #{conversation_id}"
+        writer.add("conversations", (
+            conversation_id, title, status, initiator_id, expert_id,
+            sql_timestamp(last_at), sql_timestamp(created_at), sql_timestamp(last_at),
+        ))
+        for position, at in enumerate(times):
+            by_expert = expert_id is not None and position > 0 and generator.rng.random() < 0.5
+            is_read = position < len(times) - 1 or generator.rng.random() < args.read_fraction
+            stamp = sql_timestamp(at)
+            writer.add("messages", (
+                message_id, conversation_id, expert_id if by_expert else initiator_id,
+                "expert" if by_expert else "initiator", generator.message_content(), is_read, stamp, stamp,
+            ))
+            message_id += 1
+        if expert_id is not None:
+            assigned = sql_timestamp(times[0])
+            resolved = sql_timestamp(last_at) if status == "resolved" else None
+            writer.add("expert_assignments", (
+                assignment_id, conversation_id, expert_id, "resolved" if resolved else "active",
+                assigned, resolved, assigned, resolved or assigned,
+            ))
+            assignment_id += 1
+        conversation_id += 1
+        if (conversation_id - args.id_start) % 100000 == 0:
+            print(f"{conversation_id - args.id_start} conversations, {message_id - args.id_start} messages")
+
+    writer.close()
+    conversations = conversation_id - args.id_start
+    ranges = [[args.id_start, conversation_id - 1]] if conversations else []
+    return users, ranges, writer.counts
+
+
+def seed_api(args, generator):
+    """
+    Create the dataset through the backend API.
+
+    Resolved conversations can't be created through the API, so they stay
+    active. Every row is created now.
+
+    Returns:
+        tuple: (users as (username, user_id, auth_token, session_cookie)
+            tuples, conversation ID ranges, row counts)
+    """
+    client = HTTPClient.from_url(URL(args.api), concurrency=args.concurrency, connection_timeout=30, network_timeout=120)
+    pool = Pool(args.concurrency)
+    counts = {table: 0 for table in TABLE_COLUMNS}
+    failures = 0
+
+    def call(path, body, token=None):
+        nonlocal failures
+        headers = dict(JSON_HEADERS)
+        if token:
+            headers["Authorization"] = f"Bearer {token}"
+        try:
+            response = client.post(path, body=json.dumps(body), headers=headers)
+            payload = response.read()
+        except Exception as e:
+            print(f"{path}: {e}", file=sys.stderr)
+            failures += 1
+            return None
+        if response.status_code not in (200, 201):
+            failures += 1
+            return None
+        return json.loads(payload) if payload.strip() else {}
+
+    users = [None] * args.users
+
+    def register(index):
+        nonlocal failures
+        username = f"{args.prefix}{index}"
+        try:
+            users[index] = provision_user(client, username)
+        except Exception as e:
+            print(f"{username}: {e}", file=sys.stderr)
+        if users[index] is None:
+            failures += 1
+        else:
+            counts["users"] += 1
+
+    for index in range(args.users):
+        pool.spawn(register, index)
+    pool.join()
+    counts["expert_profiles"] = counts["users"]  # /auth/register creates one per user
+    print(f"{counts['users']} users registered, {failures} failed")
+
+    conversation_ids = []
+
+    def create(initiator, expert, message_count):
+        initiator_user, expert_user = users[initiator], users[expert] if expert is not None else None
+        if initiator_user is None:
+            return
+        data = call("/conversations", {"title": f"Question about {generator.rng.choice(TOPICS)}"}, initiator_user[2])
+        if not data:
+            return
+        conversation_id = data["id"]
+        conversation_ids.append(int(conversation_id))
+        counts["conversations"] += 1
+        if expert_user is not None:
+            if call(f"/expert/conversations/{conversation_id}/claim", {}, expert_user[2]) is None:
+                expert_user = None
+            else:
+                counts["expert_assignments"] += 1
+        for position in range(message_count):
+            by_expert = expert_user is not None and position > 0 and generator.rng.random() < 0.5
+            sender = expert_user if by_expert else initiator_user
+            body = {"conversationId": conversation_id, "content": generator.message_content()}
+            if call("/messages", body, sender[2]) is not None:
+                counts["messages"] += 1
+
+    for initiator, _, expert, _, message_count in generator.conversations():
+        pool.spawn(create, initiator, expert, message_count)
+    pool.join()
+    client.close()
+    print(f"{counts['conversations']} conversations, {counts['messages']} messages, {failures} failed calls")
+    return [user for user in users if user is not None], id_ranges(conversation_ids), counts
+
+
+def parse_status_mix(value):
+    weights = [float(part) for part in value.split(",")]
+    if len(weights) != len(STATUSES) or any(weight < 0 for weight in weights) or not sum(weights):
+        raise argparse.ArgumentTypeError("expected three non-negative weights: waiting,active,resolved")
+    return weights
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--sql", help="write batched INSERTs to this file (.gz to compress)")
+    target.add_argument("--api", help="create the rows through the backend at this base URL")
+    parser.add_argument("--manifest", required=True, help="dataset manifest to write (users go to <name>.users)")
+    parser.add_argument("--users", type=int, required=True, help="number of users")
+    parser.add_argument("--expert-fraction", type=float, default=0.05, help="share of users that act as experts")
+    parser.add_argument("--conversations-zipf", type=float, default=2.0, help="Zipf exponent of conversations per user")
+    parser.add_argument("--max-conversations-per-user", type=int, default=500)
+    parser.add_argument("--messages-zipf", type=float, default=1.8, help="Zipf exponent of messages per conversation")
+    parser.add_argument("--max-messages-per-conversation", type=int, default=1000)
+    parser.add_argument("--message-length-mu", type=float, default=4.5, help="log-normal mu of message length (chars)")
+    parser.add_argument("--message-length-sigma", type=float, default=0.8, help="log-normal sigma of message length")
+    parser.add_argument("--max-message-length", type=int, default=4000)
+    parser.add_argument("--message-gap-minutes", type=float, default=30, help="mean gap between messages")
+    parser.add_argument("--status-mix", type=parse_status_mix, default=[0.2, 0.3, 0.5],
+                        help="waiting,active,resolved weights of conversation status")
+    parser.add_argument("--read-fraction", type=float, default=0.8, help="chance the newest message is read")
+    parser.add_argument("--history-days", type=float, default=90, help="conversations start within this many days")
+    parser.add_argument("--seed", type=int, default=1, help="random seed")
+    parser.add_argument("--prefix", default="seeded_user_", help="username prefix")
+    parser.add_argument("--id-start", type=int, default=1000000, help="first ID of every table (SQL mode)")
+    parser.add_argument("--batch-size", type=int, default=1000, help="rows per INSERT (SQL mode)")
+    parser.add_argument("--jwt-secret", default="development_secret_key",
+                        help="backend secret_key_base, to sign manifest tokens (SQL mode)")
+    parser.add_argument("--token-ttl", type=float, default=86400, help="lifetime of signed tokens, seconds (SQL mode)")
+    parser.add_argument("--concurrency", type=int, default=100, help="parallel requests in flight (API mode)")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    generator = DatasetGenerator(args, time.time())
+    users, conversation_ranges, counts = seed_sql(args, generator) if args.sql else seed_api(args, generator)
+    parameters = {key: value for key, value in vars(args).items() if key not in ("jwt_secret", "manifest")}
+    password = SEEDED_PASSWORD if args.sql else None
+    write_manifest(args.manifest, users, conversation_ranges, counts, parameters, password=password)
+
+    elapsed = time.perf_counter() - started
+    print(", ".join(f"{count} {table}" for table, count in counts.items()) + f" in {elapsed:.1f}s")
+    print(f"Wrote {args.manifest} ({len(users)} users)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,99 @@
+"""
+Selection distributions for picking stored users and conversations.
+
+Real traffic clusters on a few heavy users and hot conversations, which is
+what exercises row lock contention on messages/conversations and any
+caching layer. A selection picks an age rank in [0, n), 0 being the oldest
+item, in O(1):
+
+- uniform: every item equally likely (Locust's usual random.choice)
+- zipf[:s]: rank k with probability roughly proportional to (k + 1)^-s, so
+  the oldest items are the hot ones and stay hot as the store grows
+  (default s = 1.0)
+- recency[:s]: the same skew counted from the newest item, so new users
+  and conversations get the attention (default s = 1.0)
+
+Zipf ranks come from the inverse CDF of the continuous power law on
+[1, n + 1), an O(1) approximation of the discrete distribution that needs
+no table and works for any n.
+
+Specs are parsed with parse_selection("zipf:1.2").
+"""
+
+import random
+
+
+class Selection:
+    """Picks an age rank in [0, n); 0 is the oldest item."""
+    name = None
+
+    def rank(self, n):
+        raise NotImplementedError
+
+    @property
+    def description(self):
+        return self.name
+
+
+class Uniform(Selection):
+    name = "uniform"
+
+    def rank(self, n):
+        return random.randrange(n)
+
+
+class Zipf(Selection):
+    """
+    Power-law skew towards the oldest items.
+
+    Args:
+        s (float): Skew; 0 is uniform, 1 is classic Zipf, larger is hotter
+    """
+    name = "zipf"
+
+    def __init__(self, s=1.0):
+        if s < 0:
+            raise ValueError(f"{self.name} skew must be non-negative, got {s}")
+        self.s = s
+
+    def rank(self, n):
+        u = random.random()
+        if self.s == 1:
+            x = (n + 1) ** u
+        else:
+            exponent = 1 - self.s
+            x = (1 + u * ((n + 1) ** exponent - 1)) ** (1 / exponent)
+        return min(int(x) - 1, n - 1)
+
+    @property
+    def description(self):
+        return f"{self.name}:{self.s:g}"
+
+
+class Recency(Zipf):
+    """Power-law skew towards the newest items."""
+    name = "recency"
+
+    def rank(self, n):
+        return n - 1 - super().rank(n)
+
+
+SELECTIONS = {selection.name: selection for selection in (Uniform, Zipf, Recency)}
+
+
+def parse_selection(spec):
+    """
+    Build a selection from "uniform", "zipf[:s]" or "recency[:s]".
+
+    Raises:
+        ValueError: Unknown name or bad skew
+    """
+    name, _, skew = spec.strip().lower().partition(":")
+    selection = SELECTIONS.get(name)
+    if selection is None:
+        raise ValueError(f"unknown selection {spec!r}; expected one of {', '.join(SELECTIONS)}")
+    if selection is Uniform:
+        if skew:
+            raise ValueError("uniform selection takes no skew")
+        return Uniform()
+    return selection(float(skew)) if skew else selection()
@@ -0,0 +1,135 @@
+"""
+Shared machinery for reports broken down by load-shape step.
+
+A StepReporter collects per-endpoint data for the step of the load shape
+that is currently running and writes one set of rows per step when the shape
+moves on. In distributed runs, workers attach what they collected to the
+regular stats report and the master merges it. A request is therefore
+assigned to the step that is current when its report reaches the master, up
+to one report interval (3s) late.
+
+Subclasses say what is collected (on_request, take, merge) and how a finished
+step is reported (step_rows).
+"""
+
+import csv
+import json
+import time
+
+import gevent
+
+
+class StepReporter:
+    """
+    Base class for per-step reports.
+
+    Args:
+        environment: Locust environment
+        current_step: Callable returning (step index, step label) for the
+            running step, or None before the shape starts
+        output_prefix (str): Reports go to <prefix><FILE_SUFFIX>.csv and .json
+        is_worker (bool): Ship data to the master instead of reporting
+    """
+    REPORT_KEY = None
+    FILE_SUFFIX = None
+
+    def __init__(self, environment, current_step, output_prefix, is_worker=False):
+        self.environment = environment
+        self.current_step = current_step
+        self.output_prefix = output_prefix
+        self.is_worker = is_worker
+        self.step = None
+        self.step_started = None
+        self.reports = []
+        self.csv_started = False
+        self.greenlet = None
+
+        events = environment.events
+        events.request.add_listener(self.on_request)
+        if is_worker:
+            events.report_to_master.add_listener(self.on_report_to_master)
+        else:
+            events.worker_report.add_listener(self.on_worker_report)
+            events.test_start.add_listener(self.on_test_start)
+            events.test_stop.add_listener(self.on_test_stop)
+
+    def on_request(self, **kwargs):
+        raise NotImplementedError
+
+    def take(self):
+        """Everything collected since the last call, as plain data, and reset."""
+        raise NotImplementedError
+
+    def merge(self, data):
+        """Add data returned by a worker's take()."""
+        raise NotImplementedError
+
+    def step_rows(self, duration):
+        """
+        Rows for the step that just ended, and reset.
+
+        Args:
+            duration (float): Length of the step in seconds
+
+        Returns:
+            list: One dict per endpoint
+        """
+        raise NotImplementedError
+
+    def on_report_to_master(self, client_id, data):
+        data[self.REPORT_KEY] = self.take()
+
+    def on_worker_report(self, client_id, data):
+        if self.REPORT_KEY in data:
+            self.merge(data[self.REPORT_KEY])
+
+    def on_test_start(self, **kwargs):
+        if self.greenlet is None:
+            self.greenlet = gevent.spawn(self.watch_steps)
+
+    def on_test_stop(self, **kwargs):
+        if self.greenlet is not None:
+            self.greenlet.kill(block=False)
+            self.greenlet = None
+        if self.step is not None:
+            self.finish_step()
+            self.step = None
+
+    def watch_steps(self):
+        """Close the current step's report whenever the shape moves to a new one."""
+        while True:
+            step = self.current_step()
+            if step != self.step:
+                if self.step is not None:
+                    self.finish_step()
+                else:
+                    # drop anything recorded before the shape started
+                    self.take()
+                self.step = step
+                self.step_started = time.time()
+            gevent.sleep(1)
+
+    def finish_step(self):
+        index, label = self.step
+        ended = time.time()
+        header = {
+            "step": index,
+            "label": label,
+            "start": round(self.step_started, 3),
+            "end": round(ended, 3),
+        }
+        rows = [{**header, **row} for row in self.step_rows(ended - self.step_started)]
+        self.reports.extend(rows)
+        self.write(rows)
+
+    def write(self, rows):
+        csv_path = f"{self.output_prefix}{self.FILE_SUFFIX}.csv"
+        if rows:
+            with open(csv_path, "a" if self.csv_started else "w", newline="") as f:
+                writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+                if not self.csv_started:
+                    writer.writeheader()
+                writer.writerows(rows)
+            self.csv_started = True
+        with open(f"{self.output_prefix}{self.FILE_SUFFIX}.json", "w") as f:
+            json.dump(self.reports, f, indent=1)
@@ -0,0 +1,193 @@
+"""
+Proactive JWT refresh for the shared users in the UserStore.
+
+The backend issues 15-minute JWTs, and personas reuse stored users for the
+whole run, so without refreshing every long soak turns into waves of 401s
+that look like backend failures. TokenManager decodes each token's `exp`
+locally, with no signature check, and refreshes the token shortly before it
+expires:
+
+- A token is refreshed `lead` seconds plus a random jitter of up to `jitter`
+  seconds before its expiry. The jitter is drawn once per token, so users
+  stored at the same time don't all refresh in the same second.
+- /auth/refresh authenticates with the Rails session cookie, not the JWT. The
+  cookie set at login/register is kept with the user in the UserStore and
+  replayed explicitly, because a shared user's session lives in whichever
+  persona's cookie jar logged it in.
+- Users without a session cookie (e.g. from a fixture written before
+  fixtures kept one, or seeded through SQL), or whose session is gone, log
+  in again instead, with their stored "password" (see seed_dataset.py) or
+  else their username.
+- Concurrent refreshes of the same user in this process are combined. The
+  first caller makes the request and the others wait for its result; the
+  wait shows up as TOKEN "refresh wait (coalesced)".
+- The new token is stored with UserStore.store_user, which updates the
+  shared user dict in place and, in distributed runs, sends it to the other
+  processes.
+
+Refresh traffic is reported as its own rows: POST "/auth/refresh" and POST
+"/auth/login [token refresh]".
+"""
+
+import base64
+import binascii
+import json
+import random
+import time
+from http.cookies import CookieError, SimpleCookie
+
+from gevent.event import AsyncResult
+
+
+def token_expiry(token):
+    """
+    Expiry of a JWT, read from its payload without verifying the signature.
+
+    Returns:
+        float: `exp` as epoch seconds, or None if the token has none or is malformed
+    """
+    try:
+        payload = token.split(".")[1]
+        payload += "=" * (-len(payload) % 4)
+        exp = json.loads(base64.urlsafe_b64decode(payload)).get("exp")
+    except (AttributeError, IndexError, ValueError, binascii.Error):
+        return None
+    return float(exp) if isinstance(exp, (int, float)) else None
+
+
+def session_cookie(response):
+    """
+    Cookie header value that replays the cookies a response set.
+
+    Works with both HTTP clients: only response.headers is used.
+
+    Returns:
+        str: "name=value; ..." or None if the response set no cookies
+    """
+    return cookie_header(response.headers.get("Set-Cookie"))
+
+
+def cookie_header(set_cookie):
+    """
+    Cookie header value from Set-Cookie header values.
+
+    Args:
+        set_cookie: One Set-Cookie value, a list of them (geventhttpclient
+            with several cookies), or None
+
+    Returns:
+        str: "name=value; ..." or None without cookies
+    """
+    if not set_cookie:
+        return None
+    cookie = SimpleCookie()
+    try:
+        for value in set_cookie if isinstance(set_cookie, list) else [set_cookie]:
+            cookie.load(value)
+    except CookieError:
+        return None
+    return "; ".join(f"{name}={morsel.value}" for name, morsel in cookie.items()) or None
+
+
+class TokenManager:
+    """
+    Keeps stored users' JWTs fresh.
+
+    Args:
+        store (UserStore): Where refreshed tokens are stored
+        lead (float): Refresh this many seconds before expiry; 0 disables refreshing
+        jitter (float): Extra random lead of up to this many seconds per token
+    """
+    RETRY_DELAY = 30
+
+    def __init__(self, store, lead=60, jitter=60):
+        self.store = store
+        self.lead = lead
+        self.jitter = jitter
+        self.in_flight = {}
+
+    def token_for(self, backend, user):
+        """
+        The user's token, refreshed first if it is about to expire.
+
+        Args:
+            backend (ChatBackend): Persona whose client makes any refresh call
+            user (dict): User from the UserStore
+
+        Returns:
+            str: Auth token to send
+        """
+        token = user.get("auth_token")
+        if not self.lead or not token:
+            return token
+
+        if user.get("refresh_for") != token:
+            user["refresh_at"] = self.refresh_time(token)
+            user["refresh_for"] = token
+        refresh_at = user["refresh_at"]
+        if refresh_at is None or time.time() < refresh_at:
+            return token
+        return self.refresh(backend, user)
+
+    def refresh_time(self, token):
+        """
+        When to refresh a token, or None if its expiry is unknown.
+
+        Never earlier than halfway through the token's remaining lifetime, so a
+        lead longer than the lifetime can't make every request refresh.
+        """
+        expires_at = token_expiry(token)
+        if expires_at is None:
+            return None
+        now = time.time()
+        return max(expires_at - self.lead - random.uniform(0, self.jitter), now + (expires_at - now) / 2)
+
+    def refresh(self, backend, user):
+        """Refresh a user's token, or wait for a refresh already in progress."""
+        username = user["username"]
+        pending = self.in_flight.get(username)
+        if pending is not None:
+            started = time.perf_counter()
+            token = pending.get()
+            backend.record_metric("TOKEN", "refresh wait (coalesced)", (time.perf_counter() - started) * 1000)
+            return token
+
+        pending = self.in_flight[username] = AsyncResult()
+        try:
+            token = self.request_token(backend, user)
+        except Exception as e:
+            pending.set_exception(e)
+            raise
+        else:
+            pending.set(token)
+            return token
+        finally:
+            del self.in_flight[username]
+
+    def request_token(self, backend, user):
+        """
+        Fetch a new token through the session, falling back to logging in again.
+
+        Returns:
+            str: The new token, or the old one if both calls failed
+        """
+        username = user["username"]
+        response = None
+        cookie = user.get("session_cookie")
+        if cookie:
+            response = backend.client.post("/auth/refresh", headers={"Cookie": cookie}, name="/auth/refresh")
+        if response is None or response.status_code != 200:
+            response = backend.client.post(
+                "/auth/login",
+                json={"username": username, "password": user.get("password") or username},
+                name="/auth/login [token refresh]",
+            )
+            cookie = session_cookie(response) or cookie
+        if response.status_code != 200:
+            # keep using the old token; don't retry on every request until it expires
+            user["refresh_at"] = time.time() + self.RETRY_DELAY
+            return user.get("auth_token")
+
+        token = response.json().get("token")
+        self.store.store_user(username, token, user.get("user_id"), session_cookie=cookie)
+        return token
@@ -0,0 +1,405 @@
+"""
+Capture and time-accurate replay of real traffic.
+
+The personas in locustfile.py mix tasks by fixed weights. This module
+replays what real users actually did instead, in two steps:
+
+1. Compile access logs into a compact event stream:
+
+    python traffic_replay.py compile log/production.log capture.jsonl -o traffic.replay.gz
+    python traffic_replay.py info traffic.replay.gz
+
+   Inputs are read line by line (plain or .gz), so multi-GB logs never have
+   to fit in memory. A file is either
+   - a Rails log: `Started GET "/conversations" for 10.0.0.7 at
+     2025-11-20 10:00:00 +0000` lines, plus the `Parameters: {...}` line that
+     follows each for the body of POST/PUT/PATCH requests. The client IP is
+     the user identity, and timestamps have one-second resolution.
+   - JSON lines: {"time": epoch seconds or ISO 8601, "method": "POST",
+     "path": "/messages", "user": "<any id>", "body": {...}}; "user" may also
+     be given as "user_id" or "ip".
+
+   Login, register, logout, refresh and SSE requests are dropped by default
+   (see --exclude): replayed users are already authenticated.
+
+2. Replay the stream with the locustfile's ReplayUser:
+
+    locust -f locustfile.py --replay traffic.replay.gz --replay-speed 5 -u 1 -r 1
+
+   Requests are sent at their captured offsets divided by --replay-speed,
+   each in its own greenlet, whether or not earlier ones have finished.
+   Every captured identity is mapped to one UserStore user: identity N to
+   the Nth stored user (e.g. from --user-fixture), and identities beyond the
+   store to newly registered users. `since` query parameters keep their
+   (scaled) age relative to the replay clock, and `userId`/`expertId` ones
+   name the mapped user.
+
+   All identities share one HTTP client, so its cookie jar is disabled (see
+   refuse_cookies): the backend authenticates a Rails session cookie before
+   the JWT, and a shared jar would send every request as whichever user
+   logged in last. Each request carries its mapped user's own JWT and
+   session cookie instead.
+
+Replay runs in one user per process: start as many users as processes
+(-u 1 locally, -u <workers> distributed). In distributed runs worker i
+replays the identities with identity % --expect-workers == i.
+
+Record IDs in paths (/conversations/17/messages) are replayed verbatim, so
+replay against a database restored from the snapshot the capture started
+from; elsewhere they turn into 404s.
+
+Stream format (gzip text): a "BSREPLAY1\t<start epoch>" line, then one
+event per line: ms since the previous event, identity number, method, path
+and the JSON body (empty if none), tab-separated.
+"""
+
+import argparse
+import gzip
+import itertools
+import json
+import logging
+import re
+import sys
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from http.cookiejar import DefaultCookiePolicy
+from urllib.parse import parse_qs, unquote_plus
+
+import gevent
+from gevent.pool import Group
+
+
+MAGIC = "BSREPLAY1"
+BODY_METHODS = ("POST", "PUT", "PATCH")
+DEFAULT_EXCLUDE = r"^/(auth/(register|login|logout|refresh)|api/updates/stream|assets/|favicon)"
+
+RAILS_STARTED = re.compile(
+    r"(?:\[(?P<tag>[^\]]+)\] )?Started (?P<method>[A-Z]+) \"(?P<path>[^\"]+)\" "
+    r"for (?P<ip>\S+) at (?P<time>\d{4}-\d\d-\d\d \d\d:\d\d:\d\d(?: [+-]\d{4})?)"
+)
+RAILS_PARAMETERS = re.compile(r"(?:\[(?P<tag>[^\]]+)\] )?\s*Parameters: (?P<params>\{.*\})\s*$")
+RAILS_COMPLETED = re.compile(r"(?:\[(?P<tag>[^\]]+)\] )?Completed \d{3} ")
+RUBY_ARROW = re.compile(r"\"\s*=>\s*")
+RUBY_NIL = re.compile(r"([:\[,]\s*)nil(?=\s*[,}\]])")
+SINCE_PARAM = re.compile(r"([?&]since=)([^&]+)")
+SINCE_AGE = re.compile(r"([?&]since=)@([0-9.]+)")
+IDENTITY_PARAM = re.compile(r"([?&](?:userId|expertId)=)([^&]*)")
+NUMERIC_SEGMENT = re.compile(r"/\d+(?=/|$)")
+ROUTE_KEY = re.compile(r"^(?:id|\w+_id)$")
+
+
+def open_text(path, mode="rt"):
+    if path.endswith(".gz"):
+        return gzip.open(path, mode, encoding="utf-8")
+    return open(path, mode, encoding="utf-8")
+
+
+def parse_time(value):
+    """Epoch seconds from a number, an ISO 8601 string or a Rails log timestamp."""
+    if isinstance(value, (int, float)):
+        return float(value)
+    for fmt in ("%Y-%m-%d %H:%M:%S %z", "%Y-%m-%d %H:%M:%S"):
+        try:
+            parsed = datetime.strptime(value, fmt)
+            break
+        except ValueError:
+            continue
+    else:
+        parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+
+def ruby_hash_to_json(text):
+    """
+    Decode a Rails `Parameters:` hash, or None if it isn't plain data.
+
+    Handles the strings, numbers, nil and nested hashes/arrays Rails logs for
+    JSON requests; anything else (uploads, objects) gives None.
+    """
+    try:
+        return json.loads(RUBY_NIL.sub(r"\1null", RUBY_ARROW.sub("\":", text)))
+    except ValueError:
+        return None
+
+
+def relative_since(path, at):
+    """Replace a `since` timestamp with its age at the request's time, "@<seconds>"."""
+    def age(match):
+        try:
+            return f"{match.group(1)}@{max(0.0, at - parse_time(unquote_plus(match.group(2)))):.3f}"
+        except ValueError:
+            return match.group(0)
+    return SINCE_PARAM.sub(age, path)
+
+
+def resolve_since(path, speed):
+    """Turn "since=@<age>" back into a timestamp that age (divided by speed) before now."""
+    def timestamp(match):
+        at = time.time() - float(match.group(2)) / speed
+        return match.group(1) + datetime.fromtimestamp(at, timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+    return SINCE_AGE.sub(timestamp, path)
+
+
+def bind_user(path, user_id):
+    """Point `userId`/`expertId` query parameters at the replaying user."""
+    return IDENTITY_PARAM.sub(lambda match: f"{match.group(1)}{user_id}", path)
+
+
+def refuse_cookies(client):
+    """
+    Make an HttpSession or FastHttpSession ignore Set-Cookie and send no
+    cookies of its own; Cookie headers passed with a request still go out.
+    """
+    jar = client.cookiejar if hasattr(client, "cookiejar") else client.cookies
+    jar.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+    jar.clear()
+
+
+def request_body(method, path, params):
+    """
+    The JSON body a request was sent with, from its logged Parameters.
+
+    Rails logs query string and route parameters (/conversations/:id) with
+    the body, plus a copy of the body wrapped under the controller's name
+    (wrap_parameters); those are dropped. Only POST, PUT and PATCH have a
+    body, and an empty one is None.
+    """
+    if method not in BODY_METHODS or not isinstance(params, dict):
+        return None
+    route, _, query = path.partition("?")
+    query_keys = parse_qs(query, keep_blank_values=True)
+    segments = set(route.strip("/").split("/"))
+    params = {
+        key: value for key, value in params.items()
+        if key not in query_keys and not (ROUTE_KEY.match(key) and str(value) in segments)
+    }
+    params = {
+        key: value for key, value in params.items()
+        if not (isinstance(value, dict) and all(params.get(k) == v for k, v in value.items()))
+    }
+    return params or None
+
+
+def request_name(path):
+    """Stats name for a replayed path: no query string, numeric IDs as :id."""
+    return "[replay] " + NUMERIC_SEGMENT.sub("/:id", path.split("?", 1)[0])
+
+
+def read_rails_log(lines):
+    """
+    Requests from Rails log lines, as [time, identity key, method, path, body].
+
+    A request is complete at its Completed line, at the next Started line
+    with the same tag (e.g. config.log_tags = [:request_id]), or at the end
+    of the input. In untagged logs from a multi-threaded server, Parameters
+    can be attached to the wrong request. Bodies come from request_body().
+    """
+    pending = {}
+    for line in lines:
+        match = RAILS_STARTED.search(line)
+        if match:
+            tag = match.group("tag")
+            if tag in pending:
+                yield pending.pop(tag)
+            pending[tag] = [
+                parse_time(match.group("time")), match.group("ip"), match.group("method"), match.group("path"), None,
+            ]
+            continue
+        match = RAILS_PARAMETERS.search(line)
+        if match and match.group("tag") in pending:
+            request = pending[match.group("tag")]
+            request[4] = request_body(request[2], request[3], ruby_hash_to_json(match.group("params")))
+            continue
+        match = RAILS_COMPLETED.search(line)
+        if match and match.group("tag") in pending:
+            yield pending.pop(match.group("tag"))
+    yield from pending.values()
+
+
+def read_json_lines(lines):
+    """Requests from a JSON lines capture, as [time, identity key, method, path, body]."""
+    for line in lines:
+        if not line.strip():
+            continue
+        record = json.loads(line)
+        identity = record.get("user", record.get("user_id", record.get("ip", "")))
+        yield [
+            parse_time(record["time"]), str(identity), record["method"].upper(), record["path"], record.get("body"),
+        ]
+
+
+def read_capture(path):
+    """Requests from one input file, lazily; the format is told by its first line."""
+    with open_text(path) as f:
+        first = ""
+        for first in f:
+            if first.strip():
+                break
+        lines = itertools.chain([first], f)
+        reader = read_json_lines if first.lstrip().startswith("{") else read_rails_log
+        yield from reader(lines)
+
+
+def compile_stream(inputs, output, exclude=DEFAULT_EXCLUDE):
+    """
+    Compile captures into an event stream file.
+
+    Args:
+        inputs (list): Rails log or JSON lines files, in time order
+        output (str): Event stream path (gzip)
+        exclude (str): Regex of paths to drop
+
+    Returns:
+        dict: Events written and skipped, identities and captured duration
+    """
+    excluded = re.compile(exclude) if exclude else None
+    identities = {}
+    written = skipped = 0
+    start = previous = None
+    with gzip.open(output, "wt", encoding="utf-8") as out:
+        for path in inputs:
+            for at, key, method, request_path, body in read_capture(path):
+                if excluded and excluded.search(request_path):
+                    skipped += 1
+                    continue
+                if start is None:
+                    start = previous = at
+                    out.write(f"{MAGIC}\t{start:.3f}\n")
+                identity = identities.setdefault(key, len(identities))
+                delta = max(0, round((at - previous) * 1000))
+                previous = max(previous, at)
+                body_text = json.dumps(body, separators=(",", ":")) if body is not None else ""
+                out.write(f"{delta}\t{identity}\t{method}\t{relative_since(request_path, at)}\t{body_text}\n")
+                written += 1
+        if start is None:
+            out.write(f"{MAGIC}\t0\n")
+    return {
+        "events": written,
+        "skipped": skipped,
+        "identities": len(identities),
+        "duration_s": round(previous - start, 3) if start is not None else 0,
+    }
+
+
+def read_events(path):
+    """
+    Events of a stream, lazily.
+
+    Yields:
+        tuple: (seconds since the first event, identity, method, path, body or None)
+    """
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        magic, _, _ = f.readline().rstrip("\n").partition("\t")
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a replay event stream")
+        offset_ms = 0
+        for line in f:
+            delta, identity, method, request_path, body = line.rstrip("\n").split("\t", 4)
+            offset_ms += int(delta)
+            yield offset_ms / 1000, int(identity), method, request_path, json.loads(body) if body else None
+
+
+class Replayer:
+    """
+    Sends a stream's events at their (scaled) captured times.
+
+    Args:
+        environment: Locust environment, for the REPLAY stats rows
+        path (str): Event stream
+        speed (float): Replay this many times faster than captured
+        partition (tuple): (index, count): replay identities with
+            identity % count == index
+        max_outstanding (int): Events in flight before new ones are dropped
+    """
+
+    def __init__(self, environment, path, speed=1.0, partition=(0, 1), max_outstanding=10000):
+        if speed <= 0:
+            raise ValueError("replay speed must be positive")
+        self.environment = environment
+        self.path = path
+        self.speed = speed
+        self.partition = partition
+        self.max_outstanding = max_outstanding
+        self.requests = Group()
+
+    def run(self, send):
+        """
+        Replay the whole stream; returns once every event has been sent and answered.
+
+        Args:
+            send (callable): send(identity, method, path, name, body) makes one request
+        """
+        index, count = self.partition
+        started = time.monotonic()
+        sent = 0
+        for offset, identity, method, path, body in read_events(self.path):
+            if identity % count != index:
+                continue
+            delay = started + offset / self.speed - time.monotonic()
+            if delay > 0:
+                gevent.sleep(delay)
+            else:
+                self.record("schedule lag", -delay * 1000)
+            if len(self.requests) >= self.max_outstanding:
+                self.record("dropped (max outstanding)", 0)
+                continue
+            self.requests.spawn(send, identity, method, resolve_since(path, self.speed), request_name(path), body)
+            sent += 1
+        self.requests.join()
+        logging.info(f"replay of {self.path} finished: {sent} requests in {time.monotonic() - started:.0f}s")
+
+    def stop(self):
+        self.requests.kill(block=False)
+
+    def record(self, name, value):
+        self.environment.events.request.fire(
+            request_type="REPLAY",
+            name=name,
+            response_time=value,
+            response_length=0,
+            exception=None,
+            context={},
+        )
+
+
+def print_info(path):
+    """Print a stream's size, duration and traffic mix."""
+    names = Counter()
+    identities = set()
+    duration = 0
+    for offset, identity, method, request_path, _ in read_events(path):
+        names[f"{method} {request_name(request_path)}"] += 1
+        identities.add(identity)
+        duration = offset
+    total = sum(names.values())
+    print(f"{total} events, {len(identities)} identities, {duration:.0f}s captured")
+    if duration:
+        print(f"{total / duration:.1f} requests/s at 1x")
+    for name, count in names.most_common():
+        print(f"{count:>10} {count / total:>7.1%}  {name}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+    compile_parser = commands.add_parser("compile", help="turn logs/captures into an event stream")
+    compile_parser.add_argument("inputs", nargs="+", help="Rails log or JSON lines files (.gz allowed), in time order")
+    compile_parser.add_argument("-o", "--output", required=True, help="event stream to write (gzip)")
+    compile_parser.add_argument("--exclude", default=DEFAULT_EXCLUDE, help="regex of paths to drop ('' keeps all)")
+    info_parser = commands.add_parser("info", help="summarize an event stream")
+    info_parser.add_argument("stream")
+    args = parser.parse_args()
+
+    if args.command == "info":
+        print_info(args.stream)
+        return 0
+    summary = compile_stream(args.inputs, args.output, args.exclude)
+    print(json.dumps(summary))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,154 @@
+"""
+Compact on-disk format for pre-provisioned users (see provision_users.py).
+
+Layout:
+    MAGIC (8 bytes)
+    header: four little-endian uint64 byte lengths
+    usernames section:       newline-joined UTF-8
+    user IDs section:        newline-joined UTF-8
+    tokens section:          newline-joined UTF-8
+    session cookies section: newline-joined UTF-8, empty lines for none
+
+Usernames, numeric IDs, JWTs and Cookie headers never contain newlines, so
+each column is read back with a single split. A 100k-user file loads in tens
+of milliseconds.
+
+The backend's JWTs expire after 15 minutes, but its Rails session lasts 24
+hours, so the session cookie is what keeps a fixture usable: TokenManager
+trades it for a fresh JWT at /auth/refresh instead of logging in again.
+Files from before the cookie column (MAGIC_V1, three columns) still load,
+with no cookies.
+
+A dataset manifest (see seed_dataset.py) is a JSON file describing a seeded
+database: its users, in a fixture file next to it, their password if it
+isn't their username, the seeded conversation IDs as inclusive [first, last]
+ranges, and the row counts and parameters it was generated with.
+"""
+
+import json
+import os
+import struct
+
+MAGIC = b"BSUSERS2"
+HEADER = struct.Struct("<QQQQ")
+MAGIC_V1 = b"BSUSERS1"
+HEADER_V1 = struct.Struct("<QQQ")
+MANIFEST_FORMAT = "bs-dataset-1"
+
+
+def write_user_fixture(path, users):
+    """
+    Write users to a fixture file.
+
+    Args:
+        path (str): Output file path
+        users (list): (username, user_id, auth_token, session_cookie) tuples;
+            session_cookie may be None or left out
+    """
+    rows = [(user[0], user[1], user[2], (user[3] if len(user) > 3 else None) or "") for user in users]
+    columns = list(zip(*rows)) if rows else [(), (), (), ()]
+    sections = [("\n".join(str(value) for value in column)).encode() for column in columns]
+    with open(path, "wb") as f:
+        f.write(MAGIC)
+        f.write(HEADER.pack(*(len(section) for section in sections)))
+        for section in sections:
+            f.write(section)
+
+
+def read_user_fixture(path):
+    """
+    Read users from a fixture file.
+
+    Args:
+        path (str): Fixture file path
+
+    Returns:
+        list: (username, user_id, auth_token, session_cookie or None) tuples
+    """
+    with open(path, "rb") as f:
+        data = f.read()
+
+    magic = data[:len(MAGIC)]
+    if magic == MAGIC:
+        header = HEADER
+    elif magic == MAGIC_V1:
+        header = HEADER_V1
+    else:
+        raise ValueError(f"{path} is not a user fixture file")
+
+    offset = len(MAGIC) + header.size
+    columns = []
+    for length in header.unpack_from(data, len(MAGIC)):
+        section = data[offset:offset + length]
+        columns.append(section.decode().split("\n") if length else [])
+        offset += length
+
+    usernames, user_ids, tokens = columns[:3]
+    cookies = columns[3] if header is HEADER else []
+    if not cookies:
+        # a version 1 file, or a single user without a cookie
+        cookies = [""] * len(usernames)
+    if not len(usernames) == len(user_ids) == len(tokens) == len(cookies):
+        raise ValueError(f"{path} is corrupt: column lengths differ")
+    return [
+        (username, user_id, token, cookie or None)
+        for username, user_id, token, cookie in zip(usernames, user_ids, tokens, cookies)
+    ]
+
+
+def id_ranges(ids):
+    """Collapse integer IDs into sorted, inclusive [first, last] ranges."""
+    ranges = []
+    for value in sorted(ids):
+        if ranges and value == ranges[-1][1] + 1:
+            ranges[-1][1] = value
+        else:
+            ranges.append([value, value])
+    return ranges
+
+
+def write_manifest(path, users, conversation_ranges, counts, parameters, password=None):
+    """
+    Write a dataset manifest and its user fixture (<manifest name>.users).
+
+    Args:
+        path (str): Manifest file path
+        users (list): (username, user_id, auth_token, session_cookie) tuples
+            (see write_user_fixture)
+        conversation_ranges (list): Inclusive [first, last] conversation ID ranges
+        counts (dict): Rows created per table
+        parameters (dict): Settings the dataset was generated with
+        password (str): Password of every user, or None if it is the username
+    """
+    fixture_path = os.path.splitext(path)[0] + ".users"
+    write_user_fixture(fixture_path, users)
+    with open(path, "w") as f:
+        json.dump({
+            "format": MANIFEST_FORMAT,
+            "user_fixture": os.path.basename(fixture_path),
+            "password": password,
+            "conversation_ids": conversation_ranges,
+            "counts": counts,
+            "parameters": parameters,
+        }, f, indent=1)
+
+
+def read_manifest(path):
+    """
+    Read a dataset manifest.
+
+    Args:
+        path (str): Manifest file path
+
+    Returns:
+        tuple: (users as (username, user_id, auth_token, session_cookie)
+            tuples, list of range objects with the seeded conversation IDs,
+            the users' password or None if it is the username)
+    """
+    with open(path) as f:
+        manifest = json.load(f)
+    if manifest.get("format") != MANIFEST_FORMAT:
+        raise ValueError(f"{path} is not a dataset manifest")
+    fixture_path = os.path.join(os.path.dirname(path), manifest["user_fixture"])
+    conversation_ids = [range(first, last + 1) for first, last in manifest["conversation_ids"]]
+    return read_user_fixture(fixture_path), conversation_ids, manifest.get("password")
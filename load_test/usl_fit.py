@@ -0,0 +1,317 @@
+"""
+Fit Amdahl's law and the Universal Scalability Law to load test results.
+
+USL models throughput at concurrency N as
+
+    X(N) = lambda * N / (1 + sigma * (N - 1) + kappa * N * (N - 1))
+
+where lambda is the throughput of one unit, sigma the contention (serialized
+fraction) and kappa the coherency cost (crosstalk between units). Amdahl's law
+is the special case kappa = 0. With kappa > 0, throughput peaks at
+N* = sqrt((1 - sigma) / kappa) and falls beyond it.
+
+Two kinds of input, both saved Locust HTML reports (see report_diff.py):
+
+    steps      One run of the step schedule. N is the number of running users,
+               X the successful requests/sec, taken from the report's history
+               and averaged over log-spaced user-count bins.
+    instances  Several runs, each labelled with its number of instances (or
+               relative instance size for vertical scaling). X is the run's
+               peak successful requests/sec.
+
+The fit is a vectorized grid search over (sigma, kappa) with lambda solved in
+closed form at every grid point, refined around the best point a few times.
+Latency is predicted from the fitted throughput with Little's law for a
+closed loop, R(N) = N / X(N) - Z, with the think time Z fitted to the
+measured response times. Little's law counts every completed request, so for
+runs with many failures the latency curve is only meaningful with
+--include-failures.
+
+Usage:
+    python usl_fit.py steps "base_application/single instance.html" --plot single.png
+    python usl_fit.py instances "base_application/single instance.html=1" \\
+        base_application/horizontalscale1.html=2 --plot instances.svg
+
+Plots need matplotlib (pip install matplotlib).
+"""
+
+import argparse
+import math
+import sys
+
+import numpy as np
+
+from report_diff import extract_template_args
+
+
+class ScalabilityModel:
+    """
+    A fitted USL (or Amdahl) model.
+
+    Args:
+        name (str): "USL" or "Amdahl"
+        sigma (float): Contention coefficient
+        kappa (float): Coherency coefficient (0 for Amdahl)
+        lam (float): Throughput of a single unit
+        r_squared (float): Goodness of fit on the input points
+    """
+
+    def __init__(self, name, sigma, kappa, lam, r_squared):
+        self.name = name
+        self.sigma = sigma
+        self.kappa = kappa
+        self.lam = lam
+        self.r_squared = r_squared
+        self.think_time = 0.0
+
+    def throughput(self, n):
+        n = np.asarray(n, dtype=float)
+        return self.lam * n / (1 + self.sigma * (n - 1) + self.kappa * n * (n - 1))
+
+    def latency(self, n):
+        """Predicted response time in seconds at concurrency n (Little's law)."""
+        n = np.asarray(n, dtype=float)
+        return np.maximum(n / self.throughput(n) - self.think_time, 0.0)
+
+    def peak(self):
+        """
+        Concurrency and throughput at the peak.
+
+        Returns:
+            tuple: (N*, X(N*)), or (inf, asymptotic throughput) without a peak
+        """
+        if self.kappa <= 0:
+            limit = self.lam / self.sigma if self.sigma > 0 else math.inf
+            return (math.inf, limit)
+        n = math.sqrt(max(1 - self.sigma, 0) / self.kappa)
+        return (n, float(self.throughput(n)))
+
+    def best_integer(self):
+        """Whole number of units with the highest predicted throughput, or None without a peak."""
+        n, _ = self.peak()
+        if math.isinf(n):
+            return None
+        candidates = np.array([max(1, math.floor(n)), max(1, math.ceil(n))])
+        return int(candidates[np.argmax(self.throughput(candidates))])
+
+
+def sum_of_squares(n, x, sigmas, kappas):
+    """
+    Least-squares error of every (sigma, kappa) pair, with lambda solved exactly.
+
+    Returns:
+        tuple: (error, lambda), both shaped (len(sigmas), len(kappas))
+    """
+    shape = 1 + sigmas[:, None, None] * (n - 1) + kappas[None, :, None] * n * (n - 1)
+    f = n / shape
+    lam = (f * x).sum(axis=-1) / (f * f).sum(axis=-1)
+    error = ((x - lam[..., None] * f) ** 2).sum(axis=-1)
+    return error, lam
+
+
+def around(values, index):
+    """Neighbouring grid values of values[index], for zooming in."""
+    return values[max(index - 1, 0)], values[min(index + 1, len(values) - 1)]
+
+
+def fit(n, x, amdahl=False, grid=64, rounds=5):
+    """
+    Fit USL (or Amdahl's law) to throughput measurements.
+
+    Args:
+        n (array): Concurrency of each point
+        x (array): Throughput of each point
+        amdahl (bool): Fix kappa at 0
+        grid (int): Grid points per coefficient and round
+        rounds (int): Refinement rounds after the initial grid
+
+    Returns:
+        ScalabilityModel: The best fit
+    """
+    n = np.asarray(n, dtype=float)
+    x = np.asarray(x, dtype=float)
+    sigmas = np.linspace(0, 1, grid)
+    # kappa spans many orders of magnitude (1e-9 is typical for user counts)
+    kappas = np.zeros(1) if amdahl else np.concatenate(([0.0], np.geomspace(1e-12, 1, grid - 1)))
+
+    for round_ in range(rounds + 1):
+        error, lam = sum_of_squares(n, x, sigmas, kappas)
+        i, j = np.unravel_index(np.argmin(error), error.shape)
+        best = (sigmas[i], kappas[j], lam[i, j], error[i, j])
+        if round_ == rounds:
+            break
+        sigmas = np.linspace(*around(sigmas, i), grid)
+        if not amdahl:
+            kappas = np.linspace(*around(kappas, j), grid)
+
+    sigma, kappa, lam, error = best
+    total = ((x - x.mean()) ** 2).sum()
+    r_squared = 1 - error / total if total else 1.0
+    return ScalabilityModel("Amdahl" if amdahl else "USL", float(sigma), float(kappa), float(lam), float(r_squared))
+
+
+def fit_think_time(model, n, latency):
+    """Set model.think_time so Little's law best matches measured latencies (seconds)."""
+    if latency is None or not len(latency):
+        return
+    residual = np.asarray(n, dtype=float) / model.throughput(n) - np.asarray(latency, dtype=float)
+    model.think_time = max(float(np.median(residual)), 0.0)
+
+
+def history_arrays(path, include_failures=False):
+    """
+    Users, throughput and average latency over a run, from the report's history.
+
+    Returns:
+        tuple: (users, requests/sec, latency in seconds) as arrays
+    """
+    history = extract_template_args(path).get("history", [])
+    if not history:
+        raise ValueError(f"{path}: report has no history")
+    users = np.array([sample["user_count"][1] for sample in history], dtype=float)
+    rps = np.array([sample["current_rps"][1] for sample in history], dtype=float)
+    if not include_failures:
+        rps -= np.array([sample["current_fail_per_sec"][1] for sample in history], dtype=float)
+    latency = np.array([sample["total_avg_response_time"][1] for sample in history], dtype=float) / 1000
+    return users, np.maximum(rps, 0), latency
+
+
+def step_points(path, bins=24, include_failures=False):
+    """Average throughput and latency of one run per log-spaced user-count bin."""
+    users, rps, latency = history_arrays(path, include_failures)
+    keep = users > 0
+    users, rps, latency = users[keep], rps[keep], latency[keep]
+    if not len(users):
+        raise ValueError(f"{path}: no samples with running users")
+    edges = np.geomspace(users.min(), users.max() * 1.000001, bins + 1)
+    index = np.digitize(users, edges) - 1
+    counts = np.bincount(index, minlength=bins)
+    filled = counts > 0
+
+    def mean(values):
+        return np.bincount(index, weights=values, minlength=bins)[filled] / counts[filled]
+
+    return mean(users), mean(rps), mean(latency)
+
+
+def instance_points(labelled_paths, include_failures=False, smoothing=3):
+    """
+    Peak throughput of several runs, each labelled with its instance count.
+
+    Args:
+        labelled_paths (list): "PATH=N" strings
+        smoothing (int): Samples in the moving average the peak is taken from
+
+    Returns:
+        tuple: (instances, peak requests/sec, latency in seconds at the peak)
+    """
+    instances, peaks, latencies = [], [], []
+    for item in labelled_paths:
+        path, sep, count = item.rpartition("=")
+        if not sep:
+            raise ValueError(f"{item}: expected PATH=INSTANCES")
+        _, rps, latency = history_arrays(path, include_failures)
+        window = min(smoothing, len(rps))
+        smoothed = np.convolve(rps, np.ones(window) / window, mode="valid")
+        at = int(np.argmax(smoothed))
+        instances.append(float(count))
+        peaks.append(float(smoothed[at]))
+        latencies.append(float(latency[at + window // 2]))
+    return np.array(instances), np.array(peaks), np.array(latencies)
+
+
+def plot(models, n, x, latency, unit, throughput_label, paths):
+    """Write throughput and latency curves of the fitted models to PNG/SVG files."""
+    try:
+        import matplotlib
+        matplotlib.use("Agg")
+        import matplotlib.pyplot as plt
+    except ImportError:
+        raise ValueError("plotting needs matplotlib (pip install matplotlib)")
+
+    peaks = [model.peak()[0] for model in models]
+    top = max([n.max() * 1.5] + [2 * peak for peak in peaks if not math.isinf(peak)])
+    curve = np.linspace(1, top, 400)
+
+    figure, (throughput_axes, latency_axes) = plt.subplots(1, 2, figsize=(12, 4.5))
+    throughput_axes.scatter(n, x, color="black", s=12, label="measured", zorder=3)
+    latency_axes.scatter(n, latency * 1000, color="black", s=12, label="measured", zorder=3)
+    for model in models:
+        label = f"{model.name} (sigma={model.sigma:.4g}, kappa={model.kappa:.3g})"
+        throughput_axes.plot(curve, model.throughput(curve), label=label)
+        latency_axes.plot(curve, model.latency(curve) * 1000, label=model.name)
+        peak_n, peak_x = model.peak()
+        if not math.isinf(peak_n):
+            throughput_axes.axvline(peak_n, linestyle=":", color="grey")
+            throughput_axes.annotate(f"peak {peak_x:.0f}/s @ {peak_n:.0f}", (peak_n, peak_x))
+
+    throughput_axes.set(xlabel=unit, ylabel=throughput_label, title="Throughput")
+    latency_axes.set(xlabel=unit, ylabel="response time (ms)", title="Latency (Little's law)", yscale="log")
+    for axes in (throughput_axes, latency_axes):
+        axes.grid(alpha=0.3)
+        axes.legend(fontsize="small")
+    figure.tight_layout()
+    for path in paths:
+        figure.savefig(path)
+        print(f"Wrote {path}")
+    plt.close(figure)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("mode", choices=("steps", "instances"), help="what N measures")
+    parser.add_argument("reports", nargs="+", help="HTML report (steps), or PATH=INSTANCES items (instances)")
+    parser.add_argument("--bins", type=int, default=24, help="user-count bins for steps mode")
+    parser.add_argument("--include-failures", action="store_true", help="count failed requests as throughput")
+    parser.add_argument("--plot", action="append", default=[], help="write curves to this .png/.svg (repeatable)")
+    args = parser.parse_args()
+
+    try:
+        if args.mode == "steps":
+            if len(args.reports) != 1:
+                parser.error("steps mode takes exactly one report")
+            n, x, latency = step_points(args.reports[0], args.bins, args.include_failures)
+            unit = "users"
+        else:
+            n, x, latency = instance_points(args.reports, args.include_failures)
+            unit = "instances"
+    except (OSError, ValueError) as e:
+        print(e, file=sys.stderr)
+        return 1
+
+    models = [fit(n, x, amdahl=True)]
+    if len(np.unique(n)) >= 3:
+        models.append(fit(n, x))
+    else:
+        print("USL needs at least 3 distinct values of N; fitting Amdahl's law only")
+
+    print(f"{'N':>10} {'req/s':>10} {'latency':>10}")
+    for point in zip(n, x, latency):
+        print(f"{point[0]:>10.1f} {point[1]:>10.1f} {point[2] * 1000:>8.0f}ms")
+    print()
+    for model in models:
+        fit_think_time(model, n, latency)
+        peak_n, peak_x = model.peak()
+        print(
+            f"{model.name:<7} sigma={model.sigma:.5g} kappa={model.kappa:.4g} "
+            f"lambda={model.lam:.4g}/s R^2={model.r_squared:.3f} think time={model.think_time:.2f}s"
+        )
+        if math.isinf(peak_x):
+            print("        no peak; throughput scales linearly")
+        elif math.isinf(peak_n):
+            print(f"        no peak; throughput approaches {peak_x:.1f} req/s")
+        else:
+            print(f"        peak {peak_x:.1f} req/s at {peak_n:.1f} {unit}; best whole number: {model.best_integer()}")
+
+    if args.plot:
+        try:
+            throughput_label = "requests/sec" if args.include_failures else "successful requests/sec"
+            plot(models, n, x, latency, unit, throughput_label, args.plot)
+        except ValueError as e:
+            print(e, file=sys.stderr)
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())